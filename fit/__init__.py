@@ -1 +1 @@
-import base
\ No newline at end of file
+import base
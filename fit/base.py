@@ -1,11 +1,247 @@
 """ A subclass for fitting category decision models to behavioral data. """
+import csv
+import hashlib
+from math import pi
+
+import numpy as np
 from accumulate.sim.base import Trials
+from accumulate.sim import bits
+from accumulate.models.deciders import DECISION_CODES
+from accumulate.models.misc import ModelSpec
+
 
 class FitTrials(Trials):
-	def __init__(self):
-		AccumulationTrials.__init__(self)
+    """ The trials subjects saw, and their responses (choice and rt), for
+    fitting the models in accumulate.models.construct.
+
+    Trials are packed, and are only those seen by (any) subject, from
+    either half of the trial space.  Model predictions are memoized by
+    (factory, params, trial set), so optimizer probes that repeat, and the
+    fits of other subjects, reuse them. """
+
+    def __init__(self, l):
+        self.behavior = dict()
+            ## subject -> trial codes, choices and rts
+        self._predictions = dict()
+
+        Trials.__init__(self, l, packed=True)
+        self.max_trial_count = len(self.trials)
+
+
+    def _generate_trials(self):
+        """ Returns the (sorted, unique) codes of all the trials seen. """
+
+        self.trial_count = 0
+            ## reset
+
+        seen = [data['trial'] for data in self.behavior.values()]
+        dt = bits.dtype(self.l)
+        if not seen:
+            return np.array([], dtype=dt)
+
+        return np.unique(np.concatenate(seen)).astype(dt)
+
+
+    def add_behavior(self, subject, trials, choices, rts):
+        """ Add <subject>'s responses.  <trials> are the trials seen
+        (strings, e.g. 'ABBA'), <choices> the categories chosen ('A' or 'B')
+        and <rts> the number of exemplars seen before choosing. """
+
+        if not (len(trials) == len(choices) == len(rts)):
+            raise ValueError(
+                    '<trials>, <choices> and <rts> must be the same length.')
+        for trial in trials:
+            if len(trial) != int(self.l):
+                raise ValueError('Every trial must be {0} long.'.format(
+                        int(self.l)))
+        for choice in choices:
+            if choice not in ('A', 'B'):
+                raise ValueError("<choices> must be 'A' or 'B'.")
+
+        dt = bits.dtype(self.l)
+        self.behavior[subject] = {
+            'trial' : np.array([bits.pack(t) for t in trials], dtype=dt),
+            'choice' : np.array([DECISION_CODES[c] for c in choices],
+                    dtype=np.int8),
+            'rt' : np.array(rts, dtype=float)
+        }
+
+        # Refresh the trials seen
+        self.trials = self._generate_trials()
+        self.max_trial_count = len(self.trials)
+
+
+    def read_behavior(self, filename):
+        """ Add the responses in <filename>, a csv file with a header and
+        the columns subject, trial, choice, rt (one row per response). """
+
+        by_subject = dict()
+        with open(filename) as fid:
+            for row in csv.DictReader(fid):
+                data = by_subject.setdefault(row['subject'], ([], [], []))
+                data[0].append(row['trial'])
+                data[1].append(row['choice'])
+                data[2].append(float(row['rt']))
+
+        for subject, (trials, choices, rts) in by_subject.items():
+            self.add_behavior(subject, trials, choices, rts)
+
+
+    def _trial_set(self):
+        """ Return a hash of the trial set. """
+
+        return hashlib.sha1(self.trials.tobytes()).hexdigest()
+
+
+    def predict(self, factory, **params):
+        """ Return the (decision, rt) predictions, arrays over self.trials,
+        of the model <factory> (a name in accumulate.models.construct,
+        e.g. 'create_abscount') makes with <params>.  Predictions are
+        memoized. """
+
+        key = (factory, tuple(sorted(params.items())), self._trial_set())
+        if key not in self._predictions:
+            params.setdefault('name', factory)
+            model = ModelSpec(factory, **params).build()
+            table = self.categorize(model, table=True)
+            self._predictions[key] = (table.decision[0], table.rt[0])
+
+        return self._predictions[key]
+
+
+    def predict_passage(self, factory, **params):
+        """ Return the first passage probabilities, (n_trials x l) arrays
+        for A and B over self.trials (see accumulate.models.ddm.passage()),
+        of the model <factory> with <params>, which must have a first
+        passage form (model.passage, e.g. create_drift).  Predictions are
+        memoized. """
+
+        key = ('passage', factory, tuple(sorted(params.items())),
+                self._trial_set())
+        if key not in self._predictions:
+            params.setdefault('name', factory)
+            model = ModelSpec(factory, **params).build()
+            if not hasattr(model, 'passage'):
+                raise ValueError('<factory> has no first passage form.')
+            self._predictions[key] = model.passage(self.trials, self.l)
+
+        return self._predictions[key]
+
+
+    def log_likelihood(self, factory, subject=None, lapse=0.05, rt_sd=1.0,
+            **params):
+        """ Return the log likelihood of the responses of <subject> (or of
+        every subject if None) under the model <factory> with <params>.
+
+        Each response is a mixture of the model (weight 1 - <lapse>) and a
+        guess (weight <lapse>, uniform over both choices and over rts from
+        1 to l).  The model chooses as predicted with a Gaussian (sd
+        <rt_sd>) rt around the predicted rt.  When the model makes no
+        decision it guesses its choice, at rt l.
+
+        Models with a first passage form (e.g. create_drift) instead give
+        the probability of each choice at each rt (approximated, see
+        predict_passage(); rts are rounded, and <rt_sd> is unused). """
+
+        if subject is None:
+            subjects = sorted(self.behavior.keys())
+        else:
+            subjects = [subject]
+
+        spec_params = dict(params)
+        spec_params.setdefault('name', factory)
+        passage = hasattr(ModelSpec(factory, **spec_params).build(),
+                'passage')
+        if passage:
+            p_A, p_B = self.predict_passage(factory, **params)
+        else:
+            decision, rt = self.predict(factory, **params)
+        l = float(self.l)
+
+        loglik = 0.0
+        for s in subjects:
+            data = self.behavior[s]
+            index = np.searchsorted(self.trials, data['trial'])
+
+            # Predictions for each response
+            if passage:
+                ii = np.clip(np.round(data['rt']).astype(int), 1,
+                        int(self.l)) - 1
+                p_model = np.where(data['choice'] == DECISION_CODES['A'],
+                        p_A[index, ii], p_B[index, ii])
+            else:
+                p_decision = decision[index]
+                p_rt = rt[index].astype(float)
+                undecided = p_rt == -1
+                p_rt[undecided] = l
+
+                p_choice = np.where(undecided, 0.5,
+                        (p_decision == data['choice']).astype(float))
+                p_time = np.exp(-0.5 * ((data['rt'] - p_rt) / rt_sd) ** 2) / \
+                        (rt_sd * np.sqrt(2 * pi))
+                p_model = p_choice * p_time
+
+            lik = (1 - lapse) * p_model + lapse * 0.5 / l
+            loglik += np.log(lik).sum()
+
+        return float(loglik)
+
+
+    def fit(self, factory, bounds, subject=None, lapse=0.05, rt_sd=1.0,
+            resolution=0.001, seed=None, maxiter=50, **fixed):
+        """ Fit the params of <factory> given in <bounds> (a dict of
+        (low, high) by param, e.g. {'threshold' : (0.05, 0.95)}) to the
+        responses of <subject> (or every subject if None), by maximum
+        likelihood (see log_likelihood()).  <fixed> are passed to
+        <factory> unchanged, e.g. decider=accumulate.models.deciders.absolute.
+
+        As model predictions are piecewise constant in their params, a
+        bounded derivative free optimizer is used
+        (scipy.optimize.differential_evolution).  Params are rounded to
+        <resolution>, so nearby probes share memoized predictions.
+
+        Returns a dict of the fitted 'params', the 'log_likelihood' and the
+        'n' of responses fitted. """
+        from scipy.optimize import differential_evolution
+
+        names = sorted(bounds.keys())
+
+        def params_for(x):
+            params = dict(fixed)
+            for name, value in zip(names, x):
+                params[name] = round(value / resolution) * resolution
+
+            return params
+
+        def objective(x):
+            return -self.log_likelihood(factory, subject, lapse, rt_sd,
+                    **params_for(x))
+
+        result = differential_evolution(objective,
+                [bounds[name] for name in names], seed=seed, maxiter=maxiter,
+                polish=False)
+            ## Polishing uses gradients,
+            ## which are zero almost everywhere.
+
+        if subject is None:
+            n = sum([len(data['rt']) for data in self.behavior.values()])
+        else:
+            n = len(self.behavior[subject]['rt'])
+
+        params = params_for(result.x)
+        for name in fixed:
+            del params[name]
+
+        return {
+            'params' : params,
+            'log_likelihood' : -float(result.fun),
+            'n' : n
+        }
+
 
-	# TODO - way to add behave data (in same format as self.trials)
-	# Optimizaiton routines for fitting params for the various models.
-	pass
+    def fit_subjects(self, factory, bounds, **kwargs):
+        """ Run fit() for each subject, returning a dict of fits by subject.
+        Predictions are shared across subjects. """
 
+        return dict([(subject, self.fit(factory, bounds, subject, **kwargs))
+                for subject in sorted(self.behavior.keys())])
@@ -1,4 +1,5 @@
 import noise
 import construct
 import deciders
-import misc
\ No newline at end of file
+import misc
+import ddm
@@ -1,13 +1,91 @@
 """ Many many models of 2 category accumulation.  Each is a function closure
-that constructs the final model, which should only take one argument: the trial sequence. """
-from copy import deepcopy
-from math import log, fabs, sqrt
+that constructs the final model, which should only take one argument: the trial sequence. 
+
+Some models also have batch (array) forms, attached to the model as 
+model.scores(matrix) and model.batch(matrix).  Both take a (n_trials x l)
+0/1 matrix of trials (1 is an 'A').  The first returns the A and B score 
+matrices, the second returns the results for every trial (see 
+accumulate.models.deciders._create_batch_result). """
+from math import log, fabs, sqrt, factorial
+from operator import truediv
 import numpy as np
-from accumulate.models.deciders import _create_d_result
+from accumulate.models.deciders import _create_d_result, \
+        _batch_result_return, batch_decider, difference
 from accumulate.models.noise import dummy
-from accumulate.models.misc import check_threshold, update_name
+from accumulate.models import ddm
+from accumulate.models.misc import check_threshold, update_name, record_spec
+
+
+def _walk(start, step, trial):
+    """ Run the resumable model given by <start> and <step> over <trial>. 
+    
+    Models with a resumable form have model.start(l), which returns the 
+    initial (accumulator) state for a trial of length l, and 
+    model.step(state, t, ii, l), which takes exemplar <t> (the <ii>th) 
+    and returns the updated state and the decision (None if none was 
+    made yet).  States are tuples, so they can be kept and resumed 
+    (e.g. by accumulate.sim.tree). """
+
+    l = len(trial)
+    state = start(l)
+    for ii, t in enumerate(trial):
+        state, decision = step(state, t, ii, l)
+        if decision != None:
+            return decision
+    else:
+        # If threshold is never met,
+        # we end up here...
+        return _create_d_result('N', None, None, None)
+
+
+def _attach_steps(model, start, step):
+    """ Attach the resumable form, <start> and <step>, to <model>. """
+
+    model.start = start
+    model.step = step
+
+    return model
+
+
+def _running_counts(matrix):
+    """ Return the running counts of A and B (as floats) for the trials in
+    <matrix>. """
+
+    cA = np.cumsum(matrix, axis=1, dtype=np.int64)
+    cB = np.arange(1, matrix.shape[1] + 1) - cA
+
+    return cA.astype(float), cB.astype(float)
+
+
+def _attach_batch(model, scores, decider, threshold):
+    """ Attach the batch forms, i.e. <scores> and a matching batch(), 
+    to <model>.  If <decider> has no array form only scores is 
+    attached. 
+    
+    The <decider> and <threshold> are attached too (threshold sweeps, see
+    accumulate.sim.sweep, need them). """
+
+    model.scores = scores
+    model.decider = decider
+    model.threshold = threshold
+
+    decide = batch_decider(decider)
+    if decide != None:
+        def batch(matrix):
+            score_A, score_B = scores(matrix)
+            
+            with np.errstate(invalid='ignore'):
+                ## NaN scores (no decision possible)
+                ## are expected; they never meet threshold.
+                return _batch_result_return(
+                        score_A, score_B, decide(score_A, score_B, threshold))
+        
+        model.batch = batch
+
+    return model
     
    
+@record_spec
 def create_abscount(name, threshold, decider):
     """ Create a decision function that use the counts of A and B to 
     decide. 
@@ -19,42 +97,46 @@ def create_abscount(name, threshold, decider):
     
     check_threshold(threshold)
     
+    def start(l):
+        return (0, 0)
+
+    def step(state, t, ii, l):
+        score_A, score_B = state
+
+        # Update scores based on t
+        if t == 'A':
+            score_A += 1
+        else:
+            score_B += 1
+
+        # Norm them
+        l = float(l)
+        score_A_norm = score_A / l
+        score_B_norm = score_B / l     
+            
+        # And see if a decision can be made
+        return (score_A, score_B), decider(
+                score_A_norm, score_B_norm, threshold, ii+1)
+
     @update_name(name)
     def abscount(trial):
         """ Return a category (A, B, or N (neutral)) for <trial> 
         based on number of As versus Bs. """
         
-        import random
-    
-        score_A = 0
-        score_B = 0
-        l = float(len(trial))
-        
-        for ii, t in enumerate(trial):
-            # Update scores based on t
-            if t == 'A':
-                score_A += 1
-            else:
-                score_B += 1
+        return _walk(start, step, trial)
 
-            # Norm them
-            score_A_norm = score_A / l
-            score_B_norm = score_B / l     
-            
-            # print("({0}). {1}, {2}".format(ii, score_A_norm, score_B_norm))
-            
-            # And see if a decision can be made
-            decision = decider(score_A_norm, score_B_norm, threshold, ii+1)
-            if decision != None:
-                return decision
-        else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
+    _attach_steps(abscount, start, step)
     
-    return abscount
+    def scores(matrix):
+        cA, cB = _running_counts(matrix)
+        l = float(matrix.shape[1])
+
+        return cA / l, cB / l
+
+    return _attach_batch(abscount, scores, decider, threshold)
 
 
+@record_spec
 def create_relcount(name, threshold, decider):
     """ Create a decision function that use the relative difference
     in A and B counts to decide. 
@@ -64,123 +146,147 @@ def create_relcount(name, threshold, decider):
         
     check_threshold(threshold)
     
+    def start(l):
+        return (0.0, 0.0)
+
+    def step(state, t, ii, l):
+        cA, cB = state
+
+        # Update scores based on t
+        if t == 'A':
+            cA += 1
+        else:
+            cB += 1
+        
+        if (cA > 0) and (cB > 0):
+            score_A = cA / (cA + cB)
+            score_B = 1 - score_A
+
+            # And see if a decision can be made
+            return (cA, cB), decider(score_A, score_B, threshold, ii+1)
+        else:
+            return (cA, cB), None
+
     @update_name(name)    
     def relcount(trial):
         """ Return a category (A, B, or N (neutral)) for <trial> 
             based on proportion of As to Bs. """
         
-        cA = 0.0
-        cB = 0.0
-        for ii, t in enumerate(trial):
-            # Update scores based on t
-            if t == 'A':
-                cA += 1
-            else:
-                cB += 1
+        return _walk(start, step, trial)
+
+    _attach_steps(relcount, start, step)
+
+    def scores(matrix):
+        cA, cB = _running_counts(matrix)
         
-            if (cA > 0) and (cB > 0):
-                score_A = cA / (cA + cB)
-                score_B = 1 - score_A
-
-                # And see if a decision can be made
-                decision = decider(score_A, score_B, threshold, ii+1)
-                if decision != None:
-                    return decision
-            else:
-                continue
-        else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
+        score_A = cA / (cA + cB)
+        score_A[(cA == 0) | (cB == 0)] = np.nan
+            ## No decisions until there is 
+            ## at least one A and B.
+
+        return score_A, 1 - score_A
 
-    return relcount
+    return _attach_batch(relcount, scores, decider, threshold)
 
 
+@record_spec
 def create_naive_probability(name, threshold, decider):      
     """ Create a decision function using naive (multiplicative)
     probability estimates. """
     
     check_threshold(threshold)
 
+    def start(l):
+        return (None, 0.5, 0, 0)
+            ## (lastcat, p, score_A, score_B)
+
+    def step(state, t, ii, l):
+        lastcat, p, score_A, score_B = state
+
+        # The first exemplar only sets lastcat.
+        if ii == 0:
+            return (t, p, score_A, score_B), None
+
+        if t == lastcat:
+            # If t is the same, 
+            # decrease the likelihood (p).
+            p = p * 0.5
+                
+            # Assign p to a score, 
+            # also reflect it
+            if t == 'A':
+                score_A = 1 - p
+            else:
+                score_B = 1 - p
+                
+            # And see if a decision can be made
+            return (lastcat, p, score_A, score_B), decider(
+                    score_A, score_B, threshold, ii)
+        else:
+            # Otherwise reset
+            return (t, 0.5, score_A, score_B), None
+
     @update_name(name)
     def naive_probability(trial):
         """ Calculate the likelihood of the continuous sequence of either
         A or B in <trial>, decide when p_sequence(A) or (B) exceeds 
         <threshold>. """
         
-        ## Init
-        score_A = 0
-        score_B = 0        
-        lastcat = trial[0]
-        p = 0.5
-
-        # Loop over trial calculating scores.
-        for ii, t in enumerate(trial[1:]):
-            if t == lastcat:
-                # If t is the same, 
-                # decrease the likelihood (p).
-                p = p * 0.5
-                
-                # Assign p to a score, 
-                # also reflect it
-                if t == 'A':
-                    score_A = 1 - deepcopy(p)
-                else:
-                    score_B = 1 - deepcopy(p)
-                
-                # And see if a decision can be made
-                decision = decider(score_A, score_B, threshold, ii+1)
-                if decision != None:
-                    return decision
-            else:
-                # Otherwise reset
-                lastcat = deepcopy(t)
-                p = 0.5
-        else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
+        return _walk(start, step, trial)
 
-    return naive_probability
+    return _attach_steps(naive_probability, start, step)
     
 
+@record_spec
 def create_information(name, threshold, decider):
     """ Create a information theory based decision function. """
     
     check_threshold(threshold)
     
+    def start(l):
+        l = float(l)
+        
+        return (0, 0, np.log2(l) / l)
+            ## (H_a, H_b, norm_const)
+
+    def step(state, t, ii, l):
+        H_a, H_b, norm_const = state
+        if t == 'A':
+            H_a +=  -0.5 * np.log2(0.5)
+                ## For a binary alphabet, b-ary entropy is
+                ## H(A) = sum_i(b*log_2(b))
+                ## where b is the probability a letter
+                ## in the alphabet
+                ## appears at slot i (i.e. = t above).
+                ## In this case b = p(A) = p(b) = 0.5 for all i.
+        else:
+            H_b +=  -0.5 * np.log2(0.5)
+
+        # And see if a decision can be made
+        return (H_a, H_b, norm_const), decider(
+                H_a * norm_const, H_b * norm_const, threshold, ii+1)
+
     @update_name(name)
     def information(trial):
-        H_a = 0
-        H_b = 0
-        l = float(len(trial))
+        return _walk(start, step, trial)
+
+    _attach_steps(information, start, step)
+
+    def scores(matrix):
+        cA, cB = _running_counts(matrix)
+        l = float(matrix.shape[1])
         norm_const = np.log2(l) / l
-        for ii,t in enumerate(trial):
-            if t == 'A':
-                H_a +=  -0.5 * np.log2(0.5)
-                    ## For a binary alphabet, b-ary entropy is
-                    ## H(A) = sum_i(b*log_2(b))
-                    ## where b is the probability a letter
-                    ## in the alphabet
-                    ## appears at slot i (i.e. = t above).
-                    ## In this case b = p(A) = p(b) = 0.5 for all i.
-            else:
-                H_b +=  -0.5 * np.log2(0.5)
+        H = -0.5 * np.log2(0.5)
 
-            # And see if a decision can be made
-            decision = decider(H_a * norm_const, 
-                    H_b * norm_const, threshold, ii+1)
-            if decision != None:
-                return decision
-        else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
+        return (H * cA) * norm_const, (H * cB) * norm_const
+            ## The summed entropy is a count of H, 
+            ## exactly as H_a and H_b above.
 
-    return information
+    return _attach_batch(information, scores, decider, threshold)
 
 
 # TODO - test me!
+@record_spec
 def create_snr(name, threshold, decider, mean_default=False):
     """  Creates a model based on Gardelle et al's mean / SNR model however
     it has been modified for this paradigm - means and SDs are calculated
@@ -206,72 +312,64 @@ def create_snr(name, threshold, decider, mean_default=False):
     
     check_threshold(threshold)
 
-    @update_name(name)
+    def start(l):
+        return (0, 0, 0, 0, 0.0, 0.0)
+            ## (meanA, meanB, M2A, M2B, score_A, score_B)
+            ## M2 is the second mean (needed for online)
 
-    def snr(trial):
-        """ Gardelle et al's mean / SNR model. """
-        
-        # Init
-        l = len(trial)        
-        meanA = 0 
-        meanB = 0
-        M2A = 0  # Second mean (needed for online)
-        M2B = 0
-        score_A = 0.0
-        score_B = 0.0
-        for ii, t in enumerate(trial):
-            n = ii + 1  ## reindex needed
-                        ## so n is the A/B count
-            
-            # Calculate the mean and sd
-            # using online algortimns outlined
-            # in Donald E. Knuth (1998). The Art of Computer 
-            # Programming, volume 2: Seminumerical Algorithms, 
-            # 3rd edn.
-            x = 1.0 / l 
-            if t == 'A':
-                delta = x - meanA
-                meanA += delta/n
-                
-                # Can't update if any 
-                # of the denom are 0
-                try:
-                    M2A += delta * (x - meanA)
-                    sdA = sqrt(M2A / (n - 1))
-                    score_A += meanA/sdA
-                except ZeroDivisionError:
-                    if mean_default:
-                        score_A += meanA
-                    else:
-                        pass
-            else:
-                delta = x - meanB
-                meanB += delta/n
-                try:
-                    M2B += delta * (x - meanB)
-                    sdB = sqrt(M2B / (n - 1))
-                    score_B += meanB/sdB
-                except ZeroDivisionError:
-                    if mean_default:
-                        score_B += meanB
-                    else:
-                        pass
+    def step(state, t, ii, l):
+        meanA, meanB, M2A, M2B, score_A, score_B = state
+        n = ii + 1  ## reindex needed
+                    ## so n is the A/B count
             
-            # print("{2} - {3}. score_A: {0}, score_B: {1}".format(
-                # score_A, score_B, ii, t))
-            # And see if a decision can be made
-            decision = decider(score_A, score_B, threshold, n)
-            if decision != None:
-                return decision
+        # Calculate the mean and sd
+        # using online algortimns outlined
+        # in Donald E. Knuth (1998). The Art of Computer 
+        # Programming, volume 2: Seminumerical Algorithms, 
+        # 3rd edn.
+        x = 1.0 / l 
+        if t == 'A':
+            delta = x - meanA
+            meanA += delta/n
                 
+            # Can't update if any 
+            # of the denom are 0
+            try:
+                M2A += delta * (x - meanA)
+                sdA = sqrt(M2A / (n - 1))
+                score_A += meanA/sdA
+            except ZeroDivisionError:
+                if mean_default:
+                    score_A += meanA
+                else:
+                    pass
         else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
+            delta = x - meanB
+            meanB += delta/n
+            try:
+                M2B += delta * (x - meanB)
+                sdB = sqrt(M2B / (n - 1))
+                score_B += meanB/sdB
+            except ZeroDivisionError:
+                if mean_default:
+                    score_B += meanB
+                else:
+                    pass
+            
+        # And see if a decision can be made
+        return (meanA, meanB, M2A, M2B, score_A, score_B), decider(
+                score_A, score_B, threshold, n)
+
+    @update_name(name)
+    def snr(trial):
+        """ Gardelle et al's mean / SNR model. """
+        
+        return _walk(start, step, trial)
 
-    return snr
+    return _attach_steps(snr, start, step)
             
     
+@record_spec
 def create_likelihood_ratio(name, threshold, decider):
     """ Create a likelihood_ratio function (i.e. sequential probability ratio 
     test).
@@ -283,162 +381,292 @@ def create_likelihood_ratio(name, threshold, decider):
     
     check_threshold(threshold)
 
+    # Transform threshold to suitable deciban
+    # equivilant.
+    dthreshold = threshold * 2.0
+        ## 2 decibans is 99% confidence,
+        ## so use that to map threshold (0-1)
+        ## to the deciban threshold (dthreshold).
+
+    def start(l):
+        return (0.0, 0.0, 0.0)
+            ## (cA, cB, logLR)
+
+    def step(state, t, ii, l):
+        cA, cB, logLR = state
+        if t == 'A':
+            cA += 1
+        else:
+            cB += 1
+        
+        if (cA > 0) and (cB > 0):
+            logLR += log(cA/cB, 10)
+        else:
+            return (cA, cB, logLR), None
+            ## This implementaion can't decide on all
+            ## A or B trials.  Live with this edge case for now?
+        
+        # A custom decision function
+        # was necessary:
+        state = (cA, cB, logLR)
+        if fabs(logLR) >= dthreshold:
+            if logLR > 0:
+                return state, _create_d_result('A', logLR, 0, ii+1)
+            elif logLR < 0:
+                return state, _create_d_result('B', logLR, 0, ii+1)
+            elif logLR == 0:
+                return state, _create_d_result('N', logLR, 0, ii+1)
+            else:
+                # It should be impossible to get here, however
+                # just in case something very odd happens....
+                raise ValueError(
+                        "Something is very wrong with the scores.")
+        else:
+            return state, None
+
     @update_name(name)
     def likelihood_ratio(trial):
         """ Use a version of the sequential ratio test to decide (log_10). """
     
-        # Transform threshold to suitable deciban
-        # equivilant.
-        dthreshold = threshold * 2.0
-            ## 2 decibans is 99% confidence,
-            ## so use that to map threshold (0-1)
-            ## to the deciban threshold (dthreshold).
-
-        cA = 0.0
-        cB = 0.0
-        logLR = 0.0
-        l = float(len(trial))
-        for ii,t in enumerate(trial):
-            if t == 'A':
-                cA += 1
-            else:
-                cB += 1
-        
-            if (cA > 0) and (cB > 0):
-                logLR += log(cA/cB, 10)
-            else:
-                continue
-                ## This implementaion can't decide on all
-                ## A or B trials.  Live with this edge case for now?
-        
-            # A custom decision function
-            # was necessary:
-            if fabs(logLR) >= dthreshold:
-                if logLR > 0:
-                    return _create_d_result('A', logLR, 0, ii+1)
-                elif logLR < 0:
-                    return _create_d_result('B', logLR, 0, ii+1)
-                elif logLR == 0:
-                    return _create_d_result('N', logLR, 0, ii+1)
-                else:
-                    # It should be impossible to get here, however
-                    # just in case something very odd happens....
-                    raise ValueError(
-                            "Something is very wrong with the scores.")
-        else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
+        return _walk(start, step, trial)
+
+    return _attach_steps(likelihood_ratio, start, step)
+
+
+_P_RESPONSE = dict()
+    ## l -> p(correct response) table, 
+    ## see _p_response_table()
+
+
+def _p_response_sums(unseen):
+    """ Return, for <unseen> exemplars, the p(correct response) for each 
+    number of terms, n, in Cisek's sum (0 to <unseen>), as a list.
+
+    While the factorials fit in a float the terms are summed as they 
+    always were (so entries, and decisions, are unchanged); beyond that 
+    each entry is the exact ratio unseen * sum(C(unseen, k)) / 
+    (unseen! * 2^unseen), correctly rounded, so it never overflows. """
+
+    ps = [0.0]
+    try:
+        rescaler = unseen / (2.0 ** unseen)
+        remaining_combinations = 0
+        for k in range(unseen):
+            remaining_combinations += 1.0 / (factorial(k) * 
+                    factorial(unseen - k))
+            ps.append(rescaler * remaining_combinations)
+    except OverflowError:
+        ps = [0.0]
+        denominator = factorial(unseen) * 2 ** unseen
+        binomial = 1
+        combinations = 0
+        for k in range(unseen):
+            combinations += binomial
+            binomial = binomial * (unseen - k) // (k + 1)
+            ps.append(truediv(unseen * combinations, denominator))
+
+    return ps
+
+
+def _p_response_table(l):
+    """ Return Cisek's p(correct response) for every count of A and B in a 
+    trial of length <l>, as a (l+1 x l+1) array, p[cA, cB] for A (and 
+    p[cB, cA] for B).  Counts that sum to more than <l> are NaN.
+
+    Tables are computed once per l (see _p_response_sums()) and 
+    cached. """
+
+    l = int(l)
+    if l in _P_RESPONSE:
+        return _P_RESPONSE[l]
 
-    return likelihood_ratio
+    sums = [_p_response_sums(unseen) for unseen in range(l + 1)]
+        ## sums[cN][n]; the rescaler, cN / 2^cN,
+        ## times the sum of the first n terms
+
+    maxN = (l // 2) - 1
+    table = np.full((l + 1, l + 1), np.nan)
+    for c in range(l + 1):
+        for other in range(l + 1 - c):
+            unseen = l - (c + other)
+            table[c, other] = sums[unseen][min(unseen, abs(maxN - c))]
+
+    _P_RESPONSE[l] = table
+
+    return table
 
 
 def _p_response(trial, i, letter):
     """ Use Cisek's method to calculate the p(correct response) for <letter>
     (i.e. A or B) for <trial> sliced from 0 to <i>. """
     
-    from math import factorial
-    
-    print("i: {0}".format(i))
-    print("trial: {0}".format(trial))
-    
-    # Find the counts for A or B
-    # from 0:i
-    cA = 0
-    cB = 0
-    for t in trial[0:i+1]:
-        if t == 'A':
-            cA += 1
-        else:
-            cB += 1
-    
-    # print("cA: {0}, cB: {1}".format(cA, cB))
-    # And the number of unseen   
-    l = len(trial)
-    # print("l: {0}".format(l))
-    # print("cA: {0}".format(cA))
-    # print("cB: {0}".format(cB))
-    # print("cA+cA: {0}".format(cA+cB))
-    cN = l - (cA + cB)
-
-    # Use letter to decide the sum
-    # index, in part anyway
+    cA = trial[0:i+1].count('A')
+    cB = (i + 1) - cA
+    table = _p_response_table(len(trial))
+
+    # Use letter to decide the 
+    # order of the counts
     if letter == 'A':
-        sumlim = cA
+        return table[cA, cB]
     elif letter == 'B':
-        sumlim = cB
+        return table[cB, cA]
     else:
-        raise ValueError('letter must be A or B not (0}).'.format(letter))
-    # print("sumlim: {0}".format(sumlim))
-        
-    # Create the summation index
-    maxN = (len(trial)/2) - 1
-    possN =  int(fabs(maxN - sumlim))
-
-    # print("cN: {0}".format(cN))
-    # print("maxN: {0}".format(maxN))
-    # print("possN: {0}".format(possN))
-    
-    sumindex = range(min(cN, possN))
-    # print("sumindex: {0}".format(sumindex))
-    
-    # Finally calculate the p(correct response)
-    # for either A or B depending on letter 
-    # (i.e. letter)
-    factorials = [1.0 / (factorial(k) * factorial((cN - k))) for k in sumindex]
-    # print("factorials: {0}".format(factorials))
-    remaining_combinations = sum(
-        factorials
-    )
-    # print("remaining_combinations: {0}".format(remaining_combinations))
-    
-    rescaler = (cN / (2.0 ** cN))
-    # print("rescaler: {0}".format(rescaler))
-    
-    p_r = rescaler * remaining_combinations
-    
-    
-    return p_r
+        raise ValueError('letter must be A or B not ({0}).'.format(letter))
     
         
+@record_spec
 def create_urgency_gating(name, threshold, decider, gain=0.4):
     """ Create a urgency gating function (i.e. implement: 
     Cisek et al (2009). Decision making in changing 
     conditions: The urgency gating model, J Neuro, 29(37) 
-    11560-11571.) """
+    11560-11571.) 
+    
+    The p(correct response) at each step is looked up in a 
+    table shared by every urgency gating model (see 
+    _p_response_table()), so each step is O(1). """
     
     check_threshold(threshold)
 
+    def start(l):
+        return (0, 0)
+
+    def step(state, t, ii, l):
+        cA, cB = state
+
+        # Update counts based on t
+        if t == 'A':
+            cA += 1
+        else:
+            cB += 1
+
+        table = _p_response_table(l)
+        urgency = ii  ## urgency is elapsed "time",
+                      ## i.e. a index of trial length
+        score_A = fabs(gain * urgency * (table[cA, cB] - 0.5))
+        score_B = fabs(gain * urgency * (table[cB, cA] - 0.5))
+
+        return (cA, cB), decider(score_A, score_B, threshold, ii+1)
+
     @update_name(name)    
     def urgency_gating(trial):
         """ Decide using Cisek's (2009) urgency gating algorithm. """
         
-        l = float(len(trial))
-        for ii, t in enumerate(trial):
-            urgency = ii  ## urgency is elapsed "time",
-                          ## i.e. a index of trial length
-            
-            pA_ii = _p_response(trial, ii, 'A')
-            pB_ii = _p_response(trial, ii, 'B')
-            print("pA_ii: {0}".format(pA_ii))
-            print("pB_ii: {0}".format(pB_ii))
-            
-            score_A = fabs(gain * urgency * (pA_ii - 0.5))
-            score_B = fabs(gain * urgency * (pB_ii - 0.5))
-            print("score_A: {0}".format(score_A))
-            print("score_B: {0}".format(score_B))
-
-            decision = decider(score_A, score_B, threshold, ii+1)
-            if decision != None:
-                return decision
+        return _walk(start, step, trial)
+
+    _attach_steps(urgency_gating, start, step)
+
+    def scores(matrix):
+        l = matrix.shape[1]
+        cA = np.cumsum(matrix, axis=1, dtype=np.int64)
+        cB = np.arange(1, l + 1) - cA
+        table = _p_response_table(l)
+        urgency = np.arange(l)
+
+        return np.abs(gain * urgency * (table[cA, cB] - 0.5)), \
+                np.abs(gain * urgency * (table[cB, cA] - 0.5))
+
+    return _attach_batch(urgency_gating, scores, decider, threshold)
+
+
+def _linear_accumulator(name, threshold, decider, start_point, gain, leak, 
+        inhibition, floor=None, sequential=False, exclusive_floor=False):
+    """ Create a model whose 2 accumulators (A, B) follow a linear 
+    state-space update.  At each step, for the input u (1, 0 for an 'A'
+    and 0, 1 for a 'B') and the state x (the A and B scores), 
+
+        x = x + (gain . u - leak * x) - inhibition . x
+
+    where <gain> and <inhibition> are 2 x 2 matrices (the input weights 
+    and the (lateral) inhibition) and <leak> is a number.  Both 
+    accumulators start at <start_point>. 
+    
+    If <floor> is not None, scores are clamped from below at <floor>
+    (if <exclusive_floor> only A is clamped when both are below, as 
+    in Usher and McClelland's ballistic LCA, see create_blca()).  If 
+    <sequential> B is updated with the new A score (rather than the 
+    last).
+
+    The model has resumable (start, step) and batch forms; the batch
+    form updates every trial at once, one step at a time. """
+
+    check_threshold(threshold)
+    
+    start_point = float(start_point)
+    leak = float(leak)
+    (gAA, gAB), (gBA, gBB) = [[float(g) for g in row] for row in gain]
+    (wAA, wAB), (wBA, wBB) = [[float(w) for w in row] for row in inhibition]
+
+    def update(score_A, score_B, uA, uB):
+        ## Works for numbers or arrays
+        new_A = score_A + ((gAA * uA + gAB * uB - leak * score_A) - 
+                (wAA * score_A + wAB * score_B))
+        if sequential:
+            score_A = new_A
+        new_B = score_B + ((gBA * uA + gBB * uB - leak * score_B) - 
+                (wBA * score_A + wBB * score_B))
+
+        return new_A, new_B
+
+    def start(l):
+        return (start_point, start_point)
+
+    def step(state, t, ii, l):
+        if t == 'A':
+            score_A, score_B = update(state[0], state[1], 1.0, 0.0)
         else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
+            score_A, score_B = update(state[0], state[1], 0.0, 1.0)
+
+        # Scores must be above the 
+        # floor, reset if otherwise
+        if floor is not None:
+            if exclusive_floor:
+                if score_A < floor:
+                    score_A = floor
+                elif score_B < floor:
+                    score_B = floor
+            else:
+                score_A = max(score_A, floor)
+                score_B = max(score_B, floor)
+
+        return (score_A, score_B), decider(score_A, score_B, threshold, ii+1)
+
+    @update_name(name)
+    def linear_accumulator(trial):
+        """ Decide with a linear accumulator model. """
+
+        return _walk(start, step, trial)
+
+    _attach_steps(linear_accumulator, start, step)
+
+    def scores(matrix):
+        n, l = matrix.shape
+        inputs = matrix.astype(float)
+        scores_A = np.empty((n, l))
+        scores_B = np.empty((n, l))
+
+        score_A = np.full(n, start_point)
+        score_B = np.full(n, start_point)
+        for ii in range(l):
+            score_A, score_B = update(score_A, score_B, 
+                    inputs[:, ii], 1.0 - inputs[:, ii])
+            if floor is not None:
+                if exclusive_floor:
+                    below_A = score_A < floor
+                    score_A = np.where(below_A, floor, score_A)
+                    score_B = np.where(~below_A & (score_B < floor), 
+                            floor, score_B)
+                else:
+                    score_A = np.maximum(score_A, floor)
+                    score_B = np.maximum(score_B, floor)
+            scores_A[:, ii] = score_A
+            scores_B[:, ii] = score_B
+
+        return scores_A, scores_B
 
-    return urgency_gating
+    return _attach_batch(linear_accumulator, scores, decider, threshold)
 
 
+@record_spec
 def create_incremental_lba(name, threshold, decider, k=0.1, d=0.1):
     """ Create a version of Brown and Heathcote's (2008) LBA 
     model modified so A/B updates are exclusive rather than simultaneous. 
@@ -449,45 +677,17 @@ def create_incremental_lba(name, threshold, decider, k=0.1, d=0.1):
     d - the drift rate.
     """ 
     
-    k = float(k)
-    d = float(d)
-        ## Just in case 
-        ## they're int
-
-    check_threshold(threshold)
-
-    @update_name(name)
-    def incremental_lba(trial):
-        """ Use Brown and Heathcote's (2008) LBA model, modified so A/B updates 
-        are exclusive rather than simultanous, to make the decision. """
-        
-        # Init
-        score_A = k
-        score_B = k
-        for ii, t in enumerate(trial):
-            if t == 'A':
-                # An incremental version of LBA.
-                # that recognizes the balistic updates 
-                # are exclusive.  A and B updates happen
-                # at each time step.  In this form
-                # updates are exclusive to A or B
-                # but still ballistic.
-                score_A += d
-            else:
-                score_B += d
-                
-            decision = decider(score_A, score_B, threshold, ii+1)
-            if decision != None:
-                return decision
-        else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)            
-    
-    return incremental_lba
+    return _linear_accumulator(name, threshold, decider, start_point=k, 
+            gain=[[d, 0], [0, d]], leak=0, inhibition=[[0, 0], [0, 0]])
+        ## An incremental version of LBA.
+        ## that recognizes the balistic updates 
+        ## are exclusive.  A and B updates happen
+        ## at each time step.  In this form
+        ## updates are exclusive to A or B
+        ## but still ballistic.
     
-# TODO -- test, 
 
+@record_spec
 def create_blca(name, threshold, decider, length=10, k=0.1, wi=0.1, leak=0.1, beta=0.1):
     """ Creates a ballistic leaky competing accumulator model based on,
     
@@ -505,81 +705,184 @@ def create_blca(name, threshold, decider, length=10, k=0.1, wi=0.1, leak=0.1, be
     wi - Initial connection weight (same for both A and B)
     leak - Leak rate
     beta - Inhibition strength
+
+    Note: As it always has, k is also used as the leak rate (<leak> is 
+    unused), B is updated after (and with) the new A and when both A and B 
+    go below 0 only A is reset.  See create_blca_freex() for the 
+    standard form.
     """
     
-    check_threshold(threshold)
+    return _linear_accumulator(name, threshold, decider, start_point=k,
+            gain=[[wi, 0], [0, wi]], leak=k, 
+            inhibition=[[0, beta], [beta, 0]], floor=0, sequential=True, 
+            exclusive_floor=True)
+
+
+@record_spec
+def create_blca_freex(name, threshold, decider, k=0.1, wi=0.1, leak=0.1, 
+        beta=0.1):
+    """ Creates the standard form of the leaky competing accumulator 
+    model (Usher and McClelland, 2001), see create_blca(): A and B are 
+    updated together, leak with <leak>, inhibit each other with <beta>, 
+    and are both kept above 0. 
     
-    @update_name(name)
-    def blcba(trial):
-        """ Decide using Usher and McClelland's (2001) ballistic leaky
-        competing accumulator model. """
-
-    	score_A = k
-        score_B = k
-        # impulse = wi * (1.0 / length) 
-        for ii, t in enumerate(trial):
-            # As score_A + score_B = 1, if one is 1, the
-            # other must be zero.
-            if t == 'A':
-                score_A += wi * 1 - (k * score_A) - beta * score_B
-                score_B += wi * 0 - (k * score_B) - beta * score_A
-            else:
-                score_A += wi * 0 - (k * score_A) - beta * score_B
-                score_B += wi * 1 - (k * score_B) - beta * score_A
-            
-            # print("{2} - {3}. score_A: {0}, score_B: {1}".format(
-                # score_A, score_B, ii, t))
-            
-            # Scores must be postive, 
-            # reset if otherwise
-            if score_A < 0:
-                # print("Reset A")
-                score_A = 0
-            elif score_B < 0:
-                score_B = 0
-                # print("Reset B")
-            
-            decision = decider(score_A, score_B, threshold, ii+1)
-            if decision != None:
-                # print("hit")
-                return decision
-        else:
-            # If threshold is never met,
-            # we end up here...
-            return _create_d_result('N', None, None, None)
-        
-    return blcba
+    Input
+    ----
+    k - Start point
+    wi - Input weight (same for both A and B)
+    leak - Leak rate
+    beta - Inhibition strength
+    """
 
-  
-# TODO -- Once the org is tested, create free x version of Usher
-def create_blca_freex():
-    pass
+    return _linear_accumulator(name, threshold, decider, start_point=k,
+            gain=[[wi, 0], [0, wi]], leak=leak, 
+            inhibition=[[0, beta], [beta, 0]], floor=0)
 
 
-# TODO
-def create_race(name, threshold, decider):
+@record_spec
+def create_race(name, threshold, decider, d=0.1, k=0.0, leak=0.0):
     """ Create a race to threshhold model as described in 
     
     Rowe et al (2010). Action selection: a race model for the selection and 
     non-selected actions distinguishes the contribution of premotor and 
     prefrontal areas. 
 
+    (and LaBerge, 1962; Logan, 2002).  A and B accumulate independently.
+
+    Input
+    -----
+    d - the drift rate.
+    k - the start point.
+    leak - the leak rate (0 is a perfect race). 
+    """
+
+    return _linear_accumulator(name, threshold, decider, start_point=k,
+            gain=[[d, 0], [0, d]], leak=leak, inhibition=[[0, 0], [0, 0]],
+            floor=0)
+
+
+@record_spec
+def create_feedforward_inhibition(name, threshold, decider, d=0.1, w=0.5, 
+        k=0.0):
+    """ Create a feed forward inhibition model (see Usher and McClelland, 
+    2001; Shadlen and Newsome, 2001); each exemplar drives its own 
+    accumulator (by <d>) and inhibits the other (by <w> * <d>).
+    
+    Input
+    -----
+    d - the drift rate.
+    w - the feed forward inhibition weight.
+    k - the start point.
+    """
+
+    return _linear_accumulator(name, threshold, decider, start_point=k,
+            gain=[[d, -w * d], [-w * d, d]], leak=0, 
+            inhibition=[[0, 0], [0, 0]], floor=0)
+
+
+@record_spec
+def create_pooled_inhibition(name, threshold, decider, d=0.1, w=0.1, 
+        leak=0.1, k=0.0):
+    """ Create a linearized version of Wang's (2002) pooled inhibition
+    model (following Bogacz et al., 2006, section 2.8); both accumulators 
+    are inhibited by (<w> times) a pool driven by both.
+    
     Input
     -----
-     
+    d - the drift rate.
+    w - the pooled inhibition weight.
+    leak - the leak rate. 
+    k - the start point.
+    """
+
+    return _linear_accumulator(name, threshold, decider, start_point=k,
+            gain=[[d, 0], [0, d]], leak=leak, inhibition=[[w, w], [w, w]],
+            floor=0)
+
+
+@record_spec
+def create_drift(name, threshold, decider, v=0.1, sigma=0.1, z=0.0):
+    """ Create a version of Ratcliff's (1978) drift diffusion model.  A 
+    single accumulator starts at <z> and, for each exemplar, drifts by <v>
+    (up for an 'A', down for a 'B') plus Gaussian noise (sd <sigma>).  An 
+    'A' is chosen when it reaches the upper bound, a 'B' the lower.
+
+    The model itself (and its resumable and batch forms) is the noise free 
+    (mean) path; the A score is the accumulator, the B score its negative.
+    So with the absolute decider the bounds are +/- <threshold>, and with 
+    the difference decider +/- <threshold> / 2.  The noisy model is 
+    attached (see accumulate.models.ddm) as
+
+        model.simulate(matrix, replicates, seed, substeps, trials, 
+                chunksize) - Euler-Maruyama replicates, the decision codes
+            and rts
+        model.passage(trial_codes, l, n_grid, n_terms) - the (series)
+            first passage probabilities, approximated on a grid, by 
+            exemplar, for the upper (A) and lower (B) bounds; likelihoods
+            for fitting (see accumulate.fit.base.FitTrials.log_likelihood())
+
+    Input
+    -----
+    v - the drift rate.
+    sigma - the noise (sd, per exemplar).
+    z - the start point.
     """
 
     check_threshold(threshold)
+    if sigma <= 0:
+        raise ValueError('<sigma> must be greater than 0.')
+
+    bound = threshold
+    if decider == difference:
+        bound = threshold / 2.0
+    if fabs(z) >= bound:
+        raise ValueError('<z> must be within the bounds.')
+
+    def start(l):
+        return (0, 0)
+
+    def step(state, t, ii, l):
+        cA, cB = state
+        if t == 'A':
+            cA += 1
+        else:
+            cB += 1
+        x = z + v * float(cA - cB)
+            ## As in scores(), so both forms
+            ## round (and so decide) the same
+
+        return (cA, cB), decider(x, -x, threshold, ii+1)
 
     @update_name(name)
-    def race(trial):
-        """ A race to threshold model. """
-    
-             
-            
-    return race
+    def drift(trial):
+        """ Decide with the (noise free) drift diffusion model. """
+
+        return _walk(start, step, trial)
+
+    _attach_steps(drift, start, step)
+
+    def scores(matrix):
+        cA, cB = _running_counts(matrix)
+        x = z + v * (cA - cB)
+
+        return x, -x
+
+    def simulate(matrix, replicates=1000, seed=0, substeps=20, trials=None,
+            chunksize=32):
+        return ddm.simulate(matrix, v, sigma, bound, z, replicates, 
+                substeps, seed, trials, chunksize)
+
+    def passage(trial_codes, l, n_grid=100, n_terms=None):
+        return ddm.passage(trial_codes, l, v, sigma, bound, z, n_grid, 
+                n_terms)
+
+    drift.simulate = simulate
+    drift.passage = passage
+
+    return _attach_batch(drift, scores, decider, threshold)
 
 
+@record_spec
 def create_maximim(name, threshold, decider):
     """
     TODO
@@ -592,6 +895,7 @@ def create_maximim(name, threshold, decider):
     return maximin
 
 
+@record_spec
 def create_robust_satisficing(name, threshold, decider):
     """
     TODO
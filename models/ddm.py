@@ -0,0 +1,209 @@
+""" The drift diffusion (Ratcliff, 1978) machinery for create_drift() in
+accumulate.models.construct.
+
+Evidence x starts at z and, while the <ii>th exemplar is shown (a unit of
+time), diffuses with drift v (for an 'A', -v for a 'B') and sd sigma.  An
+'A' is chosen when x reaches a, a 'B' when it reaches -a.
+
+simulate() runs replicates by Euler-Maruyama.  As the drift is constant
+within each exemplar, first passage probabilities can also be
+approximated closely: for constant drift the density inside the bounds
+has a series solution, and the probability of ever leaving by either bound
+a closed form, so each exemplar is a (grid) transition matrix plus two
+vectors of exit probabilities.  See passage(). """
+import numpy as np
+from accumulate.models.noise import Noise
+
+
+def _mass(x0, grid, h, tau, mu, sigma, a, n_terms=None):
+    """ Return the mass in each cell of <grid> (spacing <h>) at time <tau>,
+    of diffusions from each of <x0> (an array) that have stayed within
+    (-a, a), as a (len(x0) x len(grid)) array.
+
+    The density is the method of images series (<n_terms> image pairs
+    either side, by default enough for it to converge), with the drift's
+    tilt folded into the exponent of each term, so no term is ever larger
+    than the free density however small sigma is.  Cells narrower than the
+    density are integrated at several points. """
+
+    L = 2.0 * a
+    s2 = sigma ** 2
+    s2t = s2 * tau
+    sd = np.sqrt(s2t)
+    if n_terms is None:
+        n_terms = int(np.ceil((abs(mu) * tau + 8 * sd) / L)) + 1
+
+    n_sub = int(np.ceil(2 * h / sd))
+    offsets = h * ((np.arange(n_sub) + 0.5) / n_sub - 0.5)
+    y = (grid[:, None] + offsets[None, :]).ravel() + a
+    y0 = np.asarray(x0, dtype=float)[:, None] + a
+        ## Distances from the lower bound
+
+    density = np.zeros((len(y0), len(y)))
+    for k in range(-n_terms, n_terms + 1):
+        c = 2 * k * L
+        density += np.exp(-(y - y0 + c - mu * tau) ** 2 / (2 * s2t) -
+                2 * mu * k * L / s2)
+        density -= np.exp(-(y + y0 + c - mu * tau) ** 2 / (2 * s2t) -
+                2 * mu * (y0 + k * L) / s2)
+            ## The free and reflected images, tilted
+
+    density /= np.sqrt(2 * np.pi * s2t)
+
+    return density.reshape(len(y0), len(grid), n_sub).sum(axis=2) * \
+            (h / n_sub)
+
+
+def _p_upper(x0, mu, sigma, a):
+    """ Return the probability that diffusions from each of <x0> ever
+    reach a before -a (the classic closed form). """
+
+    if mu == 0:
+        return (x0 + a) / (2.0 * a)
+    elif mu < 0:
+        return 1 - _p_upper(-x0, -mu, sigma, a)
+            ## By symmetry; keeps the exponents negative
+
+    k = 2 * mu / sigma ** 2
+
+    return np.expm1(-k * (x0 + a)) / np.expm1(-2 * k * a)
+
+
+def _exemplar(x0, grid, h, mu, sigma, a, n_terms):
+    """ Return, for diffusions from each of <x0> over one exemplar, the
+    mass left at each point of <grid> (spacing <h>) and the probabilities
+    of leaving by the upper and lower bounds.
+
+    Of those that ever reach the upper bound, those still inside will go
+    on to, so the upper bound is reached during the exemplar with
+    probability _p_upper(x0) minus the mass left times _p_upper(grid).
+    Each row is kept a distribution: nothing is negative, and the mass
+    left and both exits sum to 1. """
+
+    mass = np.clip(_mass(x0, grid, h, 1.0, mu, sigma, a, n_terms), 0, None)
+    total = mass.sum(axis=1)
+    over = total > 1
+    mass[over] /= total[over, None]
+    total = np.minimum(total, 1)
+
+    upper = np.clip(_p_upper(x0, mu, sigma, a) - mass.dot(_p_upper(grid,
+            mu, sigma, a)), 0, 1 - total)
+    lower = 1 - total - upper
+
+    return mass, upper, lower
+
+
+def passage(trial_codes, l, v, sigma, a, z=0.0, n_grid=100, n_terms=None):
+    """ Return the probability that the diffusion first reaches the upper
+    (A) and lower (B) bound during each exemplar, as two (n_trials x l)
+    arrays, for <trial_codes> (packed trials of length <l>).  The
+    probability of no decision is 1 minus their (row) sums.
+
+    Inside the bounds the density is kept on a grid of <n_grid> points
+    (more is closer, and slower), and the series have <n_terms> image
+    pairs (by default enough to converge, see _mass()).  Trials that
+    share a prefix share its work. """
+
+    l = int(l)
+    trial_codes = np.asarray(trial_codes)
+    dt = trial_codes.dtype.type
+
+    h = 2.0 * a / n_grid
+    grid = -a + (np.arange(n_grid) + 0.5) * h
+
+    # The transition (mass) matrix and exit probabilities
+    # for an 'A' (drift v) and a 'B' (drift -v), from the grid
+    # and from the start point.
+    kernels = dict()
+    starts = dict()
+    for t, mu in ((1, v), (0, -v)):
+        kernels[t] = _exemplar(grid, grid, h, mu, sigma, a, n_terms)
+        mass, upper, lower = _exemplar(np.array([float(z)]), grid, h, mu,
+                sigma, a, n_terms)
+        starts[t] = (mass[0], upper[0], lower[0])
+
+    p_A = np.zeros((len(trial_codes), l))
+    p_B = np.zeros((len(trial_codes), l))
+
+    # The first exemplar, from the start
+    first = (trial_codes & dt(1)).astype(int)
+    mass = np.array([starts[0][0], starts[1][0]])
+        ## (prefix x grid); prefixes 'B', 'A'
+    p_A[:, 0] = np.array([starts[0][1], starts[1][1]])[first]
+    p_B[:, 0] = np.array([starts[0][2], starts[1][2]])[first]
+    prefixes = np.array([0, 1], dtype=trial_codes.dtype)
+
+    # Then each prefix, (once), from its parent
+    for ii in range(1, l):
+        codes_ii = trial_codes & dt((1 << (ii + 1)) - 1)
+        children, index = np.unique(codes_ii, return_inverse=True)
+        parent = np.searchsorted(prefixes, children & dt((1 << ii) - 1))
+            ## The prefixes, exemplars 0 to ii, and their parents
+        t = ((children >> dt(ii)) & dt(1)).astype(bool)
+
+        new_mass = np.empty((len(children), n_grid))
+        up = np.empty(len(children))
+        down = np.empty(len(children))
+        for value, (kernel, upper, lower) in kernels.items():
+            rows = t == bool(value)
+            m = mass[parent[rows]]
+            new_mass[rows] = m.dot(kernel)
+            up[rows] = m.dot(upper)
+            down[rows] = m.dot(lower)
+
+        p_A[:, ii] = up[index]
+        p_B[:, ii] = down[index]
+        mass = new_mass
+        prefixes = children
+
+    return np.clip(p_A, 0, 1), np.clip(p_B, 0, 1)
+
+
+def simulate(matrix, v, sigma, a, z=0.0, replicates=1000, substeps=20,
+        seed=0, trials=None, chunksize=32):
+    """ Simulate <replicates> of the diffusion over each trial in <matrix>
+    (a (n_trials x l) 0/1 matrix, 1 is an 'A'), by Euler-Maruyama with
+    <substeps> steps per exemplar.  Bounds are only checked at each step,
+    so a few crossings are missed (fewer with more <substeps>).
+
+    Noise is from accumulate.models.noise.Noise (keyed by <seed> and the
+    <trials> indices, by default the row numbers) so it is reproducible
+    however the trials are split.  Trials are run <chunksize> at a time,
+    so only that many trials' noise is ever held in memory.
+
+    Returns the decision codes (1 for 'A', -1 for 'B', 0 for none) and rts
+    (the exemplar during which a bound was reached, 1 to l, -1 for none),
+    as (n_trials x replicates) arrays. """
+
+    n, l = matrix.shape
+    if trials is None:
+        trials = np.arange(n)
+    trials = np.asarray(trials)
+
+    dt_ = 1.0 / substeps
+    noise = Noise('gaussian', seed, scale=sigma * np.sqrt(dt_))
+    drift = np.where(matrix == 1, v, -v) * dt_
+
+    decision = np.zeros((n, replicates), dtype=np.int8)
+    rt = np.full((n, replicates), -1, dtype=np.int16)
+    for start in range(0, n, int(chunksize)):
+        stop = min(start + int(chunksize), n)
+        draws = noise.block(trials[start:stop], l * substeps, replicates)
+
+        x = np.full((stop - start, replicates), float(z))
+        d = decision[start:stop]
+        r = rt[start:stop]
+            ## Views; filled in place
+        for step in range(l * substeps):
+            ii = step // substeps
+            undecided = d == 0
+            x = np.where(undecided,
+                    x + drift[start:stop, ii, None] + draws[:, step], x)
+
+            hit_A = undecided & (x >= a)
+            hit_B = undecided & (x <= -a)
+            d[hit_A] = 1
+            d[hit_B] = -1
+            r[hit_A | hit_B] = ii + 1
+
+    return decision, rt
@@ -1,26 +1,135 @@
 # TODO Rework code so either an abs or relative (i.e. difference) dicider can be used interchangably.
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+
+DECISION_CODES = {'A' : 1, 'B' : -1, 'N' : 0}
+    ## Decisions as stored in the batch (array)
+    ## results, see _create_batch_result()
+
+_DECISIONS = dict([(code, decision) for decision, code in
+        DECISION_CODES.items()])
+
+_RESULT_KEYS = ('decision', 'chosen_score', 'unchosen_score', 'rt')
+_RESULT_INDEX = {'chosen_score' : 1, 'unchosen_score' : 2, 'rt' : 3}
+
+
+class DecisionResult(namedtuple('DecisionResult', 
+        ['code', 'chosen_score', 'unchosen_score', 'rt'])):
+    """ A decision, as (code, chosen_score, unchosen_score, rt); code is 
+    as in DECISION_CODES.  It is a tuple, so needs no dict per result, and
+    can be stored as is in (or copied from) arrays, e.g. a ResultTable.
+
+    It is also a read only, dict-compatible view of the old result dicts;
+    result['decision'] is the decision ('A', 'B' or 'N'), and 
+    result['rt'] etc. are the fields.  As for a dict, iteration is over 
+    the keys, and results are equal to dicts with the same keys and 
+    values.  Use the attributes (or indices, or slices) for the values.
+
+    As it is still a tuple, json.dumps() writes a list; write 
+    result.copy(), a dict, instead. """
+
+    __slots__ = ()
+
+    @property
+    def decision(self):
+        return _DECISIONS[self.code]
+
+    def __getitem__(self, key):
+        if key == 'decision':
+            return _DECISIONS[tuple.__getitem__(self, 0)]
+        try:
+            key = _RESULT_INDEX[key]
+        except (KeyError, TypeError):
+            pass
+                ## An index (or a slice)
+
+        return tuple.__getitem__(self, key)
+
+    def __iter__(self):
+        return iter(_RESULT_KEYS)
+
+    def __contains__(self, key):
+        return key in _RESULT_KEYS
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+    def get(self, key, default=None):
+        if key in _RESULT_KEYS:
+            return self[key]
+
+        return default
+
+    def keys(self):
+        return list(_RESULT_KEYS)
+
+    def values(self):
+        return [self[key] for key in _RESULT_KEYS]
+
+    def items(self):
+        return list(zip(_RESULT_KEYS, self.values()))
+
+    def copy(self):
+        """ Return the result as a (mutable) dict. """
+
+        return dict(self.items())
+
+    # The namedtuple methods iterate over
+    # the values, so are redone by index.
+    def _asdict(self):
+        return OrderedDict(zip(self._fields, self[:]))
+
+    def _replace(self, **kwds):
+        values = self._asdict()
+        for key in kwds:
+            if key not in values:
+                raise ValueError('Got unexpected field names: {0}'.format(
+                        key))
+        values.update(kwds)
+
+        return self._make(values.values())
+
+    def __getnewargs__(self):
+        return self[:]
+
+    def __reduce__(self):
+        return (self.__class__, self[:])
+
+
+NO_DECISION = DecisionResult(0, None, None, None)
+    ## Immutable, so shared by every 
+    ## trial without a decision.
 
 
 def _create_d_result(decision, chosen_score, unchosen_score, rt):
-    """ Converts the decision data to a dictionary. """
+    """ Converts the decision data to a DecisionResult. """
     
-    return {
-        'decision' : decision,
-        'chosen_score' : chosen_score,
-        'unchosen_score' : unchosen_score,
-        'rt' : rt
-    }
+    if rt is None and decision == 'N':
+        return NO_DECISION
+
+    return DecisionResult(DECISION_CODES[decision], chosen_score, 
+            unchosen_score, rt)
 
 
 def _result_return(score_A, score_B, trial_counter):
     """ To be run after a succesful threshold check. Returns the result. """
     
     if score_A > score_B:
-        return _create_d_result('A', score_A, score_B, trial_counter)
+        return DecisionResult(1, score_A, score_B, trial_counter)
     elif score_A < score_B:
-        return _create_d_result('B', score_B, score_A, trial_counter)
+        return DecisionResult(-1, score_B, score_A, trial_counter)
     elif score_A == score_B:
-        return _create_d_result('N', score_A, score_B, trial_counter)
+        return DecisionResult(0, score_A, score_B, trial_counter)
      ## It is unlikely that this case will
      ## ever occur however I feel it is 
      ## better to deal with this case explictly,
@@ -79,3 +188,155 @@ def tied(score_A, threshold, trial_counter):
         return None
 
 
+def batch_absolute(scores_A, scores_B, threshold):
+    """ The array form of absolute(); returns a boolean matrix that is True
+    wherever the threshold is met or exceeded. """
+    
+    return (scores_A >= threshold) | (scores_B >= threshold)
+
+
+def batch_difference(scores_A, scores_B, threshold):
+    """ The array form of difference(); returns a boolean matrix that is 
+    True wherever the threshold is met or exceeded. """
+    
+    return np.abs(scores_A - scores_B) >= threshold
+
+
+def batch_tied(scores_A, scores_B, threshold):
+    """ The array form of tied(); returns a boolean matrix that is 
+    True wherever the threshold is met or exceeded.  
+    
+    Note: as in tied() only <scores_A> is used to test the threshold; 
+    <scores_B> should be 1 - <scores_A>. """
+    
+    return (scores_A >= threshold) | ((1 - scores_A) >= threshold)
+
+
+_BATCH_DECIDERS = {
+    absolute : batch_absolute,
+    difference : batch_difference,
+    tied : batch_tied
+}
+
+
+def batch_decider(decider):
+    """ Return the array form of <decider>, or None if it has none. """
+    
+    return _BATCH_DECIDERS.get(decider)
+
+
+def first_crossing(met):
+    """ Return the index of the first step where <met> (an (n_trials x l)
+    boolean matrix, from a batch_* decider) is True in each row, or -1 if
+    it never is. """
+
+    first = met.argmax(axis=1)
+        ## argmax finds the first True; when there is
+        ## none it is 0, so check.
+    first[~met[np.arange(met.shape[0]), first]] = -1
+
+    return first
+
+
+def crossings(decider, scores_A, scores_B, threshold):
+    """ The array in, array out form of <decider>; return the index of 
+    the step where each row (trial) of the (n_trials x l) score matrices
+    first meets <threshold>, or -1 if none does. """
+
+    decide = batch_decider(decider)
+    if decide is None:
+        raise ValueError('<decider> has no array form.')
+
+    with np.errstate(invalid='ignore'):
+        ## NaN scores never meet threshold
+        return first_crossing(decide(scores_A, scores_B, threshold))
+
+
+def _absolute_statistic(scores_A, scores_B):
+    return np.fmax(scores_A, scores_B)
+
+
+def _difference_statistic(scores_A, scores_B):
+    return np.abs(scores_A - scores_B)
+
+
+def _tied_statistic(scores_A, scores_B):
+    return np.fmax(scores_A, 1 - scores_A)
+
+
+_STATISTICS = {
+    absolute : _absolute_statistic,
+    difference : _difference_statistic,
+    tied : _tied_statistic
+}
+
+
+def batch_statistic(decider):
+    """ Return the statistic <decider> compares to its threshold, as a
+    function of the score matrices, or None if it has none.  The decider
+    is met wherever statistic(scores_A, scores_B) >= threshold. 
+    
+    The statistic is NaN where no decision can be made. """
+
+    return _STATISTICS.get(decider)
+
+
+def _create_batch_result(decision, chosen_score, unchosen_score, rt):
+    """ The array form of _create_d_result(). 
+    
+    Decisions are coded as in DECISION_CODES.  Trials without a 
+    decision have NaN scores and an rt of -1. """
+    
+    return {
+        'decision' : decision,
+        'chosen_score' : chosen_score,
+        'unchosen_score' : unchosen_score,
+        'rt' : rt
+    }
+
+
+def _batch_result_return(scores_A, scores_B, met):
+    """ The array form of _result_return(). 
+    
+    For each row (trial) of the (n_trials x l) score matrices find the first 
+    step where <met> (from a batch_* decider) is True, and return the results 
+    for that step. """
+    
+    first = first_crossing(met)
+    decided = first != -1
+    
+    return _batch_result_at(scores_A, scores_B, np.where(decided, first, 0),
+            decided)
+
+
+def _batch_result_at(scores_A, scores_B, first, decided):
+    """ Return the results for the step <first> of each row (trial) of
+    the score matrices, or no decision where <decided> is False. """
+
+    rows = np.arange(scores_A.shape[0])
+    score_A = scores_A[rows, first]
+    score_B = scores_B[rows, first]
+    
+    # A wins ties in chosen/unchosen, as in _result_return()
+    a_chosen = score_A >= score_B
+    decision = np.where(decided, np.sign(score_A - score_B), 0).astype(np.int8)
+    chosen_score = np.where(decided, 
+            np.where(a_chosen, score_A, score_B), np.nan)
+    unchosen_score = np.where(decided, 
+            np.where(a_chosen, score_B, score_A), np.nan)
+    rt = np.where(decided, first + 1, -1)
+    
+    return _create_batch_result(decision, chosen_score, unchosen_score, rt)
+
+
+def _unbatch(batch_result, ii):
+    """ Return the result for trial <ii> in <batch_result> as would
+    _create_d_result(). """
+    
+    rt = int(batch_result['rt'][ii])
+    if rt == -1:
+        return NO_DECISION
+    
+    return DecisionResult(int(batch_result['decision'][ii]), 
+            float(batch_result['chosen_score'][ii]),
+            float(batch_result['unchosen_score'][ii]), rt)
@@ -1,4 +1,6 @@
 """ Helper or miscellaneous functions for (accumulate) models. """
+from functools import wraps
+from inspect import getcallargs
 
 
 class update_name():
@@ -30,3 +32,56 @@ def check_threshold(threshold):
     if threshold >= 1 or threshold <= 0:
         raise ValueError('<threshold> must be between 0 - 1.')
 
+
+class ModelSpec():
+    """ A picklable description of a model: the name of its factory in
+    accumulate.models.construct and the parameters to call it with. 
+    
+    Use:
+    ----
+    >>> spec = ModelSpec('create_abscount', name='abs', threshold=0.6,
+    ...         decider=absolute)
+    >>> model = spec.build()
+    """
+
+    def __init__(self, factory, **params):
+        self.factory = factory
+        self.params = params
+
+    def __repr__(self):
+        params = ', '.join(['{0}={1!r}'.format(k, v) 
+                for k, v in sorted(self.params.items())])
+        
+        return 'ModelSpec({0!r}, {1})'.format(self.factory, params)
+
+    def build(self):
+        """ Construct the model. """
+        from accumulate.models import construct
+
+        return getattr(construct, self.factory)(**self.params)
+
+
+def record_spec(factory):
+    """ A decorator for the factories in accumulate.models.construct that
+    stores how each model was made, as model.spec (a ModelSpec of the
+    factory and all its params, defaults included).  Models then document
+    themselves, and can be rebuilt or cached (see accumulate.sim.cache).
+    
+    Use:
+    ----
+    >>> model = create_abscount('abs', 0.6, absolute)
+    >>> model.spec
+    ModelSpec('create_abscount', decider=<function absolute at ...>, 
+            name='abs', threshold=0.6)
+    """
+
+    @wraps(factory)
+    def documented(*args, **kwargs):
+        model = factory(*args, **kwargs)
+        if model is not None:
+            model.spec = ModelSpec(factory.__name__, 
+                    **getcallargs(factory, *args, **kwargs))
+
+        return model
+
+    return documented
@@ -1,8 +1,124 @@
-""" Models of noise. Each is a generator. """
+""" Models of noise. Each is a generator.
+
+Noise() adds reproducible Gaussian, uniform or Poisson accumulator noise,
+made in (trials x steps x replicates) blocks.  Its random numbers are
+keyed by (seed, substream, trial, block of replicates), so every trial and
+replicate always gets the same noise, however work is chunked or
+parallelized. """
 from itertools import repeat
 
+import numpy as np
+
+
 def dummy():
     """ Returns 0. """
-    
+
     return repeat(0.0)
 
+
+_KINDS = ('gaussian', 'uniform', 'poisson')
+
+
+class Noise():
+    """ Accumulator noise, of <kind>:
+
+        'gaussian' - normal, mean <loc> (0) and sd <scale> (1)
+        'uniform' - uniform over <loc> +/- <scale> / 2
+        'poisson' - (Poisson(<lam>) - <lam>) * <scale>, mean 0, plus <loc>
+
+    Each (trial, block of <replicate_block> replicates) has its own
+    stream, a numpy RandomState seeded with the key (<seed>, <substream>,
+    trial index, block), as 32 bit words.  Noises that share a seed but
+    not a substream are independent, so one seed can drive several kinds
+    of draws (e.g. see accumulate.sim.replicate).  Steps are drawn in
+    order, so the noise at (trial, step, replicate) never depends on how
+    many trials, steps or replicates are asked for at once.
+
+    Use:
+    ----
+    >>> noise = Noise('gaussian', seed=42, scale=0.1)
+    >>> block = noise.block(np.arange(1000), 16, 100)
+        ## trials x steps x replicates
+    >>> noise.stream(3, replicate=7)
+        ## a generator, as dummy()
+    """
+
+    def __init__(self, kind='gaussian', seed=0, loc=0.0, scale=1.0,
+            lam=1.0, replicate_block=64, substream=0):
+        if kind not in _KINDS:
+            raise ValueError("<kind> must be 'gaussian', 'uniform' or "
+                    "'poisson'.")
+        if (seed < 0) or (seed >= 2 ** 64):
+            raise ValueError('<seed> must be positive, and less than 2 ** 64.')
+        if (substream < 0) or (substream >= 2 ** 32):
+            raise ValueError(
+                    '<substream> must be positive, and less than 2 ** 32.')
+
+        self.kind = kind
+        self.seed = int(seed)
+        self.loc = loc
+        self.scale = scale
+        self.lam = lam
+        self.replicate_block = int(replicate_block)
+        self.substream = int(substream)
+
+
+    def _generator(self, trial, block):
+        """ Return the RandomState for <trial> and replicate <block>. """
+
+        mask = 2 ** 32 - 1
+        trial = int(trial)
+
+        return np.random.RandomState([self.seed & mask, 
+                (self.seed >> 32) & mask, self.substream, trial & mask, 
+                (trial >> 32) & mask, int(block) & mask])
+            ## A fixed length key, so keys 
+            ## never run into each other.
+
+
+    def _draw(self, rng, steps):
+        """ Draw <steps> rows of replicate_block values from <rng>. """
+
+        size = (steps, self.replicate_block)
+        if self.kind == 'gaussian':
+            return self.loc + self.scale * rng.standard_normal(size)
+        elif self.kind == 'uniform':
+            return self.loc + self.scale * (rng.random_sample(size) - 0.5)
+        elif self.kind == 'poisson':
+            return self.loc + self.scale * (rng.poisson(self.lam, size) -
+                    self.lam)
+
+
+    def block(self, trials, steps, replicates, first_replicate=0):
+        """ Return the noise for <trials> (trial indices), over <steps>
+        steps and <replicates> replicates (from <first_replicate>), as a
+        (n_trials x steps x replicates) array. """
+
+        trials = np.atleast_1d(trials)
+        if replicates < 1:
+            raise ValueError('<replicates> must be at least 1.')
+
+        B = self.replicate_block
+        first = first_replicate // B
+        last = (first_replicate + replicates - 1) // B
+        offset = first_replicate - first * B
+
+        noise = np.empty((len(trials), steps, replicates))
+        for ii, trial in enumerate(trials.tolist()):
+            drawn = np.hstack([self._draw(self._generator(trial, b), steps)
+                    for b in range(first, last + 1)])
+            noise[ii] = drawn[:, offset:offset + replicates]
+
+        return noise
+
+
+    def stream(self, trial, replicate=0, chunk=64):
+        """ Return a generator of the noise at each step of <trial>, for
+        <replicate> (the same values as block()). """
+
+        B = self.replicate_block
+        rng = self._generator(trial, replicate // B)
+        column = replicate % B
+        while True:
+            for value in self._draw(rng, chunk)[:, column].tolist():
+                yield value
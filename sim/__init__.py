@@ -1,3 +1,14 @@
+import bits
+import features
+import tree
+import table
 import base
+import parallel
+import sample
+import lattice
+import sweep
+import replicate
+import cache
+import trialfile
 import test
 import results
\ No newline at end of file
@@ -1,19 +1,39 @@
 import itertools
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 
 import numpy as np
 from accumulate import models
+from accumulate.sim import bits
+from accumulate.sim.tree import walk, walk_trials
+from accumulate.sim.table import ResultTable
+from accumulate.sim.features import TrialFeatures, \
+        features as first_half_features
+from accumulate.models.deciders import _unbatch
+
+
+Record = namedtuple('Record', 
+        ['trial', 'model', 'decision', 'chosen_score', 'unchosen_score', 'rt'])
+    ## One model's result for one trial, as streamed 
+    ## by Trials.iter_categorize().  trial is the trial's 
+    ## index (see Trials.trial_key())
+
 
 class Trials():
-    """ Simulate and analyze 2 category accumulation designs. """
+    """ Simulate and analyze 2 category accumulation designs. 
     
-    def __init__(self, l):
+    If <packed> is True each trial is stored as an integer code (bit i 
+    set is an 'A', see accumulate.sim.bits) and the (first half of the) 
+    trials are a numpy array of codes.  Results and meta-data are then 
+    keyed by code not by string. """
+    
+    def __init__(self, l, packed=False):
         if (l % 2) == 0:
             self.l = float(l)
         else:
             raise ValueError('l must be even.')
         
         self.l = float(l)
+        self.packed = packed
         
         self.trial_count = 0
         self.trials = self._generate_trials()
@@ -33,6 +53,11 @@ class Trials():
         self.trial_count = 0
             ## reset 
 
+        if self.packed:
+            return bits.codes(self.l)
+                ## Only the first half, as an array,
+                ## see max_trial_count below.
+
         return itertools.product('AB', repeat=int(self.l))
             ## Calculate all possible unique combinations 
             ## for a given trial length.
@@ -74,16 +99,195 @@ class Trials():
         # cB is the l - cA...
         return cA, (int(self.l) - cA)
 
+
+    def _trial_keys(self):
+        """ Return a list of the (first half of the) trials, as they key 
+        results: codes if packed, strings otherwise. """
+
+        if self.packed:
+            return self.trials.tolist()
+
+        keys = [''.join(trial) for trial in 
+                itertools.islice(self.trials, self.max_trial_count)]
+        self.trials = self._generate_trials()
+
+        return keys
+
+
+    def _codes(self):
+        """ Return the (first half of the) trials as an array of packed 
+        codes; if unpacked, in the order they are iterated over, unless they
+        are the full space (then in code order, see bits.codes()). """
+
+        if self.packed:
+            return self.trials
+        if self._full_space():
+            return bits.codes(self.l)
+
+        return np.array([bits.pack(key) for key in self._trial_keys()],
+                dtype=bits.dtype(self.l))
+
+
+    def _keyed(self, values):
+        """ Return a dict of <values>, keyed by the packed trials. """
+
+        return dict(zip(self.trials.tolist(), values))
+
+
+    def matrix(self):
+        """ Return the (first half of the) trials as a (n_trials x l) 0/1 
+        matrix (1 is an 'A'), suitable for the batch forms of the models 
+        in accumulate.models.construct. 
+        
+        Rows are in the same order as the keys of categorize(). """
+
+        if self.packed:
+            return bits.to_matrix(self.trials, self.l)
+
+        return np.array([[t == 'A' for t in trial] 
+                for trial in self._trial_keys()], dtype=np.uint8)
+
    
     def print_trials(self):
         """ Print all trials to stdout. """
 
+        if self.packed:
+            l = int(self.l)
+            print([bits.unpack(code, l) for code in self.trials])
+            return
+
         # Print then reset trials
         print(list(self.trials))
         self.trials = self._generate_trials()
         
 
-    def categorize(self, model):
+    def _expand(self, prefix):
+        """ Return the keys for every trial that begins with <prefix>. """
+
+        rest = int(self.l) - len(prefix)
+        if self.packed:
+            dt = self.trials.dtype.type
+            base = dt(bits.pack(prefix))
+            
+            return ((np.arange(2 ** rest, dtype=dt) << dt(len(prefix))) 
+                    | base).tolist()
+
+        return [prefix + ''.join(suffix) for suffix in 
+                itertools.product('AB', repeat=rest)]
+
+
+    def _root(self):
+        """ Return the prefix shared by every trial, the root of the 
+        prefix tree (see accumulate.sim.tree). """
+
+        return 'A'
+
+
+    def _full_space(self):
+        """ Return True if the trials are every trial that begins with
+        _root(), i.e. the complete prefix tree below it. """
+
+        l = int(self.l)
+        if not self.packed:
+            generate = getattr(self._generate_trials, '__func__', None)
+            return (generate is getattr(Trials._generate_trials, 
+                    '__func__', Trials._generate_trials)) and \
+                            (self.max_trial_count == 2 ** (l - 1))
+                ## Only Trials itself makes every 
+                ## (unpacked) trial
+
+        root = self._root()
+        codes = self.trials
+        if len(codes) != 2 ** (l - len(root)):
+            return False
+
+        dt = codes.dtype.type
+        below = (codes & dt(bits.mask(l, 0, len(root) - 1))) == \
+                dt(bits.pack(root))
+
+        return bool(below.all() and (np.diff(codes) > 0).all())
+            ## Distinct (sorted) codes, as many as 
+            ## there are below the root
+
+
+    def _walk(self, model, full):
+        """ Yield (keys, result) running the resumable <model> over the 
+        prefix tree of the trials (see accumulate.sim.tree); every trial 
+        in keys has the result.  If <full> (see _full_space()) the
+        whole tree below _root() is walked, otherwise only the prefixes 
+        of the trials. """
+
+        if full:
+            for prefix, decision in walk(model, self.l, self._root()):
+                yield self._expand(prefix), decision
+            return
+
+        l = int(self.l)
+        keys = self._trial_keys()
+        if self.packed:
+            by_trial = dict([(bits.unpack(key, l), key) for key in keys])
+        else:
+            by_trial = dict([(key, key) for key in keys])
+
+        for trial, decision in walk_trials(model, by_trial.keys()):
+            yield [by_trial[trial]], decision
+
+
+    def _named(self, model):
+        """ Return a list of (name, model) for <model>, which may be a 
+        model, a list of models or a dict of models keyed by name. """
+
+        if isinstance(model, dict):
+            return list(model.items())
+        elif isinstance(model, (list, tuple)):
+            return [(m.__name__, m) for m in model]
+        else:
+            return [(model.__name__, model)]
+
+
+    def _categorize_table(self, named, batch, tree):
+        """ The ResultTable version of categorize(). """
+
+        keys = self._trial_keys()
+        if self.packed:
+            table = ResultTable.empty([name for name, mod in named], 
+                    self.trials)
+        else:
+            table = ResultTable.empty([name for name, mod in named], keys)
+
+        matrix = None
+        by_trial = []
+        full = tree and self._full_space()
+        for model_id, (name, mod) in enumerate(named):
+            if tree and hasattr(mod, 'step'):
+                for subtree, decision in self._walk(mod, full):
+                    if self.packed and full:
+                        index = np.searchsorted(self.trials, subtree)
+                            ## Codes are sorted
+                    else:
+                        index = [table.index(trial) for trial in subtree]
+                    table.set(model_id, index, decision)
+            
+            elif batch and hasattr(mod, 'batch'):
+                if matrix is None:
+                    matrix = self.matrix()
+                table.set_batch(model_id, mod.batch(matrix))
+            
+            else:
+                by_trial.append((model_id, mod))
+
+        if by_trial:
+            l = int(self.l)
+            for ii, trial in enumerate(keys):
+                if self.packed:
+                    trial = bits.unpack(trial, l)
+                for model_id, mod in by_trial:
+                    table.set(model_id, ii, mod(trial))
+
+        return table
+
+
+    def categorize(self, model, batch=True, tree=False, table=False):
         """ Return category decisions, scores for both the chosen and 
         the not, the number of exemplars experienced, using the 
         decision criterion <decide> ('count', 'bayes', 'likelihood', 
@@ -91,31 +295,224 @@ class Trials():
 
         If the decider requires extra parameters, include them in the 
         params dictionary, e.g. the drift decider needs a weight, w,
-        so params would be {'w':0.25} if w was 0.25. """
+        so params would be {'w':0.25} if w was 0.25. 
+        
+        <model> may also be a list of models, or a dict of models keyed 
+        by the name to store their results under.  All the models are run 
+        in one pass over the trials, giving the same nested results as 
+        accumulate.sim.results.combine() would.
+        
+        If <batch> is True and a model has a batch form, all trials
+        are decided at once with it.  If <tree> is True and a model has a 
+        resumable form it is run over the prefix tree of the trials 
+        instead (see accumulate.sim.tree), which never repeats a 
+        prefix and stops as soon as a prefix is decided.  Trials decided 
+        by the same prefix then share one result.  Results are otherwise 
+        unchanged. 
+        
+        If <table> is True results are returned as a ResultTable (see 
+        accumulate.sim.table) instead, which is far more compact.
+        
+        For a parallel version see categorize_parallel(). """
+
+        if table:
+            return self._categorize_table(self._named(model), batch, tree)
 
         # OK. Run the models.
         model_results = defaultdict(dict)
-        while self.trial_count < self.max_trial_count:
-            trial = ''.join(self.trials.next())
+        
+        # Models that run over the whole trial
+        # space at once go first, the rest are 
+        # run together, trial by trial.
+        keys = None
+        matrix = None
+        by_trial = []
+        full = tree and self._full_space()
+        for name, mod in self._named(model):
+            if tree and hasattr(mod, 'step'):
+                for subtree, decision in self._walk(mod, full):
+                    for trial in subtree:
+                        model_results[trial][name] = decision
+            
+            elif batch and hasattr(mod, 'batch'):
+                if matrix is None:
+                    matrix = self.matrix()
+                    keys = self._trial_keys()
+                
+                batch_result = mod.batch(matrix)
+                for ii, trial in enumerate(keys):
+                    model_results[trial][name] = _unbatch(batch_result, ii)
+            
+            else:
+                by_trial.append((name, mod))
+                    ## If the decider needs parameters construct
+                    ## via closure, see the code 
+                    ## accumulate.models.construct for details
 
-            # Make a decision
-            decision = model(trial)
-                ## If the decider needs parameters construct
-                ## via closure, see the code 
-                ## accumulate.models.construct for details
+        if not by_trial:
+            return model_results
 
-            # Then store it in the (2) nested dict, model_results    
-            model_results[trial][model.__name__] = decision
-                
-            # Update the stop counter
-            self.trial_count += 1
+        if keys is None:
+            keys = self._trial_keys()
+        
+        l = int(self.l)
+        for trial in keys:
+            # Models take strings, so decode
+            # packed trials once (but key by code).
+            if self.packed:
+                decoded = bits.unpack(trial, l)
+            else:
+                decoded = trial
 
-        # For the next model, refresh trials.
-        self.trials = self._generate_trials()
+            # Make a decision, with each model, and 
+            # store it in the (2) nested dict, model_results    
+            for name, mod in by_trial:
+                model_results[trial][name] = mod(decoded)
 
         return model_results
 
 
+    def _iter_blocks(self, size):
+        """ Yield (index of the first trial, keys) for consecutive blocks of
+        (up to) <size> trials. """
+
+        if self.packed:
+            for start in range(0, len(self.trials), size):
+                yield start, self.trials[start:start + size].tolist()
+            return
+
+        trials = itertools.islice(self._generate_trials(), 
+                self.max_trial_count)
+            ## A fresh generator, self.trials 
+            ## is left alone.
+        start = 0
+        while True:
+            keys = [''.join(trial) for trial in 
+                    itertools.islice(trials, size)]
+            if not keys:
+                break
+            
+            yield start, keys
+            start += len(keys)
+
+
+    def trial_key(self, index):
+        """ Return the key (code if packed, string otherwise) of the trial 
+        at <index>, i.e. the <index>th trial iterated over. """
+
+        if self.packed:
+            return int(self.trials[index])
+
+        l = int(self.l)
+        return ''.join(['B' if (index >> (l - 1 - ii)) & 1 else 'A' 
+                for ii in range(l)])
+            ## Trials are in itertools.product order, 
+            ## with B as a 1.
+
+
+    def iter_categorize(self, model, chunksize=None, batch=True):
+        """ As categorize(), but stream the results as Records, i.e. 
+        (trial index, model name, decision, chosen_score, unchosen_score,
+        rt) tuples, in trial order (all of a trial's models together).  
+        
+        If <chunksize> is None Records are yielded one at a time, otherwise
+        as lists holding the Records of <chunksize> trials. 
+        
+        Only <chunksize> trials (1024 if it is None) are held in memory at
+        once.  Most accumulate.stats functions, and 
+        accumulate.sim.results.tabulate, can consume the stream. """
+
+        named = self._named(model)
+        l = int(self.l)
+        
+        for start, keys in self._iter_blocks(chunksize or 1024):
+            if self.packed:
+                decoded = [bits.unpack(code, l) for code in keys]
+            else:
+                decoded = keys
+
+            # Run the batch models over the 
+            # block at once, the rest by trial.
+            results = []
+            matrix = None
+            for name, mod in named:
+                if batch and hasattr(mod, 'batch'):
+                    if matrix is None:
+                        if self.packed:
+                            matrix = bits.to_matrix(
+                                    np.array(keys, dtype=self.trials.dtype), l)
+                        else:
+                            matrix = np.array([[t == 'A' for t in trial] 
+                                    for trial in keys], dtype=np.uint8)
+                    
+                    batch_result = mod.batch(matrix)
+                    results.append([_unbatch(batch_result, ii) 
+                            for ii in range(len(keys))])
+                else:
+                    results.append([mod(trial) for trial in decoded])
+
+            chunk = []
+            for ii in range(len(keys)):
+                for (name, mod), result in zip(named, results):
+                    r = result[ii]
+                    chunk.append(Record(start + ii, name, r['decision'], 
+                            r['chosen_score'], r['unchosen_score'], r['rt']))
+
+            if chunksize is None:
+                for record in chunk:
+                    yield record
+            else:
+                yield chunk
+
+
+    def categorize_parallel(self, specs, processes=None, n_shards=None, 
+            batch=True, tree=False, table=False):
+        """ As categorize() but the trials are split into <n_shards> shards
+        which are run, in parallel, by a pool of <processes>.  
+        
+        Model closures can't be sent to other processes so instead of 
+        models this takes <specs>, a ModelSpec (see 
+        accumulate.models.misc) or a list or dict of them.  If <table> is
+        True a ResultTable is returned (see categorize()).
+        
+        See accumulate.sim.parallel for details. """
+        from accumulate.sim import parallel
+        
+        return parallel.categorize(self, specs, processes, n_shards, 
+                batch, tree, table)
+
+
+    def features(self):
+        """ Return the features (A/B counts, distances and window speeds) 
+        of the (first half of the) trials as arrays, in the order trials
+        are iterated over (see accumulate.sim.features). """
+
+        if not self.packed:
+            if self._full_space():
+                return first_half_features(self.l, product=True)
+
+            return TrialFeatures(self._codes(), self.l)
+                ## e.g. SelectTrials
+
+        cached = getattr(self, '_features', None)
+        if (cached is None) or (cached[0] is not self.trials):
+            self._features = (self.trials, TrialFeatures(self.trials, self.l))
+                ## Keep the trials too, as some 
+                ## subclasses change them.
+
+        return self._features[1]
+
+
+    def _by_trial(self, values):
+        """ Return a dict of <values> (an array, in the order of features()) 
+        keyed by trial. """
+
+        if self.packed:
+            return self._keyed(values)
+
+        return dict(zip(self._trial_keys(), values))
+
+
     def distances(self):
         """ 
         Return the minimum Hamming Distance between the two 
@@ -126,33 +523,16 @@ class Trials():
         Low scores suggest greater difficulty.
         """
 
-        # Calc the and return (in a dict) the distances.
-        dist = dict()
-        for ii, trial in enumerate(self.trials):
-            if ii < self.max_trial_count:
-                dist[''.join(trial)] = self._hamming(trial)
-            else:
-                break
-            
-        self.trials = self._generate_trials()
-
-        return dist
+        return self._by_trial(self.features().distance.tolist())
 
 
     def counts(self):
         """  Return the number of As and Bs. """
-            
-        # Return the A/B counts in a dict
-        cnts = dict()
-        for ii, trial in enumerate(self.trials):
-            if ii < self.max_trial_count:
-                cnts[''.join(trial)] = self._count(trial)
-            else:
-                break
-            
-        self.trials =self._generate_trials()
 
-        return cnts 
+        feats = self.features()
+        
+        return self._by_trial(list(zip(feats.countA.tolist(), 
+                feats.countB.tolist())))
 
 
     def maxspeed(self, start, stop):
@@ -160,39 +540,82 @@ class Trials():
         window.  The window is defined by start and stop, ranging 
         from 0 to l-1. """
         
-        speeds = dict()
-        for trial in self.trials:
-            # Apply the window to the trial
-            windowed = trial[start:stop + 1]
-
-            # Now calc the speed of 
-            # the windowed trial.
-            # First count A and Bs
-            cA = 0
-            cB = 0
-            l = float(len(windowed))
-            for w in windowed:
-                if w == 'A':
-                    cA += 1
-                else:
-                    cB += 1
+        return self._by_trial(self.features().speed(start, stop).tolist())
 
-            # Then divide by the length
-            # and pick the largest
-            speeds[''.join(trial)] = max(cA / l, cB / l)
 
-        self.trials =self._generate_trials()
+    def speed_profile(self, width=None, quantiles=None):
+        """ Return the speed (as in maxspeed()) of every trial over every
+        window, or only the windows <width> long, as (windows, speeds).
 
-        return speeds
+        windows is an (n_windows x 2) array of (start, stop), shortest
+        windows first, and speeds is (n_trials x n_windows), with trials in
+        the order of features().
 
-        
-    def write_trials(self, encoding=None):
+        If <quantiles> (a list, each 0-1) is given, only the quantiles of
+        each window's speeds (over the trials) are returned, as an
+        (n_windows x len(quantiles)) array.
+
+        Windows are differences of the running A counts, one array
+        operation per width. """
+
+        l = int(self.l)
+        if width is None:
+            widths = range(1, l + 1)
+        elif 1 <= width <= l:
+            widths = [width]
+        else:
+            raise ValueError('<width> must be between 1 and l.')
+
+        matrix = bits.to_matrix(self.features().codes, l)
+        running = np.zeros((matrix.shape[0], l + 1), dtype=np.int16)
+        np.cumsum(matrix, axis=1, out=running[:, 1:])
+            ## running[:, ii] is the count of As before exemplar ii
+
+        windows = []
+        speeds = []
+        for w in widths:
+            starts = np.arange(l - w + 1)
+            windows.append(np.column_stack([starts, starts + w - 1]))
+
+            cA = running[:, w:] - running[:, :-w]
+            speed = np.maximum(cA, w - cA) / float(w)
+            if quantiles is not None:
+                speed = np.percentile(speed,
+                        [100.0 * q for q in quantiles], axis=0).T
+            speeds.append(speed)
+
+        if quantiles is not None:
+            return np.vstack(windows), np.vstack(speeds)
+
+        return np.vstack(windows), np.hstack(speeds)
+
+
+    def write_trials(self, encoding=None, binary=False):
         """ Write out trials, each row is a trial.  
 
         If <encoding> is a list of length 2 the first entry will be used to 
-        encode 'A' the second for 'B'. """
+        encode 'A' the second for 'B'. 
+        
+        If <binary> is True the (first half of the) trials are written, 
+        packed, to '<l>trials.bin' instead, with <encoding> kept as
+        metadata (see accumulate.sim.trialfile).  This is far faster and 
+        smaller, and can be read back with trialfile.FileTrials. """
         import csv
 
+        if binary:
+            from accumulate.sim import trialfile
+
+            trialfile.write(str(int(self.l)) + 'trials.bin', self._codes(), 
+                    self.l, encoding)
+            return
+
+        # Packed trials are decoded
+        # to tuples before writing.
+        trials = self.trials
+        if self.packed:
+            l = int(self.l)
+            trials = [tuple(bits.unpack(code, l)) for code in self.trials]
+
         # Re-encode... if not None
         # and of length 2
         en_trials = []
@@ -200,7 +623,7 @@ class Trials():
             if len(encoding) == 2:
                 # Loop over trials and each element,
                 # appending the re-encoded elements.
-                for ii, trial in enumerate(self.trials):
+                for ii, trial in enumerate(trials):
                     if ii < self.max_trial_count:
                         en_t = []
                         for t in trial:
@@ -217,8 +640,9 @@ class Trials():
             else:
                 raise ValueError('<encoding> can only have two entries.')
         else:
-            # Assign if encoding was None.
-            en_trials = self.trials
+            # Assign if encoding was None
+            # (only the first half).
+            en_trials = itertools.islice(trials, self.max_trial_count)
 
         # Write it out...
         f = open(str(int(self.l)) + 'trials.dat', 'wb')
@@ -0,0 +1,162 @@
+""" Helpers for bit-packed trials.
+
+A packed trial is an integer code where bit i is set if exemplar i of the
+trial is an 'A' (and unset if it is a 'B'), e.g. for l = 4 'ABBA' is
+0b1001 = 9.  A set of trials is a numpy uint32 (l <= 32) or
+uint64 (l <= 64) array of codes. """
+import numpy as np
+
+
+def dtype(l):
+    """ Return the smallest unsigned integer dtype that can hold a
+    trial of length <l>. """
+
+    l = int(l)
+    if l <= 32:
+        return np.uint32
+    elif l <= 64:
+        return np.uint64
+    else:
+        raise ValueError('Packed trials can be at most 64 long.')
+
+
+def check_shards(l, n_shards):
+    """ Checks <n_shards> is a power of 2, and no more than the number 
+    of trials in the first half. """
+
+    if (n_shards < 1) or (n_shards & (n_shards - 1)):
+        raise ValueError('<n_shards> must be a power of 2.')
+    if n_shards > 2 ** (int(l) - 1):
+        raise ValueError('<n_shards> must be at most 2 ** (l - 1).')
+
+
+def codes(l, shard=0, n_shards=1):
+    """ Return the codes for the first half of all the trials of
+    length <l>, i.e. all trials that begin with an 'A'.
+
+    The second half is the first half's reflection, so (like
+    sim.base.Trials) it is never generated. 
+    
+    If <n_shards> (a power of 2) is more than 1 only the trials in 
+    <shard> are returned.  Shards fix the exemplars after the first, 
+    see shard_prefix(). """
+
+    l = int(l)
+    dt = dtype(l)
+    check_shards(l, n_shards)
+
+    return (np.arange(shard, 2 ** (l - 1), n_shards, dtype=dt) << dt(1)) \
+            | dt(1)
+        ## Shift the count up one bit, and set bit 0
+        ## (an 'A' first) for every trial.
+
+
+def shard_prefix(shard, n_shards):
+    """ Return the prefix (a string) shared by every trial in <shard>
+    (see codes()). """
+
+    n_fixed = int(n_shards).bit_length() - 1
+    
+    return unpack((shard << 1) | 1, n_fixed + 1)
+
+
+def pack(trial):
+    """ Return the code for <trial> (a string or sequence of 'A' and 'B'). """
+
+    code = 0
+    for ii, t in enumerate(trial):
+        if t == 'A':
+            code |= 1 << ii
+
+    return code
+
+
+def unpack(code, l):
+    """ Return the trial (a string) for <code>, given its length <l>. """
+
+    code = int(code)
+    return ''.join(
+            ['A' if (code >> ii) & 1 else 'B' for ii in range(int(l))])
+
+
+def to_matrix(trial_codes, l):
+    """ Convert the <trial_codes> array to a (n_trials x l) 0/1 matrix,
+    where 1 is an 'A'. """
+
+    trial_codes = np.asarray(trial_codes)
+    shifts = np.arange(int(l), dtype=trial_codes.dtype)
+
+    return ((trial_codes[:, None] >> shifts) & 1).astype(np.uint8)
+
+
+def from_matrix(matrix):
+    """ Convert a (n_trials x l) 0/1 <matrix> (1 is an 'A')
+    to an array of codes. """
+
+    matrix = np.asarray(matrix)
+    dt = dtype(matrix.shape[1])
+    shifts = np.arange(matrix.shape[1], dtype=dt)
+
+    return np.bitwise_or.reduce(
+            matrix.astype(dt) << shifts, axis=1).astype(dt)
+
+
+def _popcount_table():
+    """ Return the number of set bits in each 16 bit number. """
+
+    table = np.zeros(2 ** 16, dtype=np.uint8)
+    for b in range(16):
+        table[1 << b:2 << b] = table[:1 << b] + 1
+            ## The numbers from 2^b to 2^(b+1) have one
+            ## more bit set than those below 2^b.
+
+    return table
+
+_POPCOUNT = _popcount_table()
+
+
+def popcount(trial_codes):
+    """ Return the number of set bits (i.e. As) in each of <trial_codes>,
+    as uint8.  Codes are counted 16 bits at a time, by table lookup. """
+
+    x = np.ascontiguousarray(trial_codes)
+    if x.dtype.itemsize not in (4, 8):
+        raise ValueError('<trial_codes> must be uint32 or uint64.')
+
+    words = x.view(np.uint16).reshape(x.size, x.dtype.itemsize // 2)
+    count = _POPCOUNT[words[:, 0]]
+    for ii in range(1, words.shape[1]):
+        count += _POPCOUNT[words[:, ii]]
+
+    return count.reshape(x.shape)
+
+
+def mask(l, start=0, stop=None):
+    """ Return the code with bits <start> to <stop> (inclusive, by default
+    to the end of a trial of length <l>) set. """
+
+    l = int(l)
+    if (stop is None) or (stop > (l - 1)):
+        stop = l - 1
+    
+    return ((1 << (stop + 1)) - 1) ^ ((1 << start) - 1)
+
+
+def product_codes(l):
+    """ Return the codes for the first half of the trials of length <l> in 
+    itertools.product('AB', ...) order, the order of an unpacked 
+    sim.base.Trials. """
+
+    l = int(l)
+    dt = dtype(l)
+    index = np.arange(2 ** (l - 1), dtype=dt) ^ dt(mask(l))
+        ## A is a 0 in the index, so invert
+
+    # Then reverse the bits; the first 
+    # exemplar is the index's top bit.
+    trial_codes = np.zeros_like(index)
+    for ii in range(l):
+        trial_codes |= ((index >> dt(l - 1 - ii)) & dt(1)) << dt(ii)
+
+    return trial_codes
+
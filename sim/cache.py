@@ -0,0 +1,263 @@
+""" A persistent, content addressed, on disk cache of model results.
+
+Results (ResultTables, see accumulate.sim.table) are keyed by a hash of
+the models' specs (model.spec, see accumulate.models.misc.record_spec) and
+the trial set.  Each entry is a directory of .npy columns and a manifest;
+hits are opened memory mapped, so they cost next to nothing however many
+trials there are.
+
+Use:
+----
+>>> cache = ResultCache('results_cache', max_bytes=2 * 1024 ** 3)
+>>> table = cache.categorize(Trials(16, packed=True), models)
+    ## Slow the first time, then (even in a new session) fast.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+from accumulate.sim.table import ResultTable
+
+
+_COLUMNS = ('decision', 'chosen_score', 'unchosen_score', 'rt')
+_VERSION = 2
+    ## Bump if the layout of entries, or the results
+    ## of any model, change; old entries are then misses.
+
+
+def _canonical(value):
+    """ Return a stable, JSON-able, stand-in for <value> (part of a model
+    spec).  Functions (e.g. deciders) are named by module and name, as
+    their repr holds a memory address. """
+
+    if callable(value):
+        return '{0}.{1}'.format(value.__module__, value.__name__)
+    elif isinstance(value, float):
+        return repr(value)
+    elif isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    elif isinstance(value, dict):
+        return dict([(str(k), _canonical(v)) for k, v in value.items()])
+
+    return value
+
+
+def _spec(name, model):
+    """ Return the canonical spec of <model>, stored under <name>. """
+
+    spec = getattr(model, 'spec', None)
+    if spec is None:
+        raise ValueError('{0} has no spec, so it can not be cached; '
+                'construct it with accumulate.models.construct.'.format(name))
+
+    return [name, spec.factory, _canonical(spec.params)]
+
+
+def trial_set(trials):
+    """ Return a hash of the trials in <trials> (a Trials instance). """
+
+    h = hashlib.sha1()
+    h.update('{0} {1} {2}'.format(type(trials).__name__, int(trials.l),
+            trials.packed).encode('utf-8'))
+    if trials.packed or (not trials._full_space()):
+        h.update(np.ascontiguousarray(trials._codes()).tobytes())
+            ## Only the full unpacked space 
+            ## is known from l alone.
+
+    return h.hexdigest()
+
+
+def _checksum(filename, blocksize=2 ** 20):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as fid:
+        while True:
+            block = fid.read(blocksize)
+            if not block:
+                break
+            h.update(block)
+
+    return h.hexdigest()
+
+
+class ResultCache():
+    """ A cache of ResultTables in the directory <path> (created if
+    needed).
+
+    Once the cache holds more than <max_bytes> or <max_entries> (either
+    may be None, for no limit) the least recently used entries are
+    evicted.
+
+    Every hit has its manifest and the shapes, dtypes and sizes of its
+    columns checked; if <verify> is True the checksums of the columns are
+    also checked (which reads every column).  Entries that fail are
+    removed, and treated as misses. """
+
+    def __init__(self, path, max_bytes=None, max_entries=None, verify=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.verify = verify
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+
+    def key(self, trials, model):
+        """ Return the key of the results of <model> (a model, or list or
+        dict of models, as in Trials.categorize()) for <trials>. """
+
+        specs = [_spec(name, mod) for name, mod in trials._named(model)]
+        blob = json.dumps({'version' : _VERSION, 'models' : specs,
+                'trials' : trial_set(trials)}, sort_keys=True)
+
+        return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self._entry(key), 'manifest.json'))
+
+
+    def get(self, key):
+        """ Return the (memory mapped) ResultTable for <key>, or None. """
+
+        entry = self._entry(key)
+        manifest_file = os.path.join(entry, 'manifest.json')
+        if not os.path.exists(manifest_file):
+            return None
+
+        try:
+            with open(manifest_file) as fid:
+                manifest = json.load(fid)
+
+            columns = dict()
+            for name, info in manifest['files'].items():
+                filename = os.path.join(entry, name + '.npy')
+                if os.path.getsize(filename) != info['nbytes']:
+                    raise ValueError('{0} is the wrong size.'.format(name))
+                if self.verify and (_checksum(filename) != info['sha1']):
+                    raise ValueError('{0} is corrupt.'.format(name))
+
+                columns[name] = np.load(filename, mmap_mode='r')
+                if (list(columns[name].shape) != info['shape']) or \
+                        (columns[name].dtype.str != info['dtype']):
+                    raise ValueError('{0} is the wrong shape.'.format(name))
+        except (IOError, OSError, ValueError, KeyError):
+            self.remove(key)
+            return None
+
+        os.utime(manifest_file, None)
+            ## Used now, for LRU eviction
+
+        trials = columns.pop('trials')
+        if not manifest['packed']:
+            trials = trials.tolist()
+
+        return ResultTable(manifest['models'], trials,
+                *[columns[name] for name in _COLUMNS])
+
+
+    def put(self, key, table, packed=True):
+        """ Store <table> under <key>, then evict if needed. """
+
+        tmp = tempfile.mkdtemp(dir=self.path, prefix='.tmp-')
+        try:
+            manifest = {'models' : list(table.models), 'packed' : packed,
+                    'created' : time.time(), 'files' : dict()}
+
+            columns = [(name, getattr(table, name)) for name in _COLUMNS]
+            if packed:
+                columns.append(('trials', np.asarray(table.trials)))
+            else:
+                columns.append(('trials', np.array(list(table.trials))))
+
+            for name, column in columns:
+                filename = os.path.join(tmp, name + '.npy')
+                np.save(filename, np.ascontiguousarray(column))
+                manifest['files'][name] = {
+                    'shape' : list(column.shape),
+                    'dtype' : column.dtype.str,
+                    'nbytes' : os.path.getsize(filename),
+                    'sha1' : _checksum(filename)
+                }
+
+            with open(os.path.join(tmp, 'manifest.json'), 'w') as fid:
+                json.dump(manifest, fid, sort_keys=True)
+
+            # Move into place, all at once.
+            self.remove(key)
+            os.rename(tmp, self._entry(key))
+        except:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        self.evict()
+
+
+    def categorize(self, trials, model, batch=True, tree=False):
+        """ Return trials.categorize(model, batch, tree, table=True), from
+        the cache if possible.  Misses are computed, then stored. """
+
+        key = self.key(trials, model)
+        table = self.get(key)
+        if table is None:
+            table = trials.categorize(model, batch, tree, table=True)
+            self.put(key, table, trials.packed)
+
+        return table
+
+
+    def remove(self, key):
+        """ Remove the entry for <key> (if there is one). """
+
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+
+    def entries(self):
+        """ Return a list of (last used, size in bytes, key) for every
+        entry, least recently used first. """
+
+        entries = []
+        for key in os.listdir(self.path):
+            manifest_file = os.path.join(self._entry(key), 'manifest.json')
+            if key.startswith('.') or not os.path.exists(manifest_file):
+                continue
+
+            size = sum([os.path.getsize(os.path.join(self._entry(key), f))
+                    for f in os.listdir(self._entry(key))])
+            entries.append((os.path.getmtime(manifest_file), size, key))
+
+        return sorted(entries)
+
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache is
+        within max_bytes and max_entries. """
+
+        entries = self.entries()
+        total = sum([size for used, size, key in entries])
+        while entries:
+            over_bytes = (self.max_bytes is not None) and \
+                    (total > self.max_bytes)
+            over_entries = (self.max_entries is not None) and \
+                    (len(entries) > self.max_entries)
+            if not (over_bytes or over_entries):
+                break
+
+            used, size, key = entries.pop(0)
+            self.remove(key)
+            total -= size
+
+
+    def clear(self):
+        """ Remove every entry. """
+
+        for used, size, key in self.entries():
+            self.remove(key)
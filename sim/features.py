@@ -0,0 +1,72 @@
+""" Trial features (the meta-data of sim.base.Trials) as arrays, from
+packed trials, by popcount (see accumulate.sim.bits.popcount). """
+import numpy as np
+from accumulate.sim import bits
+
+
+_CACHE = dict()
+    ## (l, product) -> TrialFeatures of the first half
+
+
+class TrialFeatures():
+    """ Features for the trials <trial_codes>, of length <l>, each an
+    array in the order of <trial_codes>:
+
+        countA, countB - the number of As and Bs
+        distance - the minimum Hamming distance to the two 'undecidable'
+            trials (e.g. ABAB, BABA when l is 4), an XOR with each then a
+            popcount
+
+    and, for any window, the A count (count()) and speed (speed()),
+    masked popcounts. """
+
+    def __init__(self, trial_codes, l):
+        self.l = int(l)
+        self.codes = np.asarray(trial_codes)
+        dt = self.codes.dtype.type
+
+        self.countA = bits.popcount(self.codes)
+        self.countB = (self.l - self.countA).astype(np.uint8)
+
+        refA = bits.mask(self.l) & 0x5555555555555555
+            ## A at every even position (ABAB...)
+        dA = bits.popcount(self.codes ^ dt(refA))
+        self.distance = np.minimum(dA, self.l - dA).astype(np.uint8)
+
+
+    def count(self, start, stop):
+        """ Return the number of As in the window <start> to <stop>
+        (inclusive, 0 to l-1). """
+
+        dt = self.codes.dtype.type
+
+        return bits.popcount(self.codes & dt(bits.mask(self.l, start, stop)))
+
+
+    def speed(self, start, stop):
+        """ Return the speed with which A and B accumulate over the window
+        <start> to <stop> (see sim.base.Trials.maxspeed()). """
+
+        width = min(stop, self.l - 1) - start + 1
+        cA = self.count(start, stop)
+
+        return np.maximum(cA, np.uint8(width) - cA) / float(width)
+            ## The counts are uint8, so take the 
+            ## max before converting
+
+
+def features(l, product=False):
+    """ Return the (cached) TrialFeatures of the first half of the trials
+    of length <l>, in the order of accumulate.sim.bits.codes() or, if 
+    <product> is True, of bits.product_codes() (i.e. of unpacked 
+    Trials). """
+
+    key = (int(l), product)
+    if key not in _CACHE:
+        if product:
+            trial_codes = bits.product_codes(l)
+        else:
+            trial_codes = bits.codes(l)
+        _CACHE[key] = TrialFeatures(trial_codes, l)
+
+    return _CACHE[key]
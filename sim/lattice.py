@@ -0,0 +1,115 @@
+""" Exact outcome distributions, over every trial, without enumerating the
+trials.
+
+Models with a resumable form (model.start() and model.step(), see
+accumulate.models.construct) are run over the lattice of accumulator
+states rather than over trials.  Trials that reach the same state at the
+same step behave identically from then on, so each state is stepped once,
+carrying the number of trials (its multiplicity) that reach it.  For
+abscount, relcount, information and incremental_lba the state is set by the
+A/B counts, so the lattice has O(l^2) nodes.  Models whose state depends on
+the path (e.g. likelihood_ratio) are still exact, but have many more
+states. """
+from collections import defaultdict
+
+
+def distribution(model, l, half=False, max_states=1000000):
+    """ Return the exact distribution of results of <model> over all trials
+    of length <l> (or if <half> is True only the first half, those that
+    begin with an 'A', as in Trials).
+
+    The distribution is a dict of trial counts keyed by (decision,
+    chosen_score, unchosen_score, rt), None standing in for the scores
+    and rt of trials with no decision.
+
+    If a step of the lattice has more than <max_states> states a
+    ValueError is raised. """
+
+    l = int(l)
+    start = model.start
+    step = model.step
+
+    dist = defaultdict(int)
+    layer = {start(l) : 1}
+    for ii in range(l):
+        if half and (ii == 0):
+            exemplars = 'A'
+        else:
+            exemplars = 'AB'
+
+        next_layer = defaultdict(int)
+        for state, count in layer.items():
+            for t in exemplars:
+                new_state, decision = step(state, t, ii, l)
+                if decision != None:
+                    dist[(decision['decision'], decision['chosen_score'],
+                            decision['unchosen_score'], decision['rt'])] \
+                                    += count * 2 ** (l - ii - 1)
+                        ## Every trial that continues from
+                        ## here has the same result.
+                else:
+                    next_layer[new_state] += count
+
+        if len(next_layer) > max_states:
+            raise ValueError(
+                    'The lattice has more than {0} states at step {1}; ' \
+                    'enumerate the trials instead.'.format(max_states, ii))
+        layer = next_layer
+
+    # The rest never decided
+    undecided = sum(layer.values())
+    if undecided > 0:
+        dist[('N', None, None, None)] += undecided
+
+    return dict(dist)
+
+
+def distributions(model, l, half=False, max_states=1000000):
+    """ Return distribution() for each of <model> (a model, or a list or
+    dict of models as in Trials.categorize()), keyed by name. """
+
+    if isinstance(model, dict):
+        named = model.items()
+    elif isinstance(model, (list, tuple)):
+        named = [(m.__name__, m) for m in model]
+    else:
+        named = [(model.__name__, model)]
+
+    return dict([(name, distribution(mod, l, half, max_states))
+            for name, mod in named])
+
+
+def marginals(dist):
+    """ Return the marginal distributions of decision, rt and chosen_score
+    in <dist> (from distribution()), as dicts of trial counts. """
+
+    margs = {
+        'decision' : defaultdict(int),
+        'rt' : defaultdict(int),
+        'chosen_score' : defaultdict(int)
+    }
+    for (decision, chosen_score, unchosen_score, rt), count in dist.items():
+        margs['decision'][decision] += count
+        margs['rt'][rt] += count
+        margs['chosen_score'][chosen_score] += count
+
+    return dict([(k, dict(v)) for k, v in margs.items()])
+
+
+def mean_rt(dists):
+    """ Return the mean reaction time for each model in <dists> (from
+    distributions()), as accumulate.stats.mean_rt() would for the
+    enumerated trials. """
+
+    mrt = dict()
+    for name, dist in dists.items():
+        total = 0
+        count = 0
+        for (decision, chosen_score, unchosen_score, rt), n in dist.items():
+            if rt != None:
+                total += rt * n
+                count += n
+        if count > 0:
+            mrt[name] = float(total) / count
+
+    return mrt
@@ -0,0 +1,227 @@
+""" Run Trials.categorize() in parallel, over shards of the trials.
+
+For the full (first half of the) space shards fix the exemplars 
+following the first (which is always 'A'), so shard j of n holds every 
+trial whose (packed) index is j mod n and each shard is its own subtree 
+(see accumulate.sim.bits.codes), which workers make themselves.  Any 
+other trials (e.g. SampleTrials, FileTrials or SelectTrials) are split
+into n runs of their own (packed) trials, which are sent to the workers.
+
+Each shard is run by a concurrent.futures.ProcessPoolExecutor worker 
+(on python 2 this needs the 'futures' backport).  Model closures can't
+be pickled so workers are sent model specs (accumulate.models.misc.ModelSpec), 
+from which they build their own models.  Workers send back nested dicts
+or, with table=True, ResultTables, whose columns are scattered into one
+table without a dict per trial ever being made. """
+from collections import defaultdict
+
+import numpy as np
+from accumulate.sim.base import Trials
+from accumulate.sim import bits
+from accumulate.sim.table import ResultTable
+from accumulate.stats import ResultAggregates
+
+
+_COLUMNS = ('decision', 'chosen_score', 'unchosen_score', 'rt')
+
+
+class ShardTrials(Trials):
+    """ The (packed) trials in one shard, or if <codes> is not None, 
+    those trials. """
+
+    def __init__(self, l, shard, n_shards, codes=None):
+        self.shard = shard
+        self.n_shards = n_shards
+        self.codes = codes
+
+        Trials.__init__(self, l, packed=True)
+        
+        # Over ride max_trial_count...        
+        self.max_trial_count = len(self.trials)
+
+    
+    def _generate_trials(self):
+        """ Returns the codes for the trials in the shard. """
+
+        self.trial_count = 0
+            ## reset
+
+        if self.codes is not None:
+            return self.codes
+
+        return bits.codes(self.l, self.shard, self.n_shards)
+
+
+    def _root(self):
+        if self.codes is not None:
+            return 'A'
+
+        return bits.shard_prefix(self.shard, self.n_shards)
+
+
+def _shard_codes(trials, n_shards):
+    """ Return the codes of the trials in each of (up to) <n_shards> 
+    shards of <trials>, or None if <trials> are the full space (whose 
+    shards the workers make themselves). """
+
+    if trials._full_space() and (trials._root() == 'A'):
+        return None
+
+    return [shard for shard in np.array_split(np.asarray(trials._codes()), 
+            n_shards) if len(shard) > 0]
+
+
+def _build(specs):
+    """ Build models from <specs>, keeping the same container shape. """
+
+    if isinstance(specs, dict):
+        return dict([(name, spec.build()) for name, spec in specs.items()])
+    elif isinstance(specs, (list, tuple)):
+        return [spec.build() for spec in specs]
+    else:
+        return specs.build()
+
+
+def _categorize_shard(l, shard, n_shards, specs, batch, tree, codes=None,
+        table=False):
+    """ Categorize the trials in <shard> (run by the workers). """
+
+    shard_trials = ShardTrials(l, shard, n_shards, codes)
+    if table:
+        return shard_trials.categorize(_build(specs), batch, tree, 
+                table=True)
+    
+    return dict(shard_trials.categorize(_build(specs), batch, tree))
+
+
+def _scatter(trials, tables):
+    """ Return the ResultTables of the shards, <tables> (an iterable), as
+    one table over the trials of <trials>, in its order. """
+
+    if trials.packed:
+        keys = trials.trials
+        codes = np.asarray(keys)
+    else:
+        keys = trials._trial_keys()
+        codes = np.array([bits.pack(key) for key in keys], 
+                dtype=bits.dtype(trials.l))
+    order = np.argsort(codes, kind='mergesort')
+
+    table = None
+    for shard_table in tables:
+        if table is None:
+            table = ResultTable.empty(shard_table.models, keys)
+        index = order[np.searchsorted(codes, shard_table.trials, 
+                sorter=order)]
+            ## Where each of the shard's trials goes
+        for name in _COLUMNS:
+            getattr(table, name)[:, index] = getattr(shard_table, name)
+
+    return table
+
+
+def _aggregate_shard(l, shard, n_shards, specs, batch, tree, rt_bins, 
+        score_bins, codes=None):
+    """ Aggregate the results for the trials in <shard> (run by the 
+    workers). """
+
+    shard_trials = ShardTrials(l, shard, n_shards, codes)
+    table = shard_trials.categorize(_build(specs), batch, tree, table=True)
+    
+    return ResultAggregates(rt_bins, score_bins).add(table)
+
+
+def _default_shards(l, processes):
+    """ Return enough shards (a power of 2) to keep <processes> 
+    busy, about 4 each. """
+
+    n_shards = 1
+    while (n_shards < (4 * processes)) and (n_shards < 2 ** (int(l) - 1)):
+        n_shards *= 2
+
+    return n_shards
+
+
+def categorize(trials, specs, processes=None, n_shards=None, 
+        batch=True, tree=False, table=False):
+    """ Run categorize(<specs>) over all the trials of <trials>, a 
+    Trials instance, in parallel.  
+    
+    <specs> is a ModelSpec, or a list or dict of them (see 
+    Trials.categorize()).  The trials are split into <n_shards> (a 
+    power of 2) which are run by <processes> workers (by default one per 
+    cpu).  Results are merged in shard order, so are identical from run
+    to run.  They are keyed as they are by <trials>, and are for only
+    its trials.  If <table> is True a ResultTable is returned, as from
+    trials.categorize(..., table=True). """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import cpu_count
+
+    if processes is None:
+        processes = cpu_count()
+    if n_shards is None:
+        n_shards = _default_shards(trials.l, processes)
+    
+    l = int(trials.l)
+    bits.check_shards(l, n_shards)
+    
+    shards = _shard_codes(trials, n_shards)
+    if shards is None:
+        shards = [None] * n_shards
+
+    model_results = defaultdict(dict)
+    executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        futures = [executor.submit(_categorize_shard, l, shard, n_shards, 
+                specs, batch, tree, codes, table) 
+                for shard, codes in enumerate(shards)]
+
+        if table:
+            return _scatter(trials, (future.result() for future in futures))
+
+        for future in futures:
+            for code, results in future.result().items():
+                if trials.packed:
+                    model_results[code].update(results)
+                else:
+                    model_results[bits.unpack(code, l)].update(results)
+    finally:
+        executor.shutdown()
+
+    return model_results
+
+
+def aggregate(trials, specs, processes=None, n_shards=None, batch=True, 
+        tree=False, rt_bins=None, score_bins=None):
+    """ As categorize() but each worker returns only the aggregates (see 
+    accumulate.stats.ResultAggregates) of its shard, which are then 
+    merged.  Results are never sent between processes, so this 
+    scales to far more trials. """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import cpu_count
+
+    if processes is None:
+        processes = cpu_count()
+    if n_shards is None:
+        n_shards = _default_shards(trials.l, processes)
+    
+    l = int(trials.l)
+    bits.check_shards(l, n_shards)
+    
+    shards = _shard_codes(trials, n_shards)
+    if shards is None:
+        shards = [None] * n_shards
+
+    aggregates = ResultAggregates(rt_bins, score_bins)
+    executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        futures = [executor.submit(_aggregate_shard, l, shard, n_shards, 
+                specs, batch, tree, rt_bins, score_bins, codes) 
+                for shard, codes in enumerate(shards)]
+
+        for future in futures:
+            aggregates.merge(future.result())
+    finally:
+        executor.shutdown()
+
+    return aggregates
@@ -0,0 +1,140 @@
+""" Noisy replicates of a model, for choice probabilities and rt
+distributions.
+
+Each trial is run <replicates> times.  Every replicate draws its own start
+points (one per accumulator, added to the scores), drifts (one per
+accumulator, added in proportion to the fraction of the trial seen) and
+threshold, and may add per-step accumulator noise (accumulate.models.noise)
+that is summed over the steps.  It all runs as one (trials x replicates x
+steps) array program, a chunk of trials at a time, on the model's batch
+scores.
+
+Random draws are keyed by trial index (see accumulate.models.noise), so
+results never depend on <chunksize>.  The per replicate draws have their
+own substream, so they are independent of the step noise even when both
+share a seed. """
+import warnings
+
+import numpy as np
+from accumulate.models.deciders import batch_statistic, DECISION_CODES
+from accumulate.models.noise import Noise
+
+
+_PARAMS_SUBSTREAM = 1
+    ## Noise substream of the per replicate draws;
+    ## step noise is (by default) substream 0.
+
+
+def _noisy_scores(scores, start, drift, step_noise):
+    """ Return the (n_trials x replicates x l) scores for the noise free
+    (n_trials x l) <scores> and one accumulator's noise. """
+
+    l = scores.shape[1]
+    fraction = np.arange(1, l + 1) / float(l)
+
+    noisy = scores[:, None, :] + start[:, :, None] + \
+            drift[:, :, None] * fraction[None, None, :]
+    if step_noise is not None:
+        noisy += np.cumsum(step_noise, axis=2)
+
+    return noisy
+
+
+def replicate(trials, model, replicates, seed=0, start_sd=0.0,
+        drift_sd=0.0, threshold_sd=0.0, noise=None,
+        quantiles=(0.1, 0.5, 0.9), chunksize=None):
+    """ Run <replicates> noisy replicates of <model> over every trial of
+    <trials> (a Trials instance).
+
+    Start points, drifts and thresholds are drawn (Gaussian, sd
+    <start_sd>, <drift_sd> and <threshold_sd>) for every replicate from
+    <seed>.  <noise> (an accumulate.models.noise.Noise) is added at each
+    step, independently to each accumulator.
+
+    <model> must have a batch form with a decider that has a statistic
+    (see accumulate.models.deciders.batch_statistic).
+
+    Returns a dict of arrays over the trials (in the order of
+    trials.features()):
+
+        p_A, p_B, p_N - the fraction of replicates deciding A, B or
+            nothing (N, including ties)
+        mean_rt - the mean rt of the replicates that decided (NaN if none)
+        rt_quantiles - the <quantiles> of those rts (n_trials x
+            len(quantiles), NaN if none decided) """
+
+    statistic = batch_statistic(getattr(model, 'decider', None))
+    if (not hasattr(model, 'scores')) or (statistic is None):
+        raise ValueError('<model> has no batch form, or its decider has no'
+                ' array form.')
+    replicates = int(replicates)
+    if replicates < 1:
+        raise ValueError('<replicates> must be at least 1.')
+
+    l = int(trials.l)
+    if chunksize is None:
+        chunksize = max(1, 2 ** 20 // (replicates * l))
+            ## Keeps each (trials x replicates x l)
+            ## array to about 8 Mb.
+
+    matrix = trials.matrix()
+    n = matrix.shape[0]
+    params = None
+    if start_sd or drift_sd or threshold_sd:
+        params = Noise('gaussian', seed, substream=_PARAMS_SUBSTREAM)
+            ## Otherwise there is nothing to draw
+
+    p = dict([(k, np.zeros(n)) for k in ('A', 'B', 'N')])
+    mean_rt = np.zeros(n)
+    rt_quantiles = np.zeros((n, len(quantiles)))
+    for start in range(0, n, chunksize):
+        stop = min(start + chunksize, n)
+        index = np.arange(start, stop)
+
+        # Per replicate draws, (trials x draw x replicates),
+        # then per step noise (trials x steps x replicates),
+        # for A then B.
+        if params is None:
+            draws = np.zeros((stop - start, 5, replicates))
+        else:
+            draws = params.block(index, 5, replicates)
+        step_noise = [None, None]
+        if noise is not None:
+            both = noise.block(index, l, 2 * replicates).transpose(0, 2, 1)
+            step_noise = [both[:, :replicates], both[:, replicates:]]
+
+        score_A, score_B = model.scores(matrix[start:stop])
+        score_A = _noisy_scores(score_A, start_sd * draws[:, 0],
+                drift_sd * draws[:, 2], step_noise[0])
+        score_B = _noisy_scores(score_B, start_sd * draws[:, 1],
+                drift_sd * draws[:, 3], step_noise[1])
+        threshold = model.threshold + threshold_sd * draws[:, 4]
+
+        # First passage, for every replicate
+        with np.errstate(invalid='ignore'):
+            met = statistic(score_A, score_B) >= threshold[:, :, None]
+        decided = met.any(axis=2)
+        first = met.argmax(axis=2)
+
+        rows = np.ix_(np.arange(stop - start), np.arange(replicates))
+        decision = np.where(decided, np.sign(
+                score_A[rows + (first,)] - score_B[rows + (first,)]), 0)
+
+        for k in ('A', 'B', 'N'):
+            p[k][start:stop] = (decision == DECISION_CODES[k]).mean(axis=1)
+
+        rt = np.where(decided, first + 1, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+                ## Trials no replicate decided are NaN
+            mean_rt[start:stop] = np.nanmean(rt, axis=1)
+            rt_quantiles[start:stop] = np.nanpercentile(rt,
+                    [100.0 * q for q in quantiles], axis=1).T
+
+    return {
+        'p_A' : p['A'],
+        'p_B' : p['B'],
+        'p_N' : p['N'],
+        'mean_rt' : mean_rt,
+        'rt_quantiles' : rt_quantiles
+    }
@@ -2,12 +2,29 @@
 
 import csv
 from collections import defaultdict
-from accumulate.stats import correct_trial
+from accumulate.stats import _items, _trial_accuracy, agreement
+from accumulate.sim.bits import unpack, to_matrix
+from accumulate.sim.table import ResultTable
+import numpy as np
 
 # TODO test
 def combine(results_list):
-    """ Combine results by trial. """
+    """ Combine results by trial. 
     
+    If every result is a ResultTable (for the same trials) the combined 
+    result is too. """
+    
+    if all([isinstance(res, ResultTable) for res in results_list]):
+        models = []
+        for res in results_list:
+            models.extend(res.models)
+        
+        return ResultTable(models, results_list[0].trials, 
+                np.vstack([res.decision for res in results_list]),
+                np.vstack([res.chosen_score for res in results_list]),
+                np.vstack([res.unchosen_score for res in results_list]),
+                np.vstack([res.rt for res in results_list]))
+
     trials = results_list[0].keys()
     combined = defaultdict(dict)
     for trial in trials:
@@ -18,58 +35,247 @@ def combine(results_list):
     return combined
 
 
-def tabulate(filename, trials, model_results, include_acc):
-    """ Use the Trials instance <trials> and the <model_results> from
-    a call of trials.categorize() to generate a tabulated (csv) set of trial
-    level results and meta-data suitable for import into another analysis
-    package, e.g. R. 
+def _keys(keys):
+    """ Return the trial <keys> as a list. """
+
+    if isinstance(keys, np.ndarray):
+        return keys.tolist()
+
+    return list(keys)
+
+
+def _trial_name(trial, l):
+    """ Return <trial> as a string, unpacking it if needed. """
     
-    The format mirrors a data.table in R. """
+    if isinstance(trial, str):
+        return trial
+    
+    return unpack(trial, l)
 
-    # Open and prep the csv filehandle,
-    # write the header info too
-    fid = open(filename, 'w')
-    writer = csv.writer(fid, delimiter=',')
 
+def _scores(scores, decided):
+    """ Return the (float32) <scores> matrix as written by tabulate(), to
+    float32 precision (7 significant digits), or None where not
+    <decided>. """
+
+    return np.where(decided, np.char.mod('%.7g', scores).astype(object), 
+            None)
+
+
+def _matrix(keys, l):
+    """ Return the 0/1 matrix (1 is an 'A') of the trial <keys>, codes or
+    strings. """
+
+    if isinstance(keys, np.ndarray):
+        return to_matrix(keys, l)
+
+    return np.array([[t == 'A' for t in trial] for trial in keys],
+            dtype=np.uint8).reshape(len(keys), l)
+
+
+def _metadata(matrix):
+    """ Return the trial meta-data columns of tabulate() (distance, countA,
+    countB, maxcount, maxspeed_front and maxspeed_back) as a list of
+    (name, array), for the trials in <matrix>. 
+    
+    These match Trials.distances(), counts() and maxspeed(). """
+
+    l = matrix.shape[1]
+    half = l // 2
+
+    refA = np.arange(l) % 2 == 0
+        ## A at every even position (ABAB...)
+    dA = (matrix != refA).sum(axis=1)
+    countA = matrix.sum(axis=1, dtype=np.int64)
+    countB = l - countA
+    front = matrix[:, :half].sum(axis=1, dtype=np.int64)
+    back = countA - front
+
+    return [
+        ('distance', np.minimum(dA, l - dA)),
+        ('countA', countA),
+        ('countB', countB),
+        ('maxcount', np.maximum(countA, countB)),
+        ('maxspeed_front', np.maximum(front, half - front) / float(half)),
+        ('maxspeed_back', np.maximum(back, (l - half) - back) / 
+                float(l - half))
+    ]
+
+
+def _chunks(table, chunksize):
+    """ Yield (start, stop, keys) for consecutive chunks of <chunksize> 
+    trials in <table>. """
+
+    for start in range(0, len(table.trials), chunksize):
+        stop = min(start + chunksize, len(table.trials))
+        
+        yield start, stop, table.trials[start:stop]
+
+
+def _tabulate_table(writer, table, include_acc, l, chunksize=10000):
+    """ The fast path of tabulate(), for a ResultTable.  
+    
+    Meta-data and accuracies are computed as arrays, and rows are made and 
+    written <chunksize> trials at a time, so memory use is bounded. """
+
+    n_models = len(table.models)
+    decisions = np.array(['B', 'N', 'A'])
+        ## Codes are -1, 0, 1 for B, N, A
+    models = np.array(table.models, dtype=object)
+
+    for start, stop, keys in _chunks(table, chunksize):
+        matrix = _matrix(keys, l)
+        names = np.array([''.join(trial) for trial in 
+                np.where(matrix == 1, 'A', 'B').tolist()], dtype=object)
+        meta = [column for name, column in _metadata(matrix)]
+        
+        decided = table.rt[:, start:stop] != -1
+        values = [
+            decisions[table.decision[:, start:stop] + 1].astype(object),
+            _scores(table.chosen_score[:, start:stop], decided),
+            _scores(table.unchosen_score[:, start:stop], decided),
+            np.where(decided, table.rt[:, start:stop], None)
+        ]
+
+        # Index every row, trial by trial
+        # then model by model (then by 
+        # correct model).
+        n = stop - start
+        ii = np.repeat(np.arange(n), n_models)
+        m = np.tile(np.arange(n_models), n)
+        if include_acc:
+            acc = agreement(table.decision[:, start:stop])
+            others = np.array([[r for r in range(n_models) if r != mm] 
+                    for mm in range(n_models)], dtype=int).reshape(
+                            n_models, n_models - 1)
+            r = others[m].ravel()
+            ii = np.repeat(ii, n_models - 1)
+            m = np.repeat(m, n_models - 1)
+
+        columns = [names[ii].tolist(), models[m].tolist()]
+        columns.extend([v[m, ii].tolist() for v in values])
+        columns.extend([c[ii].tolist() for c in meta])
+        if include_acc:
+            columns.append(models[r].tolist())
+            columns.append(acc[r, m, ii].tolist())
+
+        writer.writerows(zip(*columns))
+
+
+def export(filename, trials, table, include_acc=False, chunksize=10000):
+    """ Export the ResultTable <table> (from trials.categorize(..., 
+    table=True)) and the meta-data of <trials>.
+
+    If <filename> ends in '.npz' results are saved as compressed columns: 
+    models, trials, decision, chosen_score, unchosen_score, rt (each 
+    n_models x n_trials, as in the table), the meta-data of each trial 
+    (distance, countA, countB, maxcount, maxspeed_front and maxspeed_back)
+    and, if <include_acc>, acc (n_models (correct) x n_models x n_trials).
+
+    Otherwise the rows of tabulate() are written, as csv, <chunksize>
+    trials at a time. """
+
+    l = int(trials.l)
+    if not filename.endswith('.npz'):
+        with open(filename, 'w') as fid:
+            writer = csv.writer(fid, delimiter=',')
+            writer.writerow(_header(include_acc))
+            _tabulate_table(writer, table, include_acc, l, chunksize)
+        
+        return
+
+    meta = None
+    acc = None
+    if include_acc:
+        n_models = len(table.models)
+        acc = np.zeros((n_models, n_models, len(table.trials)), 
+                dtype=np.int8)
+    for start, stop, keys in _chunks(table, chunksize):
+        chunk = _metadata(_matrix(keys, l))
+        if meta is None:
+            meta = [(name, np.zeros(len(table.trials), dtype=column.dtype))
+                    for name, column in chunk]
+        for (name, column), (_, part) in zip(meta, chunk):
+            column[start:stop] = part
+        if include_acc:
+            acc[:, :, start:stop] = agreement(table.decision[:, start:stop])
+
+    columns = dict(meta or [])
+    if include_acc:
+        columns['acc'] = acc
+
+    np.savez_compressed(filename, 
+            models=np.array(table.models),
+            trials=np.asarray(table.trials),
+            decision=table.decision,
+            chosen_score=table.chosen_score,
+            unchosen_score=table.unchosen_score,
+            rt=table.rt,
+            **columns)
+
+
+def _header(include_acc):
     header = ["trial", "model", "decision", "score", "altscore", "rt",
         "distance", "countA", "countB", "maxcount", 
         "maxspeed_front", "maxspeed_back"]
     
     if include_acc:
         header = header + ["correct_model", "acc"]
+
+    return header
+
+
+def tabulate(filename, trials, model_results, include_acc):
+    """ Use the Trials instance <trials> and the <model_results> from
+    a call of trials.categorize() (or the stream from 
+    trials.iter_categorize()) to generate a tabulated (csv) set of trial
+    level results and meta-data suitable for import into another analysis
+    package, e.g. R. 
     
-    writer.writerow(header)
-    
-    # Extract meta-data from trials
-    distances = trials.distances()
-    counts = trials.counts()
+    The format mirrors a data.table in R.  Scores from a ResultTable are
+    written to the float32 precision they are kept at (see _scores()),
+    others in full. """
+
     l = int(trials.l)
-    maxspeed_front = trials.maxspeed(0, l/2-1)
-    maxspeed_back = trials.maxspeed(l/2, l)
-
-    # HOW TO LOOP OVER IT ALL SENSIBLY?
-    all_trials = model_results.keys()
-    all_models = model_results[all_trials[0]].keys()
-    for trial in all_trials:
-        for model in all_models:
-            data = model_results[trial][model]
+    if isinstance(model_results, ResultTable):
+        export(filename, trials, model_results, include_acc)
+        
+        return
+
+    # Open and prep the csv filehandle,
+    # write the header info too
+    fid = open(filename, 'w')
+    writer = csv.writer(fid, delimiter=',')
+    writer.writerow(_header(include_acc))
+    
+    # Extract meta-data from trials,
+    # once, as arrays.
+    feats = trials.features()
+    meta = [feats.distance, feats.countA, feats.countB, 
+            np.maximum(feats.countA, feats.countB), 
+            feats.speed(0, l // 2 - 1), feats.speed(l // 2, l)]
+    meta = trials._by_trial(list(zip(*[column.tolist() for column in meta])))
+        ## trial -> (distance, countA, ...)
+
+    # Streamed trials are indices, 
+    # so get their keys.
+    streamed = not hasattr(model_results, 'items')
+    for trial, trial_results in _items(model_results):
+        if streamed:
+            trial = trials.trial_key(trial)
+        
+        for model, data in trial_results.items():
             row = [
-                    trial,
+                    _trial_name(trial, l),
                     model,
                     data['decision'],
                     data['chosen_score'],
                     data['unchosen_score'],
-                    data['rt'],
-                    distances[trial],
-                    counts[trial][0],
-                    counts[trial][1],
-                    max(counts[trial][0], counts[trial][1]),
-                    maxspeed_front[trial],
-                    maxspeed_back[trial]
-                ]
+                    data['rt']
+                ] + list(meta[trial])
             
             if include_acc:
-                acc = correct_trial(trial, model, model_results)
+                acc = _trial_accuracy(model, trial_results)
                 for alt_model, acc in acc.items():
                     writer.writerow(row + [alt_model, acc])
             else:
@@ -0,0 +1,306 @@
+""" Sample, rather than enumerate, the trials.  For when l is too large
+(more than about 20) for Trials. """
+import itertools
+from math import sqrt
+
+import numpy as np
+from accumulate.sim.base import Trials
+from accumulate.sim import bits
+
+
+def _comb(n, k):
+    """ Return n choose k (exactly, as an int). """
+
+    if (k < 0) or (k > n):
+        return 0
+
+    c = 1
+    for ii in range(k):
+        c = c * (n - ii) // (ii + 1)
+
+    return c
+
+
+class SampleTrials(Trials):
+    """ Experiment on a sample of (the first half of) the trials.
+
+    Each trial is described by its number of As at the even (a_e) and
+    odd (a_o) exemplars.  Together these set the A/B counts, the Hamming
+    distance to the 'undecidable' trials (see Trials._hamming) and the
+    speed over the whole trial, so (a_e, a_o) cells are used as strata.
+    Within a cell every trial is equally likely to be drawn.
+
+    <design> is one of:
+
+        'uniform' - a simple random sample of <n> trials.
+        'stratified' - a proportional (to size) allocation of <n> trials
+            over the cells, with at least <min_stratum> in every
+            cell (or all of it if the cell is smaller).
+        'lhs' - a Latin-hypercube sample of <n> trials over the
+            (a_e, a_o) distributions.
+
+    Trials are always packed, and are never repeated.  Use weights() and
+    strata() to see how each trial stands in for the full space, and
+    estimate() for unbiased estimates (and their standard errors) of
+    full space means. """
+
+    def __init__(self, l, n, design='stratified', seed=None, min_stratum=2):
+        if design not in ('uniform', 'stratified', 'lhs'):
+            raise ValueError(
+                    "<design> must be 'uniform', 'stratified' or 'lhs'.")
+
+        self.n = int(n)
+        self.design = design
+        self.seed = seed
+        self.min_stratum = int(min_stratum)
+        self._sample = None
+
+        Trials.__init__(self, l, packed=True)
+
+        # Over ride max_trial_count...
+        self.max_trial_count = len(self.trials)
+
+
+    def _generate_trials(self):
+        """ Returns the sampled trials (drawn only once). """
+
+        self.trial_count = 0
+            ## reset
+
+        if self._sample is None:
+            self._draw()
+
+        return self._sample
+
+
+    def _cells(self):
+        """ Return a dict of the number of (first half) trials in each
+        (a_e, a_o) cell. """
+
+        half = int(self.l) // 2
+        cells = dict()
+        for a_e in range(1, half + 1):
+            ## The first exemplar, an even one,
+            ## is always an A.
+            for a_o in range(0, half + 1):
+                cells[(a_e, a_o)] = _comb(half - 1, a_e - 1) * \
+                        _comb(half, a_o)
+
+        return cells
+
+
+    def _draw_cell(self, rng, a_e, a_o, size, population):
+        """ Draw <size> distinct trials from the (a_e, a_o) cell. """
+
+        l = int(self.l)
+        dt = bits.dtype(l)
+        even = np.arange(2, l, 2)
+        odd = np.arange(1, l, 2)
+
+        def code(even_As, odd_As):
+            return int(np.sum(dt(1) << np.concatenate(
+                    [[0], even_As, odd_As]).astype(dt)))
+                ## Sums of distinct powers of 2
+                ## are the same as ors.
+
+        # Small cells are enumerated,
+        # then sampled.
+        if population <= (4 * size):
+            cell = [code(list(e), list(o)) for e, o in itertools.product(
+                    itertools.combinations(even, a_e - 1),
+                    itertools.combinations(odd, a_o))]
+            chosen = rng.permutation(len(cell))[:size]
+
+            return [cell[ii] for ii in sorted(chosen)]
+
+        # Big cells are sampled with
+        # rejection of repeats.
+        drawn = []
+        seen = set()
+        while len(drawn) < size:
+            c = code(rng.permutation(even)[:a_e - 1],
+                    rng.permutation(odd)[:a_o])
+            if c not in seen:
+                seen.add(c)
+                drawn.append(c)
+
+        return drawn
+
+
+    def _draw(self):
+        """ Draw the sample, setting the codes, their cells and the
+        strata. """
+
+        rng = np.random.RandomState(self.seed)
+        cells = self._cells()
+        N = 2 ** (int(self.l) - 1)
+
+        if self.design == 'uniform':
+            drawn = self._draw_uniform(rng, N)
+        elif self.design == 'stratified':
+            drawn = self._draw_stratified(rng, cells, N)
+        elif self.design == 'lhs':
+            drawn = self._draw_lhs(rng, cells)
+
+        self._sample = np.array(sorted(drawn), dtype=bits.dtype(self.l))
+
+        # Find the strata and their weights,
+        # ie. the trials each sampled trial
+        # stands in for.
+        self._stratum = dict()
+        for c in self._sample.tolist():
+            if self.design == 'stratified':
+                self._stratum[c] = self._cell(c)
+            else:
+                self._stratum[c] = 'all'
+
+        self._strata = dict()
+        for c, h in self._stratum.items():
+            if h not in self._strata:
+                if h == 'all':
+                    population = N
+                else:
+                    population = cells[h]
+                self._strata[h] = {'population' : population, 'sampled' : 0}
+            self._strata[h]['sampled'] += 1
+
+        for h, stratum in self._strata.items():
+            stratum['weight'] = stratum['population'] / \
+                    float(stratum['sampled'])
+
+
+    def _cell(self, code):
+        """ Return the (a_e, a_o) cell of <code>. """
+
+        t = bits.unpack(code, self.l)
+
+        return t[0::2].count('A'), t[1::2].count('A')
+
+
+    def _draw_uniform(self, rng, N):
+        """ A simple random sample (without replacement). """
+
+        if self.n >= N:
+            return bits.codes(self.l).tolist()
+
+        l = int(self.l)
+        dt = bits.dtype(l)
+        drawn = set()
+        while len(drawn) < self.n:
+            matrix = rng.randint(0, 2, size=(self.n - len(drawn), l))
+            matrix[:, 0] = 1
+            drawn.update(bits.from_matrix(matrix).astype(dt).tolist())
+
+        return drawn
+
+
+    def _draw_stratified(self, rng, cells, N):
+        """ Proportional allocation, with at least min_stratum per cell. """
+
+        drawn = []
+        for (a_e, a_o), population in sorted(cells.items()):
+            size = int(round(self.n * population / float(N)))
+            size = min(population, max(self.min_stratum, size))
+            drawn.extend(self._draw_cell(rng, a_e, a_o, size, population))
+
+        return drawn
+
+
+    def _draw_lhs(self, rng, cells):
+        """ Latin-hypercube sample a_e and a_o (each over its
+        distribution), then draw a trial from the (a_e, a_o) cell. """
+
+        half = int(self.l) // 2
+
+        def inverse_cdf(n, u):
+            ## For a binomial(n, 0.5)
+            pmf = np.array([_comb(n, k) for k in range(n + 1)], dtype=float)
+            cdf = np.cumsum(pmf / pmf.sum())
+
+            return np.minimum(np.searchsorted(cdf, u), n)
+
+        n = self.n
+        u_e = (rng.permutation(n) + rng.uniform(size=n)) / n
+        u_o = (rng.permutation(n) + rng.uniform(size=n)) / n
+        a_es = inverse_cdf(half - 1, u_e) + 1
+        a_os = inverse_cdf(half, u_o)
+
+        # Draw the trials cell by cell, so
+        # trials are never repeated
+        drawn = []
+        wanted = dict()
+        for a_e, a_o in zip(a_es.tolist(), a_os.tolist()):
+            wanted[(a_e, a_o)] = wanted.get((a_e, a_o), 0) + 1
+        for (a_e, a_o), size in sorted(wanted.items()):
+            population = cells[(a_e, a_o)]
+            drawn.extend(self._draw_cell(
+                    rng, a_e, a_o, min(size, population), population))
+
+        return drawn
+
+
+    def weights(self):
+        """ Return the weight of each trial, i.e. the number of trials
+        in the first half of the full space it stands in for. """
+
+        return dict([(c, self._strata[h]['weight'])
+                for c, h in self._stratum.items()])
+
+
+    def strata(self):
+        """ Return a dict of the strata: their population (in the
+        first half of the full space), the number sampled and the
+        weight of the trials sampled from them.
+
+        Stratified designs are stratified by (a_e, a_o) cell,
+        the others have one stratum, 'all'. """
+
+        return dict([(h, dict(stratum)) for h, stratum in
+                self._strata.items()])
+
+
+    def estimate(self, values):
+        """ Return an estimate of the mean of <values> (a dict keyed by
+        trial, e.g. from distances()) over the first half of the full
+        space, and its standard error.
+
+        Trials whose value is None (e.g. the rt of an N) are left out and
+        the estimate is then of the mean over the trials that have one (a
+        ratio estimate, with a linearized standard error).
+
+        Note: Latin-hypercube samples use the simple random sample
+        standard error, which is usually conservative. """
+
+        by_stratum = dict()
+        for c, h in self._stratum.items():
+            by_stratum.setdefault(h, []).append(values[c])
+
+        N = float(sum([s['population'] for s in self._strata.values()]))
+
+        # The weighted domain size and total
+        size = 0.0
+        total = 0.0
+        for h, ys in by_stratum.items():
+            W = self._strata[h]['population'] / N
+            ys = [y for y in ys if y is not None]
+            size += W * len(ys) / float(self._strata[h]['sampled'])
+            total += W * sum(ys) / float(self._strata[h]['sampled'])
+        if size == 0:
+            raise ValueError('<values> has no values.')
+        mean = total / size
+
+        # Linearize, then the usual stratified
+        # variance (with finite population
+        # correction).
+        var = 0.0
+        for h, ys in by_stratum.items():
+            stratum = self._strata[h]
+            n_h = stratum['sampled']
+            if n_h < 2:
+                continue
+            z = np.array([0.0 if y is None else (y - mean) for y in ys])
+            W = stratum['population'] / N
+            f = n_h / float(stratum['population'])
+            var += (W ** 2) * (1 - f) * z.var(ddof=1) / n_h
+
+        return mean, sqrt(var) / size
@@ -0,0 +1,84 @@
+""" Sweep a model's threshold in one pass.
+
+For a fixed trial a model's score trajectory does not depend on its 
+threshold.  The decision at threshold t is made at the first step where 
+the decider's statistic (e.g. the larger score for deciders.absolute) 
+reaches t, i.e. where its running maximum first reaches t.  So the running 
+maximum is computed once and every threshold's first passage is found by 
+searching it. """
+import numpy as np
+from accumulate.models.deciders import batch_statistic, _batch_result_at
+from accumulate.models.misc import check_threshold
+from accumulate.sim.table import ResultTable
+
+
+def first_passage(statistic, thresholds):
+    """ Return the first step (column) at which each row of <statistic> 
+    (a (n_trials x l) matrix) reaches each of the <thresholds>, as a
+    (n_trials x n_thresholds) matrix.  It is l where it never does. 
+    
+    NaNs in <statistic> never reach a threshold. """
+
+    thresholds = np.asarray(thresholds, dtype=float)
+    n, l = statistic.shape
+    order = np.argsort(thresholds)
+    sorted_thresholds = thresholds[order]
+
+    running_max = np.maximum.accumulate(
+            np.where(np.isnan(statistic), -np.inf, statistic), axis=1)
+
+    # How many thresholds have been reached, at each step,
+    # (it never decreases along a row).
+    reached = np.searchsorted(sorted_thresholds, running_max, side='right')
+
+    # The first passage of the jth threshold is the number of 
+    # steps that reached no more than j.  Offsetting each row
+    # keeps all the rows in one (sorted) search.
+    g = len(thresholds)
+    offset = (np.arange(n) * (g + 1))[:, None]
+    steps = np.searchsorted((reached + offset).ravel(), 
+            np.arange(g)[None, :] + offset, side='right') - \
+            np.arange(n)[:, None] * l
+
+    passage = np.empty_like(steps)
+    passage[:, order] = steps
+        ## Back in the order of thresholds
+
+    return passage
+
+
+def threshold_sweep(trials, model, thresholds):
+    """ Return the results of <model> for each of <thresholds> over 
+    <trials> (a Trials instance), as a ResultTable with one model per 
+    threshold named '<model name>_<threshold>'. 
+    
+    <model> must have a batch form with a decider that has a statistic 
+    (see accumulate.models.deciders.batch_statistic); its own threshold 
+    is ignored. """
+
+    statistic = batch_statistic(getattr(model, 'decider', None))
+    if (not hasattr(model, 'scores')) or (statistic is None):
+        raise ValueError('<model> has no batch form, or its decider has no'
+                ' array form.')
+    for threshold in thresholds:
+        check_threshold(threshold)
+
+    score_A, score_B = model.scores(trials.matrix())
+    with np.errstate(invalid='ignore'):
+        passage = first_passage(statistic(score_A, score_B), thresholds)
+
+    names = ['{0}_{1}'.format(model.__name__, threshold) 
+            for threshold in thresholds]
+    if trials.packed:
+        table = ResultTable.empty(names, trials.trials)
+    else:
+        table = ResultTable.empty(names, trials._trial_keys())
+
+    l = score_A.shape[1]
+    for ii in range(len(thresholds)):
+        decided = passage[:, ii] < l
+        with np.errstate(invalid='ignore'):
+            table.set_batch(ii, _batch_result_at(score_A, score_B, 
+                    np.minimum(passage[:, ii], l - 1), decided))
+
+    return table
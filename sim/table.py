@@ -0,0 +1,209 @@
+""" A columnar store for model results. """
+import numpy as np
+from accumulate.models.deciders import DECISION_CODES, DecisionResult, \
+        NO_DECISION
+
+
+class ResultTable():
+    """ Results for every (model, trial) pair stored as a struct of
+    (n_models x n_trials) arrays:
+
+        decision - int8 decision codes (see deciders.DECISION_CODES)
+        chosen_score - float32 (NaN if there was no decision)
+        unchosen_score - float32 (NaN if there was no decision)
+        rt - int16 (-1 if there was no decision)
+
+    The model id is the row, the trial index the column.  <models> are
+    the model names (by id) and <trials> the trial keys (by index).
+
+    A table is also a read only, dict-compatible view of the nested
+    results from Trials.categorize(), i.e. table[trial][model] is a
+    result (a deciders.DecisionResult), so code written for those works
+    unchanged (though scores are float32). """
+
+    def __init__(self, models, trials, decision, chosen_score,
+            unchosen_score, rt):
+        self.models = list(models)
+        self.trials = trials
+        self.decision = decision
+        self.chosen_score = chosen_score
+        self.unchosen_score = unchosen_score
+        self.rt = rt
+
+        self._index = None
+            ## trial key -> index,
+            ## built when first needed
+
+
+    @classmethod
+    def empty(cls, models, trials):
+        """ Return a table for <models> and <trials> with no decisions. """
+
+        shape = (len(models), len(trials))
+
+        return cls(models, trials,
+                np.zeros(shape, dtype=np.int8),
+                np.full(shape, np.nan, dtype=np.float32),
+                np.full(shape, np.nan, dtype=np.float32),
+                np.full(shape, -1, dtype=np.int16))
+
+
+    @classmethod
+    def from_results(cls, model_results):
+        """ Convert the nested dict <model_results> (from
+        Trials.categorize()) to a table. """
+
+        trials = sorted(model_results.keys())
+        models = sorted(model_results[trials[0]].keys())
+        table = cls.empty(models, trials)
+        for ii, trial in enumerate(trials):
+            for m, name in enumerate(models):
+                table.set(m, ii, model_results[trial][name])
+
+        return table
+
+
+    def set(self, model_id, index, result):
+        """ Store <result> (from a model) at <model_id>,
+        <index>.  <index> may also be an array of trial indices, all
+        of which get <result>. """
+
+        if isinstance(result, DecisionResult):
+            self.decision[model_id, index] = result.code
+        else:
+            self.decision[model_id, index] = DECISION_CODES[result['decision']]
+        if result['rt'] != None:
+            self.chosen_score[model_id, index] = result['chosen_score']
+            self.unchosen_score[model_id, index] = result['unchosen_score']
+            self.rt[model_id, index] = result['rt']
+
+
+    def set_batch(self, model_id, batch_result):
+        """ Store <batch_result>, from a model's batch form, for every
+        trial at <model_id>. """
+
+        self.decision[model_id] = batch_result['decision']
+        self.chosen_score[model_id] = batch_result['chosen_score']
+        self.unchosen_score[model_id] = batch_result['unchosen_score']
+        self.rt[model_id] = batch_result['rt']
+
+
+    def result(self, model_id, index):
+        """ Return the result (as from a model) at <model_id>,
+        <index>. """
+
+        rt = int(self.rt[model_id, index])
+        if rt == -1:
+            return NO_DECISION
+
+        return DecisionResult(int(self.decision[model_id, index]),
+                float(self.chosen_score[model_id, index]),
+                float(self.unchosen_score[model_id, index]), rt)
+
+
+    @property
+    def trial(self):
+        """ The trial index of every (model, trial) pair (flattened). """
+
+        return np.tile(np.arange(len(self.trials)), len(self.models))
+
+
+    @property
+    def model(self):
+        """ The model id of every (model, trial) pair (flattened). """
+
+        return np.repeat(np.arange(len(self.models)), len(self.trials))
+
+
+    def model_id(self, name):
+        """ Return the id of the model called <name>. """
+
+        return self.models.index(name)
+
+
+    def index(self, trial):
+        """ Return the index of the trial (key) <trial>. """
+
+        if self._index is None:
+            self._index = dict([(key, ii) for ii, key in
+                    enumerate(self._keys())])
+
+        return self._index[trial]
+
+
+    def _keys(self):
+        if isinstance(self.trials, np.ndarray):
+            return self.trials.tolist()
+
+        return list(self.trials)
+
+
+    def select(self, models=None, trials=None):
+        """ Return a table of only the named <models> and/or the trials at
+        the indices <trials>. """
+
+        if models is None:
+            rows = np.arange(len(self.models))
+        else:
+            rows = np.array([self.model_id(name) for name in models],
+                    dtype=int)
+
+        if trials is None:
+            cols = np.arange(len(self.trials))
+        else:
+            cols = np.asarray(trials, dtype=int)
+
+        if isinstance(self.trials, np.ndarray):
+            keys = self.trials[cols]
+        else:
+            keys = [self.trials[ii] for ii in cols]
+
+        grid = np.ix_(rows, cols)
+
+        return ResultTable([self.models[m] for m in rows], keys,
+                self.decision[grid], self.chosen_score[grid],
+                self.unchosen_score[grid], self.rt[grid])
+
+
+    def nbytes(self):
+        """ The memory used by the result columns. """
+
+        return self.decision.nbytes + self.chosen_score.nbytes + \
+                self.unchosen_score.nbytes + self.rt.nbytes
+
+
+    # The dict-compatible view
+    def __getitem__(self, trial):
+        ii = self.index(trial)
+
+        return dict([(name, self.result(m, ii)) for m, name in
+                enumerate(self.models)])
+
+    def __contains__(self, trial):
+        try:
+            self.index(trial)
+        except KeyError:
+            return False
+
+        return True
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self.trials)
+
+    def keys(self):
+        return self._keys()
+
+    def values(self):
+        return [self[trial] for trial in self._keys()]
+
+    def items(self):
+        return [(trial, self[trial]) for trial in self._keys()]
+
+    def as_dict(self):
+        """ Return the results as a nested dict, as from
+        Trials.categorize(). """
+
+        return dict(self.items())
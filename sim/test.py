@@ -49,3 +49,8 @@ class SelectTrials(Trials):
         return (t for t in test_trials) 
             ## Returns a generator expression
 
+
+    def trial_key(self, index):
+        """ Return the key of the test trial at <index>. """
+
+        return ''.join(self._get_test_trials()[index])
@@ -0,0 +1,86 @@
+""" A prefix-tree executor for resumable models (i.e. those with
+model.start() and model.step(), see accumulate.models.construct).
+
+Every trial shares its prefixes with many others.  Once a model decides
+at step k, every trial sharing that prefix gets the same result, so the
+tree below it is never visited. """
+from bisect import bisect_left
+
+from accumulate.models.deciders import _create_d_result
+
+
+def walk(model, l, root='A'):
+    """ Yield (prefix, result) for every decided prefix of the trials of
+    length <l> that begin with <root>, in depth first order.  Prefixes 
+    that reach length <l> undecided yield the 'N' result.
+
+    Every trial that begins with a yielded prefix has that result. 
+    
+    By default only trials beginning with an 'A' are examined, i.e. 
+    the first half, as in accumulate.sim.base.Trials. """
+
+    l = int(l)
+    start = model.start
+    step = model.step
+
+    # Run down to the root. If a decision
+    # is made on the way, it is the decision
+    # for every trial below the root.
+    state = start(l)
+    for ii, t in enumerate(root[:-1]):
+        state, decision = step(state, t, ii, l)
+        if decision != None:
+            yield root, decision
+            return
+
+    stack = [(root, state)]
+    while stack:
+        prefix, state = stack.pop()
+        state, decision = step(state, prefix[-1], len(prefix) - 1, l)
+        if decision != None:
+            yield prefix, decision
+        elif len(prefix) == l:
+            yield prefix, _create_d_result('N', None, None, None)
+        else:
+            stack.append((prefix + 'B', state))
+            stack.append((prefix + 'A', state))
+                ## A is popped first
+
+
+
+def walk_trials(model, trials):
+    """ Yield (trial, result) for each of <trials> (strings, all of the 
+    same length), running <model> over the prefix tree of only those 
+    trials.  As walk(), a prefix is never repeated and, once decided, 
+    nothing below it is visited. """
+
+    trials = sorted(set(trials))
+    if not trials:
+        return
+
+    l = len(trials[0])
+    start = model.start
+    step = model.step
+
+    # Each node is the range of (sorted) trials
+    # sharing a prefix, its length and the state
+    # after it.
+    stack = [(0, len(trials), 0, start(l))]
+    while stack:
+        lo, hi, depth, state = stack.pop()
+        mid = bisect_left(trials, trials[lo][:depth] + 'B', lo, hi)
+            ## As are sorted before Bs
+
+        for first, last, t in ((mid, hi, 'B'), (lo, mid, 'A')):
+            if first == last:
+                continue
+
+            new_state, decision = step(state, t, depth, l)
+            if (decision == None) and (depth + 1 == l):
+                decision = _create_d_result('N', None, None, None)
+
+            if decision != None:
+                for trial in trials[first:last]:
+                    yield trial, decision
+            else:
+                stack.append((first, last, depth + 1, new_state))
@@ -0,0 +1,129 @@
+""" Binary trial files.
+
+A trial file is a short header followed by the (bit-packed, see
+accumulate.sim.bits) trial codes, one per row, as little-endian uint32
+(l <= 32) or uint64 (l <= 64).  The header is the magic string, the
+length of the metadata and the metadata itself (JSON: l, count, dtype,
+the A/B encoding and whether the trials are sorted and/or are the complete
+first half).  The codes start on a 64 byte boundary, so they can be read
+back with numpy.memmap, i.e. without reading the file.
+
+Codes always have 'A' as a set bit; <encoding> is only metadata, for
+whoever presents the trials (see decode()). """
+import json
+import struct
+
+import numpy as np
+from accumulate.sim.base import Trials
+from accumulate.sim import bits
+
+
+MAGIC = b'ACCTRIAL'
+VERSION = 1
+_ALIGN = 64
+
+
+def write(filename, trial_codes, l, encoding=None):
+    """ Write <trial_codes> (trials of length <l>) to <filename>.
+
+    If <encoding> is a list of length 2 the first entry is the code for
+    'A' the second for 'B'; it is stored in the metadata. """
+
+    l = int(l)
+    if encoding is None:
+        encoding = ['A', 'B']
+    elif len(encoding) != 2:
+        raise ValueError('<encoding> can only have two entries.')
+
+    dt = np.dtype(bits.dtype(l)).newbyteorder('<')
+    trial_codes = np.asarray(trial_codes).astype(dt)
+
+    is_sorted = bool(np.all(trial_codes[1:] > trial_codes[:-1]))
+        ## Sorted and unique
+    complete = is_sorted and (len(trial_codes) == 2 ** (l - 1)) and \
+            bool(np.all(trial_codes & 1))
+        ## Every one of the 2 ** (l - 1) codes
+        ## that begins with an 'A'
+
+    metadata = json.dumps({
+        'version' : VERSION,
+        'l' : l,
+        'count' : len(trial_codes),
+        'dtype' : dt.str,
+        'encoding' : [str(e) for e in encoding],
+        'sorted' : is_sorted,
+        'complete' : complete
+    }, sort_keys=True).encode('utf-8')
+
+    # Pad the metadata, so the codes are aligned.
+    size = len(MAGIC) + 4 + len(metadata)
+    metadata += b' ' * (-size % _ALIGN)
+
+    with open(filename, 'wb') as fid:
+        fid.write(MAGIC)
+        fid.write(struct.pack('<I', len(metadata)))
+        fid.write(metadata)
+        trial_codes.tofile(fid)
+            ## In bulk
+
+
+def read_header(filename):
+    """ Return the metadata of <filename> (a dict), and the offset of its
+    codes. """
+
+    with open(filename, 'rb') as fid:
+        if fid.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{0} is not a trial file.'.format(filename))
+        size = struct.unpack('<I', fid.read(4))[0]
+        metadata = json.loads(fid.read(size).decode('utf-8'))
+
+    if metadata['version'] > VERSION:
+        raise ValueError('{0} is from a newer version ({1}).'.format(
+                filename, metadata['version']))
+
+    return metadata, len(MAGIC) + 4 + size
+
+
+def read(filename):
+    """ Return the metadata and the (memory mapped, read only) codes in
+    <filename>. """
+
+    metadata, offset = read_header(filename)
+    if metadata['count'] == 0:
+        return metadata, np.array([], dtype=metadata['dtype'])
+
+    return metadata, np.memmap(filename, dtype=metadata['dtype'], mode='r',
+            offset=offset, shape=(metadata['count'],))
+
+
+def decode(code, l, encoding):
+    """ Return the trial for <code> as a list, encoded by <encoding>
+    (see write()). """
+
+    return [encoding[0] if t == 'A' else encoding[1]
+            for t in bits.unpack(code, l)]
+
+
+class FileTrials(Trials):
+    """ The (packed) trials in the trial file <filename>, memory mapped.
+
+    The encoding is kept as self.encoding. """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.metadata, self._file_codes = read(filename)
+        self.encoding = self.metadata['encoding']
+
+        Trials.__init__(self, self.metadata['l'], packed=True)
+
+        # Over ride max_trial_count...
+        self.max_trial_count = len(self.trials)
+
+
+    def _generate_trials(self):
+        """ Returns the codes in the file. """
+
+        self.trial_count = 0
+            ## reset
+
+        return self._file_codes
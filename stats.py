@@ -1,23 +1,85 @@
 """ 
 A module to calculate aggregate statistics for AccumulationExp() results.
+
+Most functions take either the nested dict of results from 
+Trials.categorize() or the stream of Records from Trials.iter_categorize(),
+which they consume one trial at a time.  Results from a stream are keyed
+by trial index.  They also have a fast (vectorized) path for results in 
+a ResultTable (see accumulate.sim.table).
 """
 from collections import defaultdict
+from itertools import groupby
+from operator import attrgetter
 
-def correct_trial(trial, correct_model, model_results):
-    """ 
-    Given a <correct_model>, how accurate are the remaining <model_names>
-    in <model_results> for the given <trial>.  
-    
-    Note: accuracy on N outcomes is coded as -1 not 1.
-    """
+import numpy as np
+from accumulate.models.deciders import _create_d_result, DECISION_CODES
+from accumulate.sim.table import ResultTable
+
+
+def by_trial(records):
+    """ Group a stream of <records> (or of chunks of them, see 
+    Trials.iter_categorize()) by trial, yielding (trial, trial_results) 
+    where trial_results is as model_results[trial] would be. """
+
+    def flat():
+        for record in records:
+            if isinstance(record, list):
+                for r in record:
+                    yield r
+            else:
+                yield record
+
+    for trial, group in groupby(flat(), key=attrgetter('trial')):
+        yield trial, dict([(r.model, _create_d_result(r.decision, 
+                r.chosen_score, r.unchosen_score, r.rt)) for r in group])
+
+
+def _items(model_results):
+    """ Iterate over the (trial, trial_results) in <model_results>, a
+    nested dict or a stream of Records. """
+
+    if hasattr(model_results, 'items'):
+        return model_results.items()
     
-    # Will be a list of accuracies in a dict, keyed
-    # by models from model_results
+    return by_trial(model_results)
+
+
+def _accuracy(decision, correct_decision):
+    """ The array form of the accuracy coding in _trial_accuracy(), for 
+    decision codes. """
+
+    N = DECISION_CODES['N']
+
+    return np.where(decision == correct_decision, 
+            np.where(correct_decision == N, -1, 1), 0).astype(np.int8)
+
+
+def _table_accuracy(correct_model, table, index=None):
+    """ Return {alt_model : accuracy} for every alt_model in <table>, given 
+    <correct_model>.  Accuracies are arrays over the trials, or for only the 
+    trial at <index>. """
+
+    correct_decision = table.decision[table.model_id(correct_model)]
+    if index is not None:
+        correct_decision = correct_decision[index]
+
+    acc = dict()
+    for m, alt_model in enumerate(table.models):
+        if alt_model == correct_model:
+            continue
+        decision = table.decision[m]
+        if index is not None:
+            decision = decision[index]
+        acc[alt_model] = _accuracy(decision, correct_decision)
+
+    return acc
+
+
+def _trial_accuracy(correct_model, trial_results):
+    """ The accuracy of each model in <trial_results> (one trial's results) 
+    given <correct_model>. See correct_trial(). """
+
     acc = dict()
-    
-    # Get the trial_results and find the correct_answer
-    # based on correct_model
-    trial_results = model_results[trial]
     correct_answer = trial_results[correct_model]['decision']
     
     for alt_model, result in trial_results.items():
@@ -39,6 +101,24 @@ def correct_trial(trial, correct_model, model_results):
     return acc
 
 
+def correct_trial(trial, correct_model, model_results):
+    """ 
+    Given a <correct_model>, how accurate are the remaining <model_names>
+    in <model_results> for the given <trial>.  
+    
+    Note: accuracy on N outcomes is coded as -1 not 1.
+    """
+    
+    if isinstance(model_results, ResultTable):
+        index = model_results.index(trial)
+        return dict([(alt_model, int(a)) for alt_model, a in 
+                _table_accuracy(correct_model, model_results, index).items()])
+
+    # Will be a list of accuracies in a dict, keyed
+    # by models from model_results
+    return _trial_accuracy(correct_model, model_results[trial])
+
+
 def correct(correct_model, model_results):
     """ 
     Given a <correct_model>, how accurate are the remaining <model_names>
@@ -50,51 +130,364 @@ def correct(correct_model, model_results):
     # Count how many times each model was right
     # and wrong campared to <correct_model>
     acc = defaultdict(dict)
+
+    if isinstance(model_results, ResultTable):
+        table_acc = [(alt_model, a.tolist()) for alt_model, a in 
+                _table_accuracy(correct_model, model_results).items()]
+        if table_acc:
+            for ii, trial in enumerate(model_results.keys()):
+                acc[trial] = dict([(alt_model, a[ii]) 
+                        for alt_model, a in table_acc])
+
+        return acc
     
     # Loop over each trial:
-    for trial, trial_results in model_results.items():
-        correct_answer = trial_results[correct_model]['decision']
-        for alt_model, result in trial_results.items():
-            # Don't consider the correct_model
-            # when averaging; it is always 1.
-            if alt_model == correct_model:
-                continue
-
-            # This model's name's answer is:
-            answer = result['decision']            
-            if (answer == correct_answer) and (correct_answer != 'N'):
-                acc[trial].update({alt_model : 1})
-            elif (answer == correct_answer) and (correct_answer == 'N'):
-                acc[trial].update({alt_model : -1})
-                    ## Correct Ns as -1
-            else:
-                acc[trial].update({alt_model : 0})
+    for trial, trial_results in _items(model_results):
+        trial_acc = _trial_accuracy(correct_model, trial_results)
+        if trial_acc:
+            acc[trial].update(trial_acc)
 
     # and return it
     return acc
 
 
+def _decisions(model_results):
+    """ Return the decision codes (n_models x n_trials) and trial keys in
+    <model_results>: a ResultTable, a nested dict or stream of results or
+    (already) an array of decision codes (then keys are None). 
+    
+    Models are in the table's order (sorted by name for the others). """
+
+    if isinstance(model_results, np.ndarray):
+        return model_results, None
+
+    if not isinstance(model_results, ResultTable):
+        model_results = ResultTable.from_results(dict(_items(model_results)))
+    
+    return model_results.decision, model_results.keys()
+
+
+def agreement(model_results):
+    """ Return how accurate every model is given every other, i.e. 
+    correct_trial() for every <correct_model> at once, as an (n_models 
+    (correct) x n_models x n_trials) int8 array of 1 (agree), 0 (disagree)
+    and -1 (agree on N).
+    
+    <model_results> may also be (n_models x n_trials) decision codes, see
+    _decisions() for the model order. """
+
+    decision = _decisions(model_results)[0]
+
+    return _accuracy(decision[None, :, :], decision[:, None, :])
+
+
+def agreement_matrix(model_results, strata=None):
+    """ Return the fraction of trials on which each pair of models agree, 
+    as a dict of (n_models x n_models) arrays: 'agree' for agreement on a 
+    category (1 in correct()) and 'agree_N' for agreement on N (-1).
+    
+    If <strata> is given (an array of each trial's stratum, or a dict 
+    keyed by trial e.g. from Trials.distances()) a dict of these for each 
+    stratum is returned instead, each also with the number of trials, 'n'. 
+    
+    <model_results> may also be (n_models x n_trials) decision codes, see
+    _decisions() for the model order. """
+
+    decision, keys = _decisions(model_results)
+
+    if strata is None:
+        return _agreement_matrix(decision)
+
+    if isinstance(strata, dict):
+        if keys is None:
+            raise ValueError(
+                    'Decision codes have no trials, so <strata> must be '
+                    'an array.')
+        strata = [strata[trial] for trial in keys]
+    strata = np.asarray(strata)
+
+    by_stratum = dict()
+    for stratum in np.unique(strata).tolist():
+        index = np.flatnonzero(strata == stratum)
+        by_stratum[stratum] = _agreement_matrix(decision[:, index])
+        by_stratum[stratum]['n'] = index.size
+
+    return by_stratum
+
+
+def _agreement_matrix(decision):
+    """ The work of agreement_matrix(), for one stratum. """
+
+    n_trials = max(decision.shape[1], 1)
+
+    # One (n_models x n_trials) indicator per 
+    # decision, then the agreements are all a
+    # matrix product.
+    agree = dict()
+    for code in (DECISION_CODES['A'], DECISION_CODES['B'], 
+            DECISION_CODES['N']):
+        made = (decision == code).astype(np.float64)
+        agree[code] = made.dot(made.T)
+
+    return {
+        'agree' : (agree[DECISION_CODES['A']] + 
+                agree[DECISION_CODES['B']]) / n_trials,
+        'agree_N' : agree[DECISION_CODES['N']] / n_trials
+    }
+
+
+class Aggregate():
+    """ A mergeable running summary of a statistic: its count, mean, M2
+    (the sum of squared deviations, so the variance), min, max and, if 
+    <bins> (histogram edges, as for numpy.histogram) are given, histogram.
+
+    Values are added in chunks (arrays) with add(), and summaries of 
+    other chunks, streams or processes are combined with merge() (Chan et
+    al's pairwise update), so the order values arrive in doesn't matter. """
+
+    def __init__(self, bins=None):
+        self.count = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.min = None
+        self.max = None
+
+        self.bins = bins
+        self.histogram = None
+        if bins is not None:
+            self.bins = np.asarray(bins)
+            self.histogram = np.zeros(len(self.bins) - 1, dtype=np.int64)
+
+
+    def add(self, values):
+        """ Add <values> (a number, or an array of them). """
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return self
+
+        chunk = Aggregate(self.bins)
+        chunk.count = values.size
+        chunk.mean = float(values.mean())
+        chunk.M2 = float(((values - chunk.mean) ** 2).sum())
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        if self.bins is not None:
+            chunk.histogram = np.histogram(values, self.bins)[0]
+        
+        return self.merge(chunk)
+
+
+    def merge(self, other):
+        """ Merge the Aggregate <other> into this one (which is returned). """
+
+        if other.count == 0:
+            return self
+        if (self.bins is None) != (other.bins is None) or \
+                ((self.bins is not None) and 
+                        not np.array_equal(self.bins, other.bins)):
+            raise ValueError('Only Aggregates with the same bins can merge.')
+
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean
+            self.M2 = other.M2
+            self.min = other.min
+            self.max = other.max
+        else:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / float(count)
+            self.M2 += other.M2 + \
+                    delta ** 2 * self.count * other.count / float(count)
+            self.count = count
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+        
+        if self.bins is not None:
+            self.histogram = self.histogram + other.histogram
+
+        return self
+
+
+    @property
+    def var(self):
+        """ The (sample) variance. """
+
+        if self.count < 2:
+            return None
+
+        return self.M2 / (self.count - 1)
+
+
+    @property
+    def std(self):
+        """ The (sample) standard deviation. """
+
+        if self.count < 2:
+            return None
+        
+        return self.var ** 0.5
+
+
+_STATISTICS = ('rt', 'chosen_score', 'unchosen_score', 'D', 'T', 'DT')
+
+
+class ResultAggregates():
+    """ Mergeable Aggregates of rt, chosen_score, unchosen_score and the 
+    divergences (D, T and DT, see divergence_by_trial()) for each model.  
+    Trials with no decision are left out of the rt and scores.  If 
+    <divergence> is False the divergences (the costly part) are left out.
+
+    Use:
+    ----
+    >>> aggs = ResultAggregates(rt_bins=range(l + 2))
+    >>> for chunk in trials.iter_categorize(models, chunksize=4096):
+    ...     aggs.add(chunk)
+    >>> aggs['abs']['rt'].mean
+
+    Chunks may be ResultTables, nested dicts or streams (or chunks) of 
+    Records, but each must hold every model's result for its trials.  
+    Dicts and streams are read in one pass, <chunksize> trials at a time,
+    so a stream is never held in memory.  Aggregates of other chunks (e.g.
+    from a process pool, see accumulate.sim.parallel.aggregate()) are 
+    combined with merge(). """
+
+    def __init__(self, rt_bins=None, score_bins=None, divergence=True, 
+            chunksize=4096):
+        self.rt_bins = rt_bins
+        self.score_bins = score_bins
+        self.with_divergence = divergence
+        self.chunksize = int(chunksize)
+        self.models = dict()
+
+
+    def _model(self, name):
+        if name not in self.models:
+            self.models[name] = dict([(stat, Aggregate(self._bins(stat))) 
+                    for stat in _STATISTICS])
+
+        return self.models[name]
+
+
+    def _bins(self, stat):
+        if stat == 'rt':
+            return self.rt_bins
+        elif stat in ('chosen_score', 'unchosen_score'):
+            return self.score_bins
+        
+        return None
+
+
+    def add(self, model_results):
+        """ Add the results in <model_results> (a chunk). """
+
+        if isinstance(model_results, list):
+            model_results = iter(model_results)
+                ## A chunk of Records
+
+        if isinstance(model_results, ResultTable):
+            self._add_table(model_results)
+
+            return self
+
+        chunk = dict()
+        for trial, trial_results in _items(model_results):
+            chunk[trial] = trial_results
+            if len(chunk) == self.chunksize:
+                self._add_results(chunk)
+                chunk = dict()
+        if chunk:
+            self._add_results(chunk)
+
+        return self
+
+
+    def _add_table(self, table):
+        """ Add the ResultTable <table>. """
+
+        for m, name in enumerate(table.models):
+            decided = table.rt[m] != -1
+            aggs = self._model(name)
+            aggs['rt'].add(table.rt[m][decided])
+            aggs['chosen_score'].add(table.chosen_score[m][decided])
+            aggs['unchosen_score'].add(table.unchosen_score[m][decided])
+
+        if self.with_divergence:
+            for name, divs in _table_divergence(table).items():
+                aggs = self._model(name)
+                for k in ('D', 'T', 'DT'):
+                    aggs[k].add(divs[k])
+
+
+    def _add_results(self, model_results):
+        """ Add the nested dict <model_results>; scores are kept as they
+        are (not as float32, as in a table). """
+
+        columns = defaultdict(lambda : defaultdict(list))
+        for trial, trial_results in model_results.items():
+            for name, result in trial_results.items():
+                if result['rt'] != None:
+                    columns[name]['rt'].append(result['rt'])
+                    columns[name]['chosen_score'].append(
+                            result['chosen_score'])
+                    columns[name]['unchosen_score'].append(
+                            result['unchosen_score'])
+
+        if self.with_divergence:
+            table = ResultTable.from_results(model_results)
+            for name, divs in _table_divergence(table).items():
+                for k in ('D', 'T', 'DT'):
+                    columns[name][k].extend(divs[k].tolist())
+
+        for name, stats in columns.items():
+            aggs = self._model(name)
+            for stat, values in stats.items():
+                aggs[stat].add(values)
+
+
+    def merge(self, other):
+        """ Merge the ResultAggregates <other> into these (which are 
+        returned). """
+
+        for name, aggs in other.models.items():
+            mine = self._model(name)
+            for stat, agg in aggs.items():
+                mine[stat].merge(agg)
+
+        return self
+
+
+    def __getitem__(self, name):
+        return self.models[name]
+
+    def keys(self):
+        return self.models.keys()
+
+    def mean_rt(self):
+        """ As mean_rt(). """
+
+        return dict([(name, aggs['rt'].mean) for name, aggs in 
+                self.models.items() if aggs['rt'].count > 0])
+
+    def divergence(self):
+        """ As divergence(). """
+
+        if not self.with_divergence:
+            raise ValueError('Divergences were not aggregated.')
+
+        return dict([(name, dict([(k, aggs[k].mean) for k in 
+                ('D', 'T', 'DT')])) for name, aggs in self.models.items()])
+
+
 def mean_rt(model_results):
     """ Return the average reaction time for each model in 
-    <model_results>. """
-    
-    # Init
-    mrt = dict()
-    
-    # Loop over the results average (online) the rts
-    # for each model, or if that fails (KeyError)
-    # initialize instead.  Ignore Nones.
-    for trial_results in model_results.values():
-        for name, result in trial_results.items():
-            rt = result['rt']
-            if rt != None:
-                try:
-                    mrt[name] = (mrt[name] + rt) / 2.0
-                        ## mean!
-                except KeyError:
-                    mrt[name] = float(rt)
-                        ## Init, force type
-    return mrt
+    <model_results>. 
+    
+    For results in chunks (or from many processes) see 
+    ResultAggregates. """
+    
+    return ResultAggregates(divergence=False).add(model_results).mean_rt()
     
     
 def reaction_time_difference(correct_model, model_results):
@@ -125,56 +518,142 @@ def divergence_by_trial(model_results):
                         ## as: divergent[name][model][...]
                         ## where ... is D, T, or DT
 
-    for trial, models_data in model_results.items():
-        divergent[trial] = dict()
-        for name, result in models_data.items():
-            divergent[trial][name] = {'D' : 0, 'T' : 0, 'DT' : 0}
-                ## and divergent is fully intialized...
-            
-            num_models = float(len(models_data))
-            # Compare name to all the other names/models
-            for name_compare, result_compare in models_data.items():
-                # Don't check the same names though.
-                if name == name_compare:
-                    continue
-
-                # Rename result, for brevity.
-                r = result
-                rc = result_compare
-                
-                # Check decision,
-                if r['decision'] != rc['decision']:
-                    divergent[trial][name]['D'] += 1 / num_models
-                
-                # then time only,
-                if (r['decision'] == rc['decision']) and (r['rt'] != rc['rt']):
-                    divergent[trial][name]['T'] += 1 / num_models
-                
-                # and time and decision go last.
-                if (r['decision'] != rc['decision']) and (r['rt'] != rc['rt']):
-                    divergent[trial][name]['DT'] += 1 / num_models
-    
+    table = _as_table(model_results)
+    table_divs = [(name, dict([(k, v.tolist()) for k, v in divs.items()]))
+            for name, divs in _table_divergence(table).items()]
+    for ii, trial in enumerate(table.keys()):
+        divergent[trial] = dict([(name, {'D' : divs['D'][ii], 
+                'T' : divs['T'][ii], 'DT' : divs['DT'][ii]}) 
+                for name, divs in table_divs])
+
     return divergent
 
 
-def divergence(model_results):
-    """ Return the average divergence measures for each model in 
-    <model_results. """
+def _as_table(model_results):
+    """ Return <model_results> (a nested dict, stream or ResultTable) as 
+    a ResultTable. """
+
+    if isinstance(model_results, ResultTable):
+        return model_results
+
+    return ResultTable.from_results(dict(_items(model_results)))
+
+
+def _divergence_counts(decision, rt, chunksize=4096):
+    """ Return the number of other models each model diverges from, as 
+    (n_models x n_trials) arrays for 'D' (in decision), 'T' (in rt only) 
+    and 'DT' (in both), given (n_models x n_trials) <decision> and <rt>. 
+    
+    Every pair is compared at once, <chunksize> trials at a time. """
+
+    counts = dict([(k, np.zeros(decision.shape, dtype=np.int64)) 
+            for k in ('D', 'T', 'DT')])
+    for start in range(0, decision.shape[1], chunksize):
+        stop = start + chunksize
+        dec = decision[:, start:stop]
+        r = rt[:, start:stop]
+        
+        diff_decision = dec[:, None, :] != dec[None, :, :]
+        diff_rt = r[:, None, :] != r[None, :, :]
+            ## (model x compared model x trial),
+            ## a model never differs from itself.
+
+        counts['D'][:, start:stop] = diff_decision.sum(axis=1)
+        counts['T'][:, start:stop] = (~diff_decision & diff_rt).sum(axis=1)
+        counts['DT'][:, start:stop] = (diff_decision & diff_rt).sum(axis=1)
+
+    return counts
+
+
+def _table_divergence(table):
+    """ The array form of divergence_by_trial(), for a ResultTable. 
+    Returns {model : {'D' : ..., 'T' : ..., 'DT' : ...}} where each 
+    measure is an array over the trials. """
+
+    num_models = len(table.models)
+    
+    # Add up 1 / num_models one at a time, 
+    # as divergence_by_trial() always has.
+    fraction = np.zeros(num_models)
+    for ii in range(1, num_models):
+        fraction[ii] = fraction[ii - 1] + 1 / float(num_models)
 
-    # Make a copy of model_results, so we can pop off
-    # of it safely, initializing mean_div.
-    divs = divergence_by_trial(model_results)
-    mean_div = dict()
-    trial, mean_div = divs.popitem()
-        ## Init by pop
+    counts = _divergence_counts(table.decision, table.rt)
 
-    # Loop over divs, averaging each divergence measure
-    for trial, model_data in divs.items():
-        for model, divs in model_data.items():
-            mean_div[model]['D'] = (mean_div[model]['D'] + divs['D']) / 2.
-            mean_div[model]['T'] = (mean_div[model]['T'] + divs['T']) / 2.
-            mean_div[model]['DT'] = (mean_div[model]['DT'] + divs['DT']) / 2.
-            
+    return dict([(name, dict([(k, fraction[c[m]]) for k, c in 
+            counts.items()])) for m, name in enumerate(table.models)])
 
-    return mean_div
 
+class DivergenceIndex():
+    """ An index of the trials in <model_results> (a ResultTable, nested 
+    dict or stream), ranked by how much the models diverge on them.
+    
+    For finding the key trials where two (or more) largely similar models 
+    diverge, e.g.
+    
+    >>> index = DivergenceIndex(table)
+    >>> index.rank(models=['abs', 'rel'], top=10)
+    
+    Divergence is counted over every (ordered) pair of different models, 
+    see divergence_by_trial() for the measures (D, T or DT).  Rankings are 
+    cached, so repeated queries are free. """
+
+    def __init__(self, model_results):
+        self.table = _as_table(model_results)
+        self._counts = _divergence_counts(self.table.decision, self.table.rt)
+        self._keys = self.table.keys()
+        self._ranks = dict()
+
+
+    def scores(self, measure='D', models=None):
+        """ Return the fraction of the pairs of <models> (by default all 
+        of them) that diverge, by <measure>, on each trial (an array). """
+
+        if measure not in ('D', 'T', 'DT'):
+            raise ValueError("<measure> must be 'D', 'T' or 'DT'.")
+
+        if models is None:
+            n = len(self.table.models)
+            if n < 2:
+                return np.zeros(len(self._keys))
+
+            return self._counts[measure].sum(axis=0) / float(n * (n - 1))
+
+        # Only some of the models, 
+        # so recount.
+        rows = [self.table.model_id(name) for name in models]
+        if len(rows) < 2:
+            raise ValueError('<models> must have at least 2 models.')
+        counts = _divergence_counts(self.table.decision[rows], 
+                self.table.rt[rows])
+
+        return counts[measure].sum(axis=0) / float(len(rows) * 
+                (len(rows) - 1))
+
+
+    def rank(self, measure='D', models=None, top=None):
+        """ Return a list of (trial, score) for the (<top>) trials, most 
+        divergent first (ties in trial order). See scores(). """
+
+        key = (measure, None if models is None else tuple(models))
+        if key not in self._ranks:
+            scores = self.scores(measure, models)
+            order = np.argsort(-scores, kind='mergesort')
+                ## Stable
+            self._ranks[key] = (order, scores)
+
+        order, scores = self._ranks[key]
+        if top is not None:
+            order = order[:top]
+
+        return [(self._keys[ii], float(scores[ii])) for ii in order]
+
+
+def divergence(model_results):
+    """ Return the average divergence measures for each model in 
+    <model_results. 
+    
+    For results in chunks (or from many processes) see 
+    ResultAggregates. """
+
+    return ResultAggregates().add(model_results).divergence()
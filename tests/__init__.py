@@ -0,0 +1,2 @@
+""" Tests; run with python -m unittest discover from the directory
+holding accumulate (python 2.7). """
@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate import stats
+
+
+def _models():
+    return [construct.create_abscount('a_abs', 0.5, deciders.absolute),
+            construct.create_relcount('b_rel', 0.3, deciders.difference),
+            construct.create_information('c_info', 0.4, deciders.absolute),
+            construct.create_urgency_gating('d_ug', 0.3, 
+                    deciders.difference)]
+
+
+class TestAgreement(unittest.TestCase):
+
+    def setUp(self):
+        self.trials = Trials(8)
+        self.results = self.trials.categorize(_models())
+        self.table = self.trials.categorize(_models(), table=True)
+        self.names = self.table.models
+
+    def test_agreement(self):
+        """ Every pair is coded as correct_trial() codes it. """
+
+        agree = stats.agreement(self.table)
+        n = len(self.names)
+        self.assertEqual(agree.shape, (n, n, len(self.results)))
+        self.assertTrue(np.array_equal(agree, 
+                stats.agreement(self.results)))
+
+        for t, trial in enumerate(self.table.keys()):
+            for c, correct_model in enumerate(self.names):
+                acc = stats.correct_trial(trial, correct_model, 
+                        self.results)
+                for m, model in enumerate(self.names):
+                    if m != c:
+                        self.assertEqual(agree[c, m, t], acc[model])
+
+    def test_strata(self):
+        """ Per stratum counts and fractions, from Trials.distances(). """
+
+        distances = self.trials.distances()
+        by_stratum = stats.agreement_matrix(self.results, strata=distances)
+        self.assertEqual(sorted(by_stratum.keys()), 
+                sorted(set(distances.values())))
+
+        for stratum, matrix in by_stratum.items():
+            trials = [trial for trial in self.results 
+                    if distances[trial] == stratum]
+            self.assertEqual(matrix['n'], len(trials))
+            for i, first in enumerate(self.names):
+                for j, second in enumerate(self.names):
+                    pairs = [(self.results[trial][first]['decision'], 
+                            self.results[trial][second]['decision']) 
+                            for trial in trials]
+                    agree = [a == b and a != 'N' for a, b in pairs]
+                    agree_N = [a == b == 'N' for a, b in pairs]
+                    self.assertAlmostEqual(matrix['agree'][i, j], 
+                            np.mean(agree))
+                    self.assertAlmostEqual(matrix['agree_N'][i, j], 
+                            np.mean(agree_N))
+
+
+if __name__ == '__main__':
+    unittest.main()
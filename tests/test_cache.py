@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate.sim.test import SelectTrials
+from accumulate.sim.trialfile import FileTrials, write
+from accumulate.sim.cache import ResultCache
+
+
+class ListTrials(SelectTrials):
+    """ (Unpacked) trials from a list. """
+
+    def __init__(self, l, trial_list):
+        self.trial_list = trial_list
+        SelectTrials.__init__(self, l)
+
+    def _get_test_trials(self):
+        return self.trial_list
+
+
+def _same(column, expected):
+    """ Equal columns; undecided scores are NaN. """
+
+    column = np.asarray(column, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+
+    return ((column == expected) | (np.isnan(column) & 
+            np.isnan(expected))).all()
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_cache_key(self):
+        cache = ResultCache(os.path.join(self.tmp, 'cache'))
+        model = construct.create_relcount('rel', 0.6, deciders.absolute)
+
+        write('a.bin', [1, 3, 5], 6)
+        write('b.bin', [1, 3, 7], 6)
+        self.assertNotEqual(cache.key(FileTrials('a.bin'), model),
+                cache.key(FileTrials('b.bin'), model))
+
+        first = ListTrials(6, ['AAAAAA', 'ABABAB'])
+        second = ListTrials(6, ['AAAAAA', 'ABBBBB'])
+        self.assertNotEqual(cache.key(first, model), 
+                cache.key(second, model))
+        self.assertEqual(cache.key(first, model), 
+                cache.key(ListTrials(6, ['AAAAAA', 'ABABAB']), model))
+
+
+
+    def models(self, threshold=0.6):
+        return [construct.create_relcount('rel', threshold, 
+                deciders.absolute), construct.create_abscount('abs', 
+                threshold, deciders.difference)]
+
+    def age(self, cache, key, seconds):
+        """ Make <key> last used <seconds> ago. """
+
+        manifest = os.path.join(cache._entry(key), 'manifest.json')
+        used = os.path.getmtime(manifest) - seconds
+        os.utime(manifest, (used, used))
+
+    def test_round_trip(self):
+        cache = ResultCache(os.path.join(self.tmp, 'cache'))
+        for trials in (Trials(6), Trials(6, packed=True)):
+            expected = trials.categorize(self.models(), table=True)
+            first = cache.categorize(trials, self.models())
+            key = cache.key(trials, self.models())
+            self.assertTrue(key in cache)
+
+            table = cache.get(key)
+            self.assertEqual(table.models, expected.models)
+            self.assertEqual(list(table.keys()), list(expected.keys()))
+            for name in ('decision', 'chosen_score', 'unchosen_score', 
+                    'rt'):
+                column = getattr(table, name)
+                self.assertTrue(isinstance(column, np.memmap))
+                self.assertTrue(_same(column, getattr(expected, name)))
+                self.assertTrue(_same(getattr(first, name), 
+                        getattr(expected, name)))
+
+    def test_corrupt(self):
+        trials = Trials(6, packed=True)
+        models = self.models()
+        key = ResultCache(os.path.join(self.tmp, 'cache')).key(trials, 
+                models)
+
+        def rt(cache):
+            return os.path.join(cache._entry(key), 'rt.npy')
+
+        # Truncated, so the wrong size
+        cache = ResultCache(os.path.join(self.tmp, 'cache'))
+        cache.categorize(trials, models)
+        with open(rt(cache), 'r+b') as fid:
+            fid.truncate(os.path.getsize(rt(cache)) - 8)
+        self.assertTrue(cache.get(key) is None)
+        self.assertFalse(key in cache)
+        self.assertFalse(os.path.exists(cache._entry(key)))
+
+        # The right size but corrupt, only found if verified
+        for verify in (False, True):
+            cache = ResultCache(os.path.join(self.tmp, 'cache'), 
+                    verify=verify)
+            cache.categorize(trials, models)
+            with open(rt(cache), 'r+b') as fid:
+                fid.seek(-2, os.SEEK_END)
+                fid.write(b'\x7f\x7f')
+            if verify:
+                self.assertTrue(cache.get(key) is None)
+                self.assertFalse(os.path.exists(cache._entry(key)))
+            else:
+                self.assertFalse(cache.get(key) is None)
+            cache.remove(key)
+
+    def test_evict_entries(self):
+        cache = ResultCache(os.path.join(self.tmp, 'cache'), max_entries=3)
+        trials = Trials(6, packed=True)
+        keys = []
+        for ii, threshold in enumerate((0.5, 0.6, 0.7)):
+            cache.categorize(trials, self.models(threshold))
+            keys.append(cache.key(trials, self.models(threshold)))
+            self.age(cache, keys[-1], 100 - ii)
+        self.assertFalse(cache.get(keys[0]) is None)
+            ## Used, so now the most recent
+
+        cache.categorize(trials, self.models(0.8))
+        self.assertEqual(len(cache.entries()), 3)
+        self.assertTrue(keys[0] in cache)
+        self.assertFalse(keys[1] in cache)
+        self.assertTrue(keys[2] in cache)
+
+    def test_evict_bytes(self):
+        trials = Trials(6, packed=True)
+        cache = ResultCache(os.path.join(self.tmp, 'cache'))
+        cache.categorize(trials, self.models(0.5))
+        size = cache.entries()[0][1]
+        cache.clear()
+
+        cache = ResultCache(os.path.join(self.tmp, 'cache'), 
+                max_bytes=int(2.5 * size))
+        keys = []
+        for ii, threshold in enumerate((0.5, 0.6, 0.7)):
+            cache.categorize(trials, self.models(threshold))
+            keys.append(cache.key(trials, self.models(threshold)))
+            self.age(cache, keys[-1], 100 - ii)
+            cache.evict()
+        self.assertEqual([key in cache for key in keys], 
+                [False, True, True])
+        self.assertTrue(sum([s for _, s, _ in cache.entries()]) <= 
+                2.5 * size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from fractions import Fraction
+from math import factorial, fabs
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim import bits
+
+
+def _reference_p_response(trial, i, letter):
+    """ The original, term by term, p(correct response). """
+
+    cA = trial[0:i+1].count('A')
+    cB = (i + 1) - cA
+    l = len(trial)
+    cN = l - (cA + cB)
+    if letter == 'A':
+        sumlim = cA
+    else:
+        sumlim = cB
+    maxN = (l // 2) - 1
+    possN = int(fabs(maxN - sumlim))
+    remaining_combinations = sum([1.0 / (factorial(k) * factorial((cN - k))) 
+            for k in range(min(cN, possN))])
+
+    return (cN / (2.0 ** cN)) * remaining_combinations
+
+
+class TestPResponse(unittest.TestCase):
+
+    def test_table(self):
+        """ Every entry is the original p(correct response), exactly. """
+
+        for l in range(2, 13):
+            for code in range(2 ** l):
+                trial = bits.unpack(code, l)
+                for i in range(l):
+                    for letter in ('A', 'B'):
+                        self.assertEqual(
+                                construct._p_response(trial, i, letter),
+                                _reference_p_response(trial, i, letter))
+
+    def test_long(self):
+        """ Long trials never overflow; once the factorials no longer fit 
+        in a float, entries are the exact ratio. """
+
+        for l in (200, 400):
+            table = construct._p_response_table(l)
+            defined = ~np.isnan(table)
+            self.assertEqual(defined.sum(), (l + 1) * (l + 2) // 2)
+            self.assertTrue(((table[defined] >= 0) & 
+                    (table[defined] <= 1)).all())
+
+            maxN = (l // 2) - 1
+            for c, other in ((0, 0), (0, l // 2), (l // 4, l // 8), 
+                    (maxN, 3), (l - 2, 1)):
+                unseen = l - (c + other)
+                exact = sum([Fraction(1, factorial(k) * 
+                        factorial(unseen - k)) for k in 
+                        range(min(unseen, abs(maxN - c)))])
+                exact *= Fraction(unseen, 2 ** unseen)
+                if unseen > 170:
+                    self.assertEqual(table[c, other], float(exact))
+                else:
+                    ## The original sum, so only close
+                    self.assertTrue(np.isclose(table[c, other], 
+                            float(exact), rtol=1e-12, atol=0))
+
+    def test_decisions(self):
+        """ Scalar and batch urgency gating agree where rounding matters. """
+
+        for l, threshold, decider in ((4, 0.1, deciders.absolute), 
+                (8, 0.3, deciders.difference)):
+            model = construct.create_urgency_gating('ug', threshold, decider)
+            trials = [bits.unpack(code, l) for code in range(2 ** l)]
+            batch = model.batch(np.array([[t == 'A' for t in trial] 
+                    for trial in trials], dtype=np.int8))
+            for ii, trial in enumerate(trials):
+                result = model(trial)
+                self.assertEqual(result['decision'], 
+                        'NAB'[batch['decision'][ii]])
+                if result['decision'] != 'N':
+                    self.assertEqual(result['rt'], batch['rt'][ii])
+
+if __name__ == '__main__':
+    unittest.main()
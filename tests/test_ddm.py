@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, ddm, deciders
+from accumulate.sim import bits
+
+
+class TestPassage(unittest.TestCase):
+
+    def test_mass(self):
+        """ Probabilities are finite, never negative, and never sum to more 
+        than 1, even when the noise is small next to the drift. """
+
+        l = 6
+        codes = np.arange(2 ** l, dtype=bits.dtype(l))
+        for v in (0.0, 0.1, 0.15, 0.2, 0.3):
+            for sigma in (0.03, 0.04, 0.05, 0.1, 0.5):
+                for a in (0.1, 0.3, 0.45):
+                    p_A, p_B = ddm.passage(codes, l, v, sigma, a)
+                    total = p_A.sum(axis=1) + p_B.sum(axis=1)
+                    self.assertTrue(np.isfinite(total).all())
+                    self.assertTrue((p_A >= 0).all() and (p_B >= 0).all())
+                    self.assertTrue((total <= 1 + 1e-9).all(), 
+                            (v, sigma, a, total.max()))
+
+    def test_symmetry(self):
+        """ Swapping every A and B swaps the bounds. """
+
+        l = 5
+        codes = np.arange(2 ** l, dtype=bits.dtype(l))
+        p_A, p_B = ddm.passage(codes, l, 0.2, 0.1, 0.3)
+        flipped = codes ^ bits.dtype(l)(2 ** l - 1)
+        self.assertTrue(np.allclose(p_A[flipped], p_B, atol=1e-9))
+
+    def test_simulate(self):
+        """ Simulations agree with passage(). """
+
+        l = 4
+        codes = np.arange(2 ** l, dtype=bits.dtype(l))
+        matrix = np.array([[(int(c) >> ii) & 1 for ii in range(l)] 
+                for c in codes])
+        p_A, p_B = ddm.passage(codes, l, 0.2, 0.1, 0.3)
+        decision, rt = ddm.simulate(matrix, 0.2, 0.1, 0.3, 
+                replicates=2000, substeps=100)
+        self.assertTrue(np.allclose((decision == 1).mean(axis=1), 
+                p_A.sum(axis=1), atol=0.05))
+        self.assertTrue(np.allclose((decision == -1).mean(axis=1), 
+                p_B.sum(axis=1), atol=0.05))
+
+
+class TestSimulate(unittest.TestCase):
+
+    def test_chunks(self):
+        """ Results never depend on chunksize. """
+
+        matrix = np.random.RandomState(1).randint(0, 2, (10, 6))
+        whole = ddm.simulate(matrix, 0.1, 0.2, 0.4, replicates=70, seed=3)
+        chunked = ddm.simulate(matrix, 0.1, 0.2, 0.4, replicates=70, 
+                seed=3, chunksize=3)
+        for w, c in zip(whole, chunked):
+            self.assertTrue(np.array_equal(w, c))
+
+
+class TestDrift(unittest.TestCase):
+
+    def test_batch(self):
+        """ The scalar and batch forms decide the same. """
+
+        for l, threshold, decider in ((10, 0.9, deciders.absolute), 
+                (8, 0.3, deciders.absolute), (8, 0.4, deciders.difference)):
+            model = construct.create_drift('drift', threshold, decider)
+            trials = [bits.unpack(code, l) for code in range(2 ** l)]
+            batch = model.batch(np.array([[t == 'A' for t in trial] 
+                    for trial in trials], dtype=np.int8))
+            for ii, trial in enumerate(trials):
+                result = model(trial)
+                self.assertEqual(result['decision'], 
+                        'NAB'[batch['decision'][ii]])
+                if result['decision'] != 'N':
+                    self.assertEqual(result['rt'], batch['rt'][ii])
+
+        model = construct.create_drift('drift', 0.9, deciders.absolute)
+        self.assertEqual(model('AAAAAAAAAB')['decision'], 'A')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import copy
+import json
+import pickle
+import unittest
+
+from accumulate.models.deciders import DecisionResult, NO_DECISION, \
+        _create_d_result
+
+
+class TestDecisionResult(unittest.TestCase):
+
+    def setUp(self):
+        self.result = _create_d_result('B', 0.8, 0.1, 3)
+        self.old = {'decision' : 'B', 'chosen_score' : 0.8, 
+                'unchosen_score' : 0.1, 'rt' : 3}
+
+    def test_dict(self):
+        """ Results read as the old result dicts did. """
+
+        self.assertEqual(self.result, self.old)
+        self.assertEqual(sorted(self.result), sorted(self.old))
+        self.assertEqual(dict(self.result), self.old)
+        self.assertEqual(dict([(k, self.result[k]) for k in self.result]), 
+                self.old)
+        self.assertEqual(self.result.copy(), self.old)
+        self.assertEqual(NO_DECISION['decision'], 'N')
+        self.assertEqual(NO_DECISION.get('rt', 0), None)
+
+    def test_tuple(self):
+        """ The namedtuple forms still work by value. """
+
+        self.assertEqual(self.result[:], (-1, 0.8, 0.1, 3))
+        self.assertEqual(self.result.rt, 3)
+        self.assertEqual(self.result._asdict()['code'], -1)
+        self.assertEqual(self.result._replace(rt=4).rt, 4)
+        self.assertEqual(self.result._replace(rt=4)['decision'], 'B')
+        self.assertRaises(ValueError, self.result._replace, decision='A')
+
+    def test_serialize(self):
+        """ Results pickle, copy and (as dicts) write to json. """
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(self.result, protocol))
+            self.assertTrue(isinstance(loaded, DecisionResult))
+            self.assertEqual(loaded[:], self.result[:])
+        self.assertEqual(copy.deepcopy(self.result)[:], self.result[:])
+        self.assertEqual(json.loads(json.dumps(self.result.copy())), 
+                self.old)
+
+
+if __name__ == '__main__':
+    unittest.main()
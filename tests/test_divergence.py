@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate import stats
+
+
+def _models():
+    return [construct.create_abscount('abs', 0.5, deciders.absolute),
+            construct.create_relcount('rel', 0.3, deciders.difference),
+            construct.create_information('info', 0.4, deciders.absolute),
+            construct.create_urgency_gating('ug', 0.3, 
+                    deciders.difference)]
+
+
+def _rank(results, measure, models):
+    """ The ranking, counted from divergence_by_trial(). """
+
+    subset = dict([(trial, dict([(name, trial_results[name]) 
+            for name in models])) for trial, trial_results in 
+            results.items()])
+    divergent = stats.divergence_by_trial(subset)
+    n = len(models)
+
+    keys = sorted(divergent.keys())
+    scores = []
+    for trial in keys:
+        count = sum([int(round(divergent[trial][name][measure] * n)) 
+                for name in models])
+        scores.append(count / float(n * (n - 1)))
+    order = sorted(range(len(keys)), key=lambda ii: -scores[ii])
+        ## Stable, so ties stay in trial order
+
+    return [(keys[ii], scores[ii]) for ii in order]
+
+
+class TestDivergenceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.results = Trials(8).categorize(_models())
+        self.index = stats.DivergenceIndex(self.results)
+
+    def test_rank(self):
+        """ All models, and subsets of them, for every measure. """
+
+        names = [model.__name__ for model in _models()]
+        for measure in ('D', 'T', 'DT'):
+            for models in (None, ['abs', 'rel'], ['rel', 'info', 'ug']):
+                ranked = self.index.rank(measure, models)
+                expected = _rank(self.results, measure, models or names)
+                self.assertEqual([trial for trial, _ in ranked], 
+                        [trial for trial, _ in expected])
+                for (_, score), (_, expected_score) in zip(ranked, 
+                        expected):
+                    self.assertAlmostEqual(score, expected_score)
+                self.assertTrue(np.allclose(sorted(
+                        self.index.scores(measure, models)), 
+                        sorted([score for _, score in expected])))
+
+    def test_cache(self):
+        """ Repeated queries come from the cache, unchanged. """
+
+        first = self.index.rank('DT', ['abs', 'rel'])
+        self.assertTrue(('DT', ('abs', 'rel')) in self.index._ranks)
+        self.assertEqual(self.index.rank('DT', ['abs', 'rel']), first)
+        self.assertEqual(self.index.rank('DT', ['abs', 'rel'], top=5), 
+                first[:5])
+        self.assertRaises(ValueError, self.index.scores, 'X')
+        self.assertRaises(ValueError, self.index.scores, 'D', ['abs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
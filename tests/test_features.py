@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from accumulate.sim.base import Trials
+from accumulate.sim.test import SelectTrials
+from accumulate.sim.sample import SampleTrials
+from accumulate.sim.trialfile import FileTrials, write
+from accumulate.sim import bits
+
+
+def _speed(trial):
+    half = len(trial) // 2
+    front = trial[:half].count('A')
+
+    return max(front, half - front) / float(half)
+
+
+class TestFeatures(unittest.TestCase):
+    """ Features must be those of each instance's own trials. """
+
+    def check(self, trials):
+        l = int(trials.l)
+        counts = trials.counts()
+        distances = trials.distances()
+        speeds = trials.maxspeed(0, l // 2 - 1)
+        keys = trials._trial_keys()
+        self.assertEqual(sorted(counts.keys()), sorted(keys))
+        
+        for key in keys:
+            trial = key
+            if trials.packed:
+                trial = bits.unpack(key, l)
+            self.assertEqual(counts[key], trials._count(trial))
+            self.assertEqual(distances[key], trials._hamming(trial))
+            self.assertAlmostEqual(speeds[key], _speed(trial))
+
+    def test_select(self):
+        trials = SelectTrials(6)
+        self.assertEqual(trials.counts()['AAABBB'], (3, 3))
+        self.check(trials)
+
+    def test_others(self):
+        self.check(Trials(6))
+        self.check(Trials(6, packed=True))
+        self.check(SampleTrials(12, 30, seed=1))
+
+    def test_file(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmp, 'trials.bin')
+            write(filename, [5, 3, 1, 63, 40, 41], 6)
+            self.check(FileTrials(filename))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_speed_profile(self):
+        trials = SelectTrials(6)
+        windows, speeds = trials.speed_profile(width=6)
+        keys = trials._trial_keys()
+        for ii, key in enumerate(keys):
+            front = key.count('A')
+            self.assertAlmostEqual(speeds[ii, 0], max(front, 6 - front) / 6.)
+
+
+if __name__ == '__main__':
+    unittest.main()
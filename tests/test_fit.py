@@ -0,0 +1,81 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.fit.base import FitTrials
+from accumulate.sim import bits
+
+
+def _behavior(l, threshold):
+    """ The trials, choices and rts abscount (at <threshold>) makes, for 
+    every trial it decides. """
+
+    model = construct.create_abscount('abs', threshold, deciders.absolute)
+    trials, choices, rts = [], [], []
+    for code in range(2 ** l):
+        trial = bits.unpack(code, l)
+        result = model(trial)
+        if result['decision'] != 'N':
+            trials.append(trial)
+            choices.append(result['decision'])
+            rts.append(result['rt'])
+
+    return trials, choices, rts
+
+
+class TestFitTrials(unittest.TestCase):
+
+    def setUp(self):
+        self.l = 8
+        self.trials = FitTrials(self.l)
+        self.trials.add_behavior('s', *_behavior(self.l, 0.55))
+
+    def test_predict(self):
+        """ Predictions are memoized. """
+
+        calls = []
+        categorize = self.trials.categorize
+
+        def counted(*args, **kwargs):
+            calls.append(1)
+            return categorize(*args, **kwargs)
+        self.trials.categorize = counted
+
+        first = self.trials.predict('create_abscount', threshold=0.55, 
+                decider=deciders.absolute)
+        second = self.trials.predict('create_abscount', threshold=0.55, 
+                decider=deciders.absolute)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(first[0] is second[0])
+
+        self.trials.predict('create_abscount', threshold=0.7, 
+                decider=deciders.absolute)
+        self.assertEqual(len(calls), 2)
+
+    def test_fit(self):
+        """ The fit recovers the interval of thresholds that make the same 
+        responses, (0.5, 0.625] for l = 8. """
+
+        fitted = self.trials.fit('create_abscount', 
+                {'threshold' : (0.05, 0.95)}, lapse=0.01, seed=1, 
+                decider=deciders.absolute)
+        threshold = fitted['params']['threshold']
+        self.assertTrue(0.5 < threshold <= 0.625, threshold)
+        self.assertEqual(fitted['n'], len(self.trials.behavior['s']['rt']))
+        self.assertAlmostEqual(fitted['log_likelihood'], 
+                self.trials.log_likelihood('create_abscount', lapse=0.01, 
+                        decider=deciders.absolute, threshold=0.55))
+
+    def test_passage(self):
+        """ The first passage likelihood is finite. """
+
+        for sigma in (0.03, 0.1, 0.5):
+            loglik = self.trials.log_likelihood('create_drift', 
+                    threshold=0.6, decider=deciders.absolute, v=0.2, 
+                    sigma=sigma)
+            self.assertTrue(np.isfinite(loglik))
+            self.assertTrue(loglik < 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from collections import defaultdict
+
+from accumulate.models import construct, deciders
+from accumulate.sim.lattice import distribution
+from accumulate.sim import bits
+
+
+def _enumerated(model, l, half):
+    """ The distribution, trial by trial. """
+
+    dist = defaultdict(int)
+    for code in range(2 ** l):
+        trial = bits.unpack(code, l)
+        if half and (trial[0] != 'A'):
+            continue
+        result = model(trial)
+        dist[(result['decision'], result['chosen_score'], 
+                result['unchosen_score'], result['rt'])] += 1
+
+    return dict(dist)
+
+
+class TestLattice(unittest.TestCase):
+
+    def test_distribution(self):
+        """ The lattice must count every trial's result exactly, path 
+        dependent (likelihood_ratio) or not. """
+
+        l = 10
+        models = [construct.create_abscount('abs', 0.5, deciders.absolute),
+                construct.create_relcount('rel', 0.3, deciders.difference),
+                construct.create_likelihood_ratio('lr', 0.6, 
+                        deciders.absolute),
+                construct.create_urgency_gating('ug', 0.3, 
+                        deciders.difference)]
+        for model in models:
+            for half in (False, True):
+                dist = distribution(model, l, half)
+                self.assertEqual(dist, _enumerated(model, l, half))
+                self.assertEqual(sum(dist.values()), 
+                        2 ** (l - 1) if half else 2 ** l)
+
+    def test_max_states(self):
+        model = construct.create_likelihood_ratio('lr', 0.9, 
+                deciders.absolute)
+        self.assertRaises(ValueError, distribution, model, 10, 
+                max_states=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
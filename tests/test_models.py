@@ -0,0 +1,167 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.models.deciders import _create_d_result
+from accumulate.sim.base import Trials
+from accumulate.sim import bits
+
+
+# The original (term by term) models,
+# that the current ones must still match.
+def _reference_abscount(trial, threshold, decider):
+    score_A = 0
+    score_B = 0
+    l = float(len(trial))
+    for ii, t in enumerate(trial):
+        if t == 'A':
+            score_A += 1
+        else:
+            score_B += 1
+
+        decision = decider(score_A / l, score_B / l, threshold, ii+1)
+        if decision != None:
+            return decision
+
+    return _create_d_result('N', None, None, None)
+
+
+def _reference_relcount(trial, threshold, decider):
+    cA = 0.0
+    cB = 0.0
+    for ii, t in enumerate(trial):
+        if t == 'A':
+            cA += 1
+        else:
+            cB += 1
+
+        if (cA > 0) and (cB > 0):
+            score_A = cA / (cA + cB)
+            decision = decider(score_A, 1 - score_A, threshold, ii+1)
+            if decision != None:
+                return decision
+
+    return _create_d_result('N', None, None, None)
+
+
+def _reference_information(trial, threshold, decider):
+    H_a = 0
+    H_b = 0
+    l = float(len(trial))
+    norm_const = np.log2(l) / l
+    for ii, t in enumerate(trial):
+        if t == 'A':
+            H_a += -0.5 * np.log2(0.5)
+        else:
+            H_b += -0.5 * np.log2(0.5)
+
+        decision = decider(H_a * norm_const, H_b * norm_const, threshold,
+                ii+1)
+        if decision != None:
+            return decision
+
+    return _create_d_result('N', None, None, None)
+
+
+_REFERENCES = (
+    (construct.create_abscount, _reference_abscount),
+    (construct.create_relcount, _reference_relcount),
+    (construct.create_information, _reference_information))
+
+_FACTORIES = ('create_abscount', 'create_relcount',
+        'create_naive_probability', 'create_information', 'create_snr',
+        'create_likelihood_ratio', 'create_urgency_gating',
+        'create_incremental_lba', 'create_blca', 'create_blca_freex',
+        'create_race', 'create_feedforward_inhibition',
+        'create_pooled_inhibition', 'create_drift')
+
+_DECIDERS = ((deciders.absolute, 0.5), (deciders.difference, 0.2))
+
+
+def _models():
+    models = []
+    for factory in _FACTORIES:
+        for decider, threshold in _DECIDERS:
+            models.append(getattr(construct, factory)(
+                    '{0}_{1}'.format(factory, decider.__name__), threshold,
+                    decider))
+
+    return models
+
+
+class TestReference(unittest.TestCase):
+    """ The models must decide as the original models did. """
+
+    def test_reference(self):
+        l = 8
+        trials = [bits.unpack(code, l) for code in range(2 ** l)]
+        for factory, reference in _REFERENCES:
+            for decider in (deciders.absolute, deciders.difference):
+                for threshold in (0.2, 0.45, 0.7):
+                    model = factory('m', threshold, decider)
+                    for trial in trials:
+                        result = model(trial)
+                        expected = reference(trial, threshold, decider)
+                        self.assertEqual(result['decision'],
+                                expected['decision'])
+                        self.assertEqual(result['rt'], expected['rt'])
+                        if expected['rt'] is not None:
+                            self.assertAlmostEqual(result['chosen_score'],
+                                    expected['chosen_score'])
+                            self.assertAlmostEqual(
+                                    result['unchosen_score'],
+                                    expected['unchosen_score'])
+
+
+class TestModes(unittest.TestCase):
+    """ Scalar, batch, tree and table results must all agree, for every
+    model, packed or not. """
+
+    def check(self, trials):
+        models = _models()
+        names = [model.__name__ for model in models]
+        scalar = trials.categorize(models, batch=False)
+        tables = [trials.categorize(models, batch, tree, table=True)
+                for batch in (False, True) for tree in (False, True)]
+
+        for table in tables[1:]:
+            self.assertTrue(np.array_equal(table.decision,
+                    tables[0].decision))
+            self.assertTrue(np.array_equal(table.rt, tables[0].rt))
+            self.assertTrue(np.allclose(table.chosen_score,
+                    tables[0].chosen_score, equal_nan=True))
+
+        for batch in (False, True):
+            for tree in (False, True):
+                results = trials.categorize(models, batch, tree)
+                self.assertEqual(sorted(results.keys()),
+                        sorted(scalar.keys()))
+                for trial in scalar:
+                    for name in names:
+                        result = results[trial][name]
+                        expected = scalar[trial][name]
+                        self.assertEqual(result['decision'],
+                                expected['decision'])
+                        self.assertEqual(result['rt'], expected['rt'])
+
+        table = tables[0]
+        for ii, trial in enumerate(table.keys()):
+            for jj, name in enumerate(names):
+                result = table.result(jj, ii)
+                expected = scalar[trial][name]
+                self.assertEqual(result['decision'], expected['decision'])
+                self.assertEqual(result['rt'], expected['rt'])
+                if expected['rt'] is not None:
+                    self.assertAlmostEqual(result['chosen_score'],
+                            expected['chosen_score'], places=5)
+                        ## Tables hold float32 scores
+
+    def test_unpacked(self):
+        self.check(Trials(8))
+
+    def test_packed(self):
+        self.check(Trials(8, packed=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from itertools import islice
+
+import numpy as np
+from accumulate.models.noise import Noise
+
+
+class TestNoise(unittest.TestCase):
+    """ Noise must be the same however it is asked for. """
+
+    def test_kinds(self):
+        for kind in ('gaussian', 'uniform', 'poisson'):
+            noise = Noise(kind, seed=3, scale=0.5, replicate_block=8)
+            block = noise.block(np.arange(6), 10, 20)
+            self.assertEqual(block.shape, (6, 10, 20))
+
+            # Chunked trials, steps and replicates
+            self.assertTrue(np.array_equal(block[2:4], 
+                    noise.block([2, 3], 10, 20)))
+            self.assertTrue(np.array_equal(block[:, :4], 
+                    noise.block(np.arange(6), 4, 20)))
+            self.assertTrue(np.array_equal(block[:, :, 5:17], 
+                    noise.block(np.arange(6), 10, 12, first_replicate=5)))
+
+            # and streams
+            stream = list(islice(noise.stream(4, replicate=13), 10))
+            self.assertTrue(np.allclose(stream, block[4, :, 13]))
+
+    def test_seeds(self):
+        first = Noise(seed=1).block([0, 1], 5, 4)
+        self.assertFalse(np.array_equal(first, Noise(seed=2).block([0, 1], 
+                5, 4)))
+        self.assertFalse(np.array_equal(first[0], first[1]))
+        self.assertTrue(np.array_equal(first, Noise(seed=1).block([0, 1], 
+                5, 4)))
+        self.assertRaises(ValueError, Noise, 'gaussian', -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
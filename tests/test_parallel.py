@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from accumulate.models import deciders
+from accumulate.models.misc import ModelSpec
+from accumulate.sim.base import Trials
+from accumulate.sim.test import SelectTrials
+from accumulate.sim.sample import SampleTrials
+from accumulate.sim.trialfile import FileTrials, write
+from accumulate.sim import parallel
+from accumulate.stats import ResultAggregates
+
+
+SPEC = ModelSpec('create_relcount', name='rel', threshold=0.6, 
+        decider=deciders.absolute)
+
+
+class TestParallel(unittest.TestCase):
+    """ Parallel results must be those of categorize(), for the trials of
+    the instance. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def instances(self):
+        filename = os.path.join(self.tmp, 'trials.bin')
+        write(filename, [5, 3, 1, 63, 40, 41], 6)
+
+        return [Trials(8), Trials(8, packed=True), SelectTrials(6),
+                SampleTrials(20, 50, seed=1), FileTrials(filename)]
+
+    def test_categorize(self):
+        for trials in self.instances():
+            for tree in (False, True):
+                serial = trials.categorize(SPEC.build(), tree=tree)
+                result = trials.categorize_parallel(SPEC, processes=2, 
+                        n_shards=4, tree=tree)
+                self.assertEqual(sorted(result.keys()), 
+                        sorted(serial.keys()))
+                for trial in serial:
+                    self.assertEqual(result[trial], serial[trial])
+
+    def test_table(self):
+        specs = [SPEC, ModelSpec('create_urgency_gating', name='ug', 
+                threshold=0.3, decider=deciders.difference)]
+        for trials in self.instances():
+            serial = trials.categorize([spec.build() for spec in specs], 
+                    table=True)
+            result = trials.categorize_parallel(specs, processes=2, 
+                    n_shards=4, table=True)
+            self.assertEqual(result.models, serial.models)
+            self.assertEqual(list(result.keys()), list(serial.keys()))
+            self.assertTrue(np.array_equal(result.decision, 
+                    serial.decision))
+            self.assertTrue(np.array_equal(result.rt, serial.rt))
+            self.assertTrue(np.allclose(result.chosen_score, 
+                    serial.chosen_score, equal_nan=True))
+
+    def test_aggregate(self):
+        for trials in self.instances():
+            serial = ResultAggregates().add(
+                    trials.categorize(SPEC.build()))
+            result = parallel.aggregate(trials, SPEC, processes=2, 
+                    n_shards=4)
+            self.assertAlmostEqual(result.mean_rt()['rel'], 
+                    serial.mean_rt()['rel'])
+
+    def test_large_l(self):
+        trials = SampleTrials(60, 40, seed=1)
+        result = trials.categorize_parallel(SPEC, processes=2)
+        self.assertEqual(len(result), len(trials.trials))
+
+
+if __name__ == '__main__':
+    unittest.main()
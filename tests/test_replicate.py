@@ -0,0 +1,56 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.models.noise import Noise
+from accumulate.sim.base import Trials
+from accumulate.sim.replicate import replicate, _PARAMS_SUBSTREAM
+
+
+class TestReplicate(unittest.TestCase):
+
+    def setUp(self):
+        self.trials = Trials(8, packed=True)
+        self.model = construct.create_relcount('rel', 0.6, deciders.absolute)
+
+    def test_noise_free(self):
+        """ With no noise every replicate is the model's result. """
+
+        result = replicate(self.trials, self.model, 3)
+        batch = self.model.batch(self.trials.matrix())
+        self.assertTrue(np.array_equal(result['p_A'], batch['decision'] == 1))
+        self.assertTrue(np.array_equal(result['p_B'], 
+                batch['decision'] == -1))
+        decided = batch['rt'] != -1
+        self.assertTrue(np.array_equal(result['mean_rt'][decided], 
+                batch['rt'][decided]))
+
+    def test_chunks(self):
+        """ Results never depend on chunksize. """
+
+        kwargs = dict(seed=2, start_sd=0.1, drift_sd=0.1, threshold_sd=0.05,
+                noise=Noise('gaussian', 5, scale=0.05))
+        whole = replicate(self.trials, self.model, 20, **kwargs)
+        chunked = replicate(self.trials, self.model, 20, chunksize=7, 
+                **kwargs)
+        for k in ('p_A', 'p_B', 'p_N', 'mean_rt'):
+            self.assertTrue(np.allclose(whole[k], chunked[k], 
+                    equal_nan=True))
+        total = whole['p_A'] + whole['p_B'] + whole['p_N']
+        self.assertTrue(np.allclose(total, 1))
+
+    def test_independent(self):
+        """ Per replicate draws never repeat the step noise, even when both
+        have the same seed. """
+
+        index = np.arange(40)
+        params = Noise('gaussian', 0, substream=_PARAMS_SUBSTREAM).block(
+                index, 5, 64)
+        steps = Noise('gaussian', 0).block(index, 8, 128)[:, :5, :64]
+        self.assertFalse(np.allclose(params, steps))
+        r = np.corrcoef(params.ravel(), steps.ravel())[0, 1]
+        self.assertTrue(abs(r) < 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate.sim.test import SelectTrials
+from accumulate.sim.results import tabulate
+
+
+class TestTabulate(unittest.TestCase):
+    """ Every form of results must give the same csv; table scores are
+    float32, so only to float32 precision. """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, name):
+        with open(os.path.join(self.tmp, name)) as fid:
+            rows = list(csv.reader(fid))
+
+        return rows[:1] + sorted(rows[1:])
+
+    def assertClose(self, rows, others):
+        self.assertEqual(rows[0], others[0])
+        self.assertEqual(len(rows), len(others))
+        for row, other in zip(rows[1:], others[1:]):
+            self.assertEqual(row[:3] + row[5:], other[:3] + other[5:])
+            for score, other_score in zip(row[3:5], other[3:5]):
+                if score == '':
+                    self.assertEqual(other_score, '')
+                else:
+                    self.assertTrue(np.isclose(float(score), 
+                            float(other_score), rtol=1e-6))
+
+    def test_paths(self):
+        models = [construct.create_relcount('rel', 0.6, deciders.absolute),
+            construct.create_urgency_gating('ug', 0.3, deciders.difference)]
+        for trials in (Trials(6), Trials(6, packed=True), SelectTrials(6)):
+            for include_acc in (False, True):
+                tabulate(os.path.join(self.tmp, 'dict.csv'), trials,
+                        trials.categorize(models), include_acc)
+                tabulate(os.path.join(self.tmp, 'table.csv'), trials,
+                        trials.categorize(models, table=True), include_acc)
+                tabulate(os.path.join(self.tmp, 'stream.csv'), trials,
+                        trials.iter_categorize(models), include_acc)
+                
+                self.assertClose(self.read('dict.csv'), 
+                        self.read('table.csv'))
+                self.assertEqual(self.read('dict.csv'), 
+                        self.read('stream.csv'))
+
+
+if __name__ == '__main__':
+    unittest.main()
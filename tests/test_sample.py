@@ -0,0 +1,34 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.sample import SampleTrials
+
+
+class TestSampleTrials(unittest.TestCase):
+
+    def setUp(self):
+        self.trials = SampleTrials(20, 50, seed=1)
+        self.model = construct.create_relcount('rel', 0.6, deciders.absolute)
+
+    def test_categorize(self):
+        results = self.trials.categorize(self.model)
+        self.assertEqual(sorted(results.keys()), 
+                sorted(self.trials.trials.tolist()))
+
+        # Every mode gives the same results
+        table = self.trials.categorize(self.model, table=True)
+        for tree in (False, True):
+            for batch in (False, True):
+                other = self.trials.categorize(self.model, batch, tree, 
+                        table=True)
+                self.assertTrue(np.array_equal(other.decision, 
+                        table.decision))
+                self.assertTrue(np.array_equal(other.rt, table.rt))
+        for ii, trial in enumerate(table.keys()):
+            self.assertEqual(results[trial]['rel']['rt'] or -1, 
+                    table.rt[0, ii])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate import stats
+from accumulate.stats import ResultAggregates
+
+
+def _models():
+    return [construct.create_abscount('abs', 0.5, deciders.absolute),
+            construct.create_relcount('rel', 0.6, deciders.absolute),
+            construct.create_urgency_gating('ug', 0.3, deciders.difference)]
+
+
+class TestAggregates(unittest.TestCase):
+
+    def setUp(self):
+        self.trials = Trials(8, packed=True)
+        self.results = self.trials.categorize(_models())
+
+    def test_forms(self):
+        """ Dicts, tables and streams give the same aggregates. """
+
+        mean_rt = stats.mean_rt(self.results)
+        divergence = stats.divergence(self.results)
+        for other in (self.trials.categorize(_models(), table=True),
+                self.trials.iter_categorize(_models()),
+                self.trials.iter_categorize(_models(), chunksize=7)):
+            aggs = ResultAggregates(chunksize=10).add(other)
+            for name in mean_rt:
+                self.assertAlmostEqual(aggs.mean_rt()[name], mean_rt[name])
+                for k in ('D', 'T', 'DT'):
+                    self.assertAlmostEqual(aggs.divergence()[name][k], 
+                            divergence[name][k])
+
+    def test_streamed(self):
+        """ Streams are added a chunk at a time. """
+
+        sizes = []
+        aggs = ResultAggregates(chunksize=16)
+        add = aggs._add_results
+        def counted(chunk):
+            sizes.append(len(chunk))
+            add(chunk)
+        aggs._add_results = counted
+
+        aggs.add(self.trials.iter_categorize(_models()))
+        self.assertEqual(max(sizes), 16)
+        self.assertEqual(sum(sizes), len(self.trials.trials))
+
+    def test_no_divergence(self):
+        aggs = ResultAggregates(divergence=False).add(self.results)
+        self.assertEqual(aggs['abs']['D'].count, 0)
+        self.assertRaises(ValueError, aggs.divergence)
+
+
+if __name__ == '__main__':
+    unittest.main()
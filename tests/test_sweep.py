@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate.sim.sweep import first_passage, threshold_sweep
+
+
+def _first_passage(statistic, thresholds):
+    """ The first passage, step by step. """
+
+    n, l = statistic.shape
+    passage = np.full((n, len(thresholds)), l, dtype=int)
+    for ii in range(n):
+        for jj, threshold in enumerate(thresholds):
+            for step in range(l):
+                if statistic[ii, step] >= threshold:
+                    passage[ii, jj] = step
+                    break
+
+    return passage
+
+
+class TestFirstPassage(unittest.TestCase):
+
+    def test_passage(self):
+        """ Unsorted (and repeated) thresholds, NaNs, and rows that never 
+        cross. """
+
+        prng = np.random.RandomState(7)
+        statistic = prng.uniform(0, 1, (50, 9))
+        statistic[prng.uniform(size=statistic.shape) < 0.2] = np.nan
+        statistic[:5] = 0.01
+            ## Never crosses
+        statistic[5:8] = np.nan
+        thresholds = [0.7, 0.1, 0.95, 0.5, 0.5, 0.3]
+
+        with np.errstate(invalid='ignore'):
+            passage = first_passage(statistic, thresholds)
+            expected = _first_passage(statistic, thresholds)
+        self.assertTrue(np.array_equal(passage, expected))
+        self.assertTrue((passage[:8] == 9).all())
+
+
+class TestThresholdSweep(unittest.TestCase):
+    """ Each threshold's row must be that model, run with the threshold. """
+
+    def test_sweep(self):
+        thresholds = [0.6, 0.15, 0.9, 0.35, 0.5]
+        for trials in (Trials(8), Trials(8, packed=True)):
+            for factory in (construct.create_abscount, 
+                    construct.create_relcount, 
+                    construct.create_urgency_gating, construct.create_blca):
+                for decider in (deciders.absolute, deciders.difference):
+                    model = factory('m', 0.5, decider)
+                    table = threshold_sweep(trials, model, thresholds)
+                    self.assertEqual(table.models, 
+                            ['m_{0}'.format(t) for t in thresholds])
+
+                    for ii, threshold in enumerate(thresholds):
+                        expected = trials.categorize(
+                                factory('m', threshold, decider), 
+                                batch=False, table=True)
+                        self.assertEqual(list(table.keys()), 
+                                list(expected.keys()))
+                        self.assertTrue(np.array_equal(table.rt[ii], 
+                                expected.rt[0]))
+                        self.assertTrue(np.array_equal(table.decision[ii], 
+                                expected.decision[0]))
+                        self.assertTrue(np.allclose(table.chosen_score[ii],
+                                expected.chosen_score[0], equal_nan=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate.sim.test import SelectTrials
+from accumulate.sim.parallel import ShardTrials
+from accumulate.fit.base import FitTrials
+
+
+def _models():
+    return [construct.create_relcount('rel', 0.6, deciders.absolute),
+            construct.create_urgency_gating('ug', 0.3, deciders.difference)]
+
+
+class TestTree(unittest.TestCase):
+    """ Tree mode (see accumulate.sim.tree) must match running every
+    trial, over whatever trials an instance holds. """
+
+    def check(self, trials):
+        models = _models()
+        tree = trials.categorize(models, tree=True)
+        scalar = trials.categorize(models, batch=False)
+        self.assertEqual(sorted(tree.keys()), sorted(scalar.keys()))
+        for trial in scalar:
+            self.assertEqual(tree[trial], scalar[trial])
+
+        tree = trials.categorize(models, tree=True, table=True)
+        scalar = trials.categorize(models, batch=False, table=True)
+        self.assertTrue(np.array_equal(tree.decision, scalar.decision))
+        self.assertTrue(np.array_equal(tree.rt, scalar.rt))
+
+    def test_full(self):
+        self.check(Trials(8))
+        self.check(Trials(8, packed=True))
+        self.check(ShardTrials(8, 3, 8))
+
+    def test_select(self):
+        trials = SelectTrials(6)
+        self.assertEqual(len(trials.categorize(_models(), tree=True)), 10)
+        self.check(trials)
+
+    def test_fit(self):
+        trials = FitTrials(6)
+        trials.add_behavior('s', ['BBAABA', 'AABBAB', 'ABABAB', 'BAAAAA'],
+                'ABAB', [3, 3, 3, 3])
+        self.assertEqual(len(trials.categorize(_models(), tree=True)), 4)
+        self.check(trials)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from accumulate.models import construct, deciders
+from accumulate.sim.base import Trials
+from accumulate.sim.test import SelectTrials
+from accumulate.sim.trialfile import FileTrials, write
+from accumulate.sim import bits
+
+
+class TestTrialFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp)
+
+    def test_write_binary(self):
+        for trials in (Trials(6), Trials(6, packed=True), SelectTrials(6)):
+            trials.write_trials(binary=True)
+            read = FileTrials('6trials.bin')
+            keys = trials._trial_keys()
+            if not trials.packed:
+                keys = [bits.pack(key) for key in keys]
+            self.assertEqual(sorted(read.trials.tolist()), sorted(keys))
+
+    def test_tree(self):
+        write('trials.bin', [5, 3, 1, 63, 40, 41], 6)
+        trials = FileTrials('trials.bin')
+        model = construct.create_relcount('rel', 0.6, deciders.absolute)
+        tree = trials.categorize(model, tree=True, table=True)
+        scalar = trials.categorize(model, batch=False, table=True)
+        self.assertTrue(np.array_equal(tree.rt, scalar.rt))
+        self.assertTrue(np.array_equal(tree.decision, scalar.decision))
+
+if __name__ == '__main__':
+    unittest.main()